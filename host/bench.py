@@ -0,0 +1,525 @@
+# Host-side benchmark suite. Boots PicoWPumPi against the simulated board
+# and network for each scenario and writes the results as JSON.
+#
+#   python host/bench.py --output bench.json
+#   python host/bench.py --baseline bench.json   # exit 1 on regressions
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import sim  # noqa: E402
+from sim.app import DeviceFilesystem, preload_firmware, reset_board, sim_config  # noqa: E402
+from sim.netproc import SimNetwork  # noqa: E402
+
+CLIENT_NAME = "pumpi-bench"
+
+
+def summarize(values, prefix, scale=1000.0):
+    # Seconds in, milliseconds out unless a different scale is given
+    if not values:
+        return {f"{prefix}_count": 0}
+    ordered = sorted(values)
+    return {
+        f"{prefix}_count": len(ordered),
+        f"{prefix}_p50": round(ordered[len(ordered) // 2] * scale, 3),
+        f"{prefix}_p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * scale, 3),
+        f"{prefix}_max": round(ordered[-1] * scale, 3),
+        f"{prefix}_mean": round(statistics.fmean(ordered) * scale, 3)
+    }
+
+
+class Probe:
+    # Instruments a running PicoWPumPi instance without touching its source:
+    # bound methods are wrapped on the instance, plus a scheduler probe task.
+
+    def __init__(self, app):
+        self.app = app
+        self.reset()
+        self._wrap_publishing()
+
+    def reset(self):
+        self.loop_marks = []
+        self.publish_cycles = []
+        self.spool_cycles = []
+        self.alloc_peaks = []
+        self.alloc_net = []
+        self.lateness = []
+
+    def _wrap_publishing(self):
+        app = self.app
+        handle = app.handle_mqtt_publishing
+
+        async def handle_mqtt_publishing():
+            # Called exactly once per publish job run
+            self.loop_marks.append(time.monotonic())
+            previous = app.last_mqtt_publish
+            was_connected = app.mqtt_mgr.is_connected
+            tracemalloc.reset_peak()
+            heap_before = tracemalloc.get_traced_memory()[0]
+            start = time.monotonic()
+            await handle()
+            elapsed = time.monotonic() - start
+            current, peak = tracemalloc.get_traced_memory()
+            if app.last_mqtt_publish == previous:
+                return
+            (self.publish_cycles if was_connected else self.spool_cycles).append(elapsed)
+            self.alloc_peaks.append(peak - heap_before)
+            self.alloc_net.append(current - heap_before)
+
+        app.handle_mqtt_publishing = handle_mqtt_publishing
+
+    async def scheduler_probe(self, period=0.01):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(period)
+            self.lateness.append(max(time.monotonic() - start - period, 0))
+
+    def loop_metrics(self):
+        intervals = [b - a for a, b in zip(self.loop_marks, self.loop_marks[1:])]
+        metrics = summarize(intervals, "main_loop_interval_ms")
+        if len(intervals) > 1:
+            metrics["main_loop_jitter_ms"] = round(statistics.pstdev(intervals) * 1000, 3)
+        metrics.update(summarize(self.lateness, "scheduler_lateness_ms"))
+        return metrics
+
+    def publish_metrics(self):
+        metrics = summarize(self.publish_cycles, "publish_cycle_ms")
+        metrics.update(summarize(self.alloc_peaks, "alloc_peak_bytes", scale=1))
+        metrics.update(summarize(self.alloc_net, "alloc_net_bytes", scale=1))
+        return metrics
+
+
+class Bench:
+    def __init__(self, net, scale=1.0):
+        self.net = net
+        self.scale = scale
+
+    def run(self, name, overrides=None):
+        scenario = getattr(self, "scenario_" + name)
+        net = self.net
+        net.call("reset")
+        reset_board()
+        config = sim_config(net.ports, client_name=CLIENT_NAME, **(overrides or {}))
+        with DeviceFilesystem(config):
+            return asyncio.run(self._boot_and_run(scenario))
+
+    async def _boot_and_run(self, scenario):
+        from picow_pumpi import PicoWPumPi
+
+        from managers.metrics import registry
+
+        preload_firmware()
+        # Metrics live in a module-level registry; every scenario boots a fresh device
+        registry.clear()
+        sim.mark_resident()
+        boot_start = time.monotonic()
+        app = PicoWPumPi()
+        probe = Probe(app)
+        app_task = asyncio.create_task(app.run())
+        probe_task = asyncio.create_task(probe.scheduler_probe())
+        try:
+            if not await self.wait_until(lambda: app.mqtt_mgr.is_connected, 30):
+                raise RuntimeError("device never connected to the simulated broker")
+            metrics = {"boot_to_connected_ms": round((time.monotonic() - boot_start) * 1000, 1)}
+            # Let startup and the first spool replay settle before measuring
+            await self.wait_until(lambda: not app.spool_mgr.pending() or app.power_mgr.enabled, 10)
+            await asyncio.sleep(1)
+            probe.reset()
+            metrics.update(await scenario(app, probe))
+            return metrics
+        finally:
+            probe_task.cancel()
+            app_task.cancel()
+
+    async def wait_until(self, condition, timeout, interval=0.02):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                return False
+            await asyncio.sleep(interval)
+        return True
+
+    def broker_stats(self):
+        return self.net.call("stats")
+
+    def board_metrics(self):
+        from _sim import state
+        return {"wdt_max_gap_ms": state.wdt_max_gap_ms, "wdt_expired": state.wdt_expired}
+
+    async def scrape_metrics(self, app):
+        # One Prometheus scrape of the device endpoint, plus the percentiles it exposes
+        from managers.metrics import registry
+
+        start = time.monotonic()
+        reader, writer = await asyncio.open_connection("127.0.0.1", app.config_mgr.METRICS_HTTP_PORT)
+        writer.write(b"GET /metrics HTTP/1.0\r\n\r\n")
+        body = await reader.read()
+        writer.close()
+        publish = registry.histogram("mqtt_publish_ms")
+        lateness = registry.histogram("scheduler_late_ms")
+        return {
+            "scrape_ms": round((time.monotonic() - start) * 1000, 3),
+            "scrape_bytes": len(body),
+            "scrape_ok": body.startswith(b"HTTP/1.0 200") and b"pumpi_mqtt_publish_ms_bucket" in body,
+            "metrics_publish_p50_ms": round(publish.quantile(0.5), 1),
+            "metrics_publish_p99_ms": round(publish.quantile(0.99), 1),
+            "metrics_late_p99_ms": round(lateness.quantile(0.99), 1)
+        }
+
+    async def scenario_steady(self, app, probe):
+        duration = 15 * self.scale
+        before = self.broker_stats()
+        scheduler = app.scheduler
+        wakeups, misses = scheduler.wakeups, scheduler.misses
+        await asyncio.sleep(duration)
+        after = self.broker_stats()
+
+        cycles = max(len(probe.publish_cycles), 1)
+        metrics = probe.loop_metrics()
+        metrics.update(probe.publish_metrics())
+        metrics["messages_per_cycle"] = round((after["mqtt"]["publishes"] - before["mqtt"]["publishes"]) / cycles, 2)
+        metrics["bytes_per_cycle"] = round((after["mqtt"]["bytes"] - before["mqtt"]["bytes"]) / cycles, 1)
+        metrics["loop_utilization"] = app.system_mgr.loop_monitor.utilization_value
+        # CPython frees most objects by reference counting; GcManager sees
+        # those heap drops as "auto" collections, which MicroPython never has
+        gc_stats = app.system_mgr.gc_mgr.get_stats()
+        metrics["gc_collections"] = gc_stats["collections"]
+        metrics["gc_breakdown"] = {k: gc_stats[k] for k in ("idle", "pressure", "interval", "manual", "auto")}
+        metrics["gc_pause_max_ms"] = gc_stats["max_us"] / 1000
+        metrics.update(await self.scrape_metrics(app))
+        metrics["wakeups_per_s"] = round((scheduler.wakeups - wakeups) / duration, 2)
+        metrics["deadline_misses"] = scheduler.misses - misses
+        metrics.update(self.board_metrics())
+        return metrics
+
+    async def scenario_inbound(self, app, probe):
+        # Round trip from the broker to the config subscriber inside the device
+        count = max(int(20 * self.scale), 5)
+        key = "LOG_RATE_LIMIT_MS"
+        received = {}
+        app.config_mgr.subscribe(key, lambda _, value: received.setdefault(value, time.monotonic()))
+
+        sent = {}
+        base = app.config_mgr.get(key) or 10000
+        for i in range(count):
+            value = base + i + 1
+            sent[value] = time.monotonic()
+            self.net.call("publish", f"{CLIENT_NAME}/config/{key}", str(value))
+            await asyncio.sleep(0.2)
+        await asyncio.sleep(1)
+
+        latencies = [received[value] - start for value, start in sent.items() if value in received]
+        metrics = summarize(latencies, "inbound_latency_ms")
+        metrics["inbound_lost"] = count - len(latencies)
+        metrics.update(app.mqtt_mgr.get_dispatch_stats())
+        return metrics
+
+    async def scenario_moisture(self, app, probe):
+        # Dry readings on every plant topic; measures reading-to-valve-open latency
+        topics = app.config_mgr.MOISTURE_TOPICS
+        threshold = app.config_mgr.MOISTURE_THRESHOLD
+        for topic in topics:
+            self.net.call("publish", topic, str(threshold - 10))
+            await asyncio.sleep(0.05)
+        opened = await self.wait_until(lambda: app.moisture_ctl.stats["latency_count"] >= len(topics), 30)
+        # Readings bouncing around the threshold must not re-trigger
+        for topic in topics:
+            self.net.call("publish", topic, str(threshold + 1))
+            self.net.call("publish", topic, str(threshold - 1))
+        await asyncio.sleep(0.5)
+
+        moisture = app.moisture_ctl.get_stats()
+        pump = app.pump_mgr.get_stats()
+        return {
+            "all_valves_opened": opened,
+            "triggers": moisture["triggers"],
+            "held_hysteresis": moisture["held_hysteresis"],
+            "decision_max_us": moisture["decision_max_us"],
+            "actuation_latency_max_ms": moisture["latency_max_ms"],
+            "actuation_latency_avg_ms": moisture["latency_avg_ms"],
+            "pump_starts": pump["pump_starts"]
+        }
+
+    async def scenario_low_power(self, app, probe):
+        # Duty-cycled radio: samples are spooled between transmission windows
+        # and the CPU light-sleeps through idle gaps
+        import utime
+        from _sim import state
+
+        def radio_ms():
+            if state.radio_since is None:
+                return state.radio_on_ms
+            return state.radio_on_ms + utime.ticks_diff(utime.ticks_ms(), state.radio_since)
+
+        duration = 20 * self.scale
+        power_mgr = app.power_mgr
+        before = self.broker_stats()
+        spool_before = dict(app.spool_mgr.get_stats())
+        windows, radio_before, sleep_before = power_mgr.stats["windows"], radio_ms(), state.lightsleep_ms
+        wakeups = app.scheduler.wakeups
+        start = time.monotonic()
+        await asyncio.sleep(duration)
+        await self.wait_until(lambda: not power_mgr.in_window, 30)
+        elapsed_ms = (time.monotonic() - start) * 1000
+        after = self.broker_stats()
+        replay_topic = f"{CLIENT_NAME}/replay"
+
+        power = power_mgr.get_stats()
+        metrics = {
+            "windows": power["windows"] - windows,
+            "window_failures": power["window_failures"],
+            "radio_on_pct": round((radio_ms() - radio_before) * 100 / elapsed_ms, 2),
+            "sleep_pct": round((state.lightsleep_ms - sleep_before) * 100 / elapsed_ms, 2),
+            "wakeups_per_s": round((app.scheduler.wakeups - wakeups) * 1000 / elapsed_ms, 2),
+            "estimated_mah_per_hour": power["mah_per_hour"],
+            "samples_spooled": app.spool_mgr.get_stats()["queued"] - spool_before["queued"],
+            "samples_delivered": after["topics"].get(replay_topic, 0) - before["topics"].get(replay_topic, 0),
+            "metrics_snapshots": after["topics"].get(f"{CLIENT_NAME}/metrics", 0) - before["topics"].get(f"{CLIENT_NAME}/metrics", 0),
+            "spool_dropped": app.spool_mgr.get_stats()["dropped"] - spool_before["dropped"]
+        }
+        metrics.update(self.board_metrics())
+        return metrics
+
+    async def _outage(self, app, probe, down, up, outage):
+        await asyncio.sleep(3 * self.scale)
+        spool_before = dict(app.spool_mgr.get_stats())
+        before = self.broker_stats()
+
+        fault_start = time.monotonic()
+        down()
+        detected = await self.wait_until(lambda: not app.mqtt_mgr.is_connected, outage)
+        detect_s = time.monotonic() - fault_start if detected else None
+        await asyncio.sleep(max(outage - (time.monotonic() - fault_start), 0))
+
+        restore_start = time.monotonic()
+        up()
+        reconnected = await self.wait_until(lambda: app.mqtt_mgr.is_connected, 90)
+        reconnect_s = time.monotonic() - restore_start
+        drained = await self.wait_until(lambda: not app.spool_mgr.pending() and not app.spool_mgr.replaying, 90)
+        recovery_s = time.monotonic() - restore_start
+        after = self.broker_stats()
+        spool = app.spool_mgr.get_stats()
+
+        metrics = {
+            "outage_s": outage,
+            "detect_ms": round(detect_s * 1000, 1) if detect_s is not None else -1,
+            "reconnect_ms": round(reconnect_s * 1000, 1) if reconnected else -1,
+            "recovery_ms": round(recovery_s * 1000, 1) if drained else -1,
+            "spooled": spool["queued"] - spool_before["queued"],
+            "spool_dropped": spool["dropped"] - spool_before["dropped"],
+            "replayed": spool["replayed"] - spool_before["replayed"],
+            "replay_messages": after["topics"].get(f"{CLIENT_NAME}/replay", 0) - before["topics"].get(f"{CLIENT_NAME}/replay", 0),
+            "broker_connects": after["mqtt"]["connects"] - before["mqtt"]["connects"]
+        }
+        metrics.update(summarize(probe.spool_cycles, "spool_cycle_ms"))
+        metrics.update(probe.loop_metrics())
+        metrics.update(self.board_metrics())
+        return metrics
+
+    async def scenario_supervisor(self, app, probe):
+        # Blocking calls must show up as stalls with the right culprit, and a
+        # dead task must stop the watchdog feed and leave a crash record behind
+        import machine
+        from _sim import state
+        from managers.supervisor import Supervisor
+
+        supervisor = app.system_mgr.supervisor
+        app.scheduler.after("blocking_job", 0, lambda: time.sleep(0.8))
+        await asyncio.sleep(1)
+
+        async def rogue():
+            await asyncio.sleep(0.1)
+            time.sleep(1.2)
+
+        await app.system_mgr.loop_monitor.wrap("rogue", rogue())
+        await asyncio.sleep(1.5)
+        stall_tasks = [task for _, task in supervisor.worst]
+
+        wedge_start = time.monotonic()
+        app.mqtt_task.cancel()
+        detected = await self.wait_until(lambda: supervisor.unhealthy == "mqtt", 10)
+        detect_ms = (time.monotonic() - wedge_start) * 1000
+        feeds = state.wdt_feeds
+        await asyncio.sleep(2)
+        with open(supervisor.crash_file) as f:
+            record = json.load(f)
+
+        # Next boot after the watchdog reset: the record goes out over MQTT
+        before = self.broker_stats()
+        state.reset_cause = machine.WDT_RESET
+        rebooted = Supervisor(app.config_mgr, app.log_mgr)
+        await rebooted.publish_previous(app.mqtt_mgr)
+        after = self.broker_stats()
+        crash_topic = f"{CLIENT_NAME}/crash"
+
+        metrics = {
+            "stalls": supervisor.stalls,
+            "stall_job_found": "blocking_job" in stall_tasks,
+            "stall_task_found": "rogue" in stall_tasks,
+            "worst_stall_ms": supervisor.worst[0][0] if supervisor.worst else 0,
+            "wedge_detect_ms": round(detect_ms, 1) if detected else -1,
+            "wdt_withheld": state.wdt_feeds == feeds,
+            "crash_record_task": record.get("task", ""),
+            "crash_published": after["topics"].get(crash_topic, 0) - before["topics"].get(crash_topic, 0)
+        }
+        metrics.update(self.board_metrics())
+        return metrics
+
+    async def scenario_broker_outage(self, app, probe):
+        return await self._outage(app, probe,
+                                  lambda: self.net.call("broker_down"),
+                                  lambda: self.net.call("broker_up"),
+                                  8 * self.scale)
+
+    async def scenario_wifi_blip(self, app, probe):
+        # A short AP hiccup: the link job notices it, rejoins over the cached
+        # BSSID, channel and lease and brings MQTT back right after
+        from _sim import state
+
+        await asyncio.sleep(2 * self.scale)
+        wifi_mgr = app.wifi_mgr
+        state.wifi_up = False
+        detected = await self.wait_until(lambda: not wifi_mgr.link_up, 5)
+        await asyncio.sleep(0.3)
+        restore_start = time.monotonic()
+        state.wifi_up = True
+        await self.wait_until(lambda: wifi_mgr.link_up, 30)
+        wifi_s = time.monotonic() - restore_start
+        reconnected = await self.wait_until(lambda: app.mqtt_mgr.is_connected, 30)
+        mqtt_s = time.monotonic() - restore_start
+        wifi = wifi_mgr.get_stats()
+        metrics = {
+            "link_loss_detected": detected,
+            "wifi_reconnect_path": wifi["last_path"],
+            "wifi_join_ms": wifi["last_connect_ms"],
+            "wifi_restore_ms": round(wifi_s * 1000, 1),
+            "mqtt_restore_ms": round(mqtt_s * 1000, 1) if reconnected else -1,
+            "wifi_fast_failures": wifi["fast_failures"]
+        }
+        metrics.update(self.board_metrics())
+        return metrics
+
+    async def scenario_wifi_outage(self, app, probe):
+        from _sim import state
+
+        def down():
+            # Losing the AP takes every remote service with it
+            state.wifi_up = False
+            self.net.call("broker_down")
+
+        def up():
+            state.wifi_up = True
+            self.net.call("broker_up")
+
+        metrics = await self._outage(app, probe, down, up, 8 * self.scale)
+        wifi = app.wifi_mgr.get_stats()
+        # The outage is noticed by the link job; the reconnect takes the cached fast path
+        metrics.update({
+            "wifi_drops": wifi["drops"],
+            "wifi_reconnect_path": wifi["last_path"],
+            "wifi_reconnect_ms": wifi["last_connect_ms"],
+            "wifi_fast_failures": wifi["fast_failures"]
+        })
+        return metrics
+
+
+SCENARIOS = ["steady", "inbound", "moisture", "broker_outage", "wifi_outage", "wifi_blip", "low_power", "supervisor"]
+# A tuned install: the access point is pinned, since the CYW43 port cannot
+# report it, and the router reserves the address, so the lease may be reused
+TUNED_WIFI = {
+    "WIFI_BSSID": "3c:84:6a:11:22:33",
+    "WIFI_CHANNEL": 6,
+    "WIFI_LEASE_REUSE_S": 3600
+}
+SCENARIO_CONFIG = {
+    "wifi_blip": TUNED_WIFI,
+    "wifi_outage": TUNED_WIFI,
+    "supervisor": {
+        "SUPERVISOR_TIMEOUT_MS": 2000,
+        "SUPERVISOR_STALL_MS": 300
+    },
+    "low_power": {
+        "LOW_POWER_ENABLED": True,
+        "LOW_POWER_TX_INTERVAL": 5,
+        "SPOOL_REPLAY_INTERVAL_MS": 50
+    }
+}
+
+
+def lower_is_better(key):
+    return any(part in key for part in ("_ms", "bytes", "dropped", "lost", "expired", "jitter"))
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for scenario, metrics in results["scenarios"].items():
+        base_metrics = baseline.get("scenarios", {}).get(scenario, {})
+        for key, value in metrics.items():
+            base = base_metrics.get(key)
+            if not lower_is_better(key) or not isinstance(value, (int, float)) or not isinstance(base, (int, float)):
+                continue
+            # Small absolute slack keeps timer noise on tiny values from failing the run
+            slack = 2.0 if "_ms" in key else (256 if "bytes" in key else 0)
+            if value > base * (1 + tolerance) + slack:
+                regressions.append((scenario, key, base, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PicoW-PumPi host benchmarks")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for scenario durations")
+    parser.add_argument("--output", help="write JSON results to this file (default: stdout)")
+    parser.add_argument("--baseline", help="compare against an earlier JSON result and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown against the baseline")
+    parser.add_argument("--verbose", action="store_true", help="show the device console output")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "scale": args.scale
+        },
+        "scenarios": {}
+    }
+
+    with SimNetwork() as net:
+        # Tracing starts after the network process has forked off
+        sim.install(trace_allocations=True)
+        bench = Bench(net, args.scale)
+        for name in args.scenarios.split(","):
+            print(f"running {name} ...", file=sys.stderr)
+            with open(os.devnull, "w") as devnull:
+                console = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+                with console:
+                    results["scenarios"][name] = bench.run(name, SCENARIO_CONFIG.get(name))
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for scenario, key, base, value in regressions:
+            print(f"REGRESSION {scenario}.{key}: {base} -> {value}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
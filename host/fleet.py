@@ -0,0 +1,428 @@
+# Fleet load generator. Runs many virtual PumPi devices in one asyncio loop,
+# each built from the firmware's own MQTTManager, ConfigManager and
+# DataManager, so topics, payloads, dispatch and reconnect backoff are the
+# ones a real device uses. A controller client fans commands out to the fleet
+# and times the acks, and a probe subscription times each publish cycle.
+#
+#   python host/fleet.py --devices 200 --interval 5 --duration 60
+#   python host/fleet.py --devices 500 --broker 192.168.1.10:1883 --storm-every 30
+import argparse
+import asyncio
+import collections
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import sim  # noqa: E402
+from bench import summarize  # noqa: E402
+from sim.app import sim_config  # noqa: E402
+from sim.netproc import SimNetwork  # noqa: E402
+
+# Commands sent to the whole fleet in turn; every one goes through the firmware dispatch table
+COMMANDS = [
+    ("control/watering", '{"valve": 1, "duration": 5}'),
+    ("config/MOISTURE_THRESHOLD", "31"),
+    ("control/watering", "stop"),
+    ("config/MOISTURE_THRESHOLD", "30")
+]
+ACK_TOPIC = "fleet/ack"
+
+
+class QuietLog:
+    # Hundreds of devices would flood the console; only problems are counted
+
+    def __init__(self):
+        self.warnings = 0
+        self.errors = 0
+
+    def debug(self, message, *args):
+        pass
+
+    def log(self, message, *args):
+        pass
+
+    info = log
+
+    def warning(self, message, *args):
+        self.warnings += 1
+
+    def error(self, message, *args):
+        self.errors += 1
+
+
+class FleetPump:
+    # Accepts what MQTTManager hands to the pump manager without driving pins
+
+    def __init__(self):
+        self.commands = 0
+
+    def add_job(self, valve, duration=None, volume=None):
+        self.commands += 1
+
+    def water_all(self):
+        self.commands += 1
+
+    def stop_all(self):
+        self.commands += 1
+
+    def reset_tank(self):
+        self.commands += 1
+
+
+def fleet_config_class():
+    from managers.config_manager import ConfigManager
+
+    class FleetConfig(ConfigManager):
+        # Same conversion and subscriber logic as on the device, kept in memory
+
+        def __init__(self, log_mgr, values):
+            self.values = values
+            super().__init__(log_mgr)
+
+        def load_from_file(self, filename=None):
+            self._config = dict(self.values)
+            for key, value in self._config.items():
+                setattr(self, key, value)
+
+        def save_to_file(self, filename=None):
+            self.writes += 1
+
+    return FleetConfig
+
+
+class VirtualDevice:
+    def __init__(self, name, values, args):
+        from managers.data_manager import DataManager
+        from managers.mqtt_manager import MQTTManager
+
+        self.name = name
+        self.args = args
+        self.log = QuietLog()
+        self.config = fleet_config_class()(self.log, dict(values, MQTT_CLIENT_NAME=name))
+        self.data_mgr = DataManager(self.config, self.log, None)
+        self.mqtt = MQTTManager(self.config, self.log)
+        self.mqtt.set_pump_manager(FleetPump())
+        # The client takes its callback when it is created, so wrapping here covers every session
+        handle = self.mqtt.on_message
+        self.mqtt.on_message = lambda topic, msg: self._on_message(handle, topic, msg)
+        self.ack_topic = f"{name}/{ACK_TOPIC}".encode()
+        self.cycle_starts = collections.deque()
+        self.started = time.monotonic()
+        self.stats = {"cycles": 0, "failed": 0, "skipped": 0, "acks": 0}
+
+    def _on_message(self, handle, topic, msg):
+        handle(topic, msg)
+        if self.mqtt.is_connected:
+            self.stats["acks"] += 1
+            asyncio.create_task(self._ack(topic))
+
+    async def _ack(self, topic):
+        with contextlib.suppress(Exception):
+            await self.mqtt.client.publish(self.ack_topic, topic)
+
+    def sample(self):
+        # Plausible values for every configured subtopic, shaped like SystemManager.get_system_data
+        uptime = int(time.monotonic() - self.started)
+        data = {}
+        for topic, subtopics in (self.config.MQTT_TOPICS or {}).items():
+            data[topic] = {subtopic: round(random.uniform(0, 100), 2) for subtopic in subtopics}
+        system = data.get("system", {})
+        system["timestamp"] = int(time.time())
+        system["uptime"] = f"{uptime // 86400}d {uptime // 3600 % 24}h {uptime // 60 % 60}m {uptime % 60}s"
+        system_data = {"system": system, "adc": data.pop("adc", {}), "loop": data.pop("loop", {})}
+        data.pop("system", None)
+        current_config = {
+            "moisture_treshold": self.config.MOISTURE_THRESHOLD,
+            "moisture_check_interval": self.config.MOISTURE_CHECK_INTERVAL,
+            "mqtt_update_interval": self.config.MQTT_UPDATE_INTERVAL
+        }
+        data.pop("current_config", None)
+        return self.data_mgr.prepare_mqtt_data_for_publishing(system_data, current_config, data)
+
+    def probe_suffix(self):
+        # The last message of a publish cycle; its arrival ends the cycle
+        serializer = self.mqtt.serializer
+        mode = self.config.MQTT_PUBLISH_MODE or "subtopic"
+        if mode == "subtopic":
+            return serializer.subtopic_table[-1][2].decode()[len(self.name) + 1:]
+        if mode == "device":
+            return "state"
+        return serializer.topic_table[-1][0]
+
+    def messages_per_cycle(self):
+        mode = self.config.MQTT_PUBLISH_MODE or "subtopic"
+        if mode == "subtopic":
+            return len(self.mqtt.serializer.subtopic_table)
+        return 1 if mode == "device" else len(self.mqtt.serializer.topic_table)
+
+    async def run(self):
+        args = self.args
+        # Devices boot spread over one interval, like a fleet that has been running for a while
+        await asyncio.sleep(random.uniform(0, args.interval))
+        link = asyncio.create_task(self.mqtt.run())
+        try:
+            while True:
+                if self.mqtt.is_connected:
+                    self.cycle_starts.append(time.monotonic())
+                    if await self.mqtt.publish_data(self.sample()):
+                        self.stats["cycles"] += 1
+                    else:
+                        self.stats["failed"] += 1
+                        self.cycle_starts.clear()
+                else:
+                    self.stats["skipped"] += 1
+                    self.cycle_starts.clear()
+                await asyncio.sleep(args.interval * (1 + random.uniform(-args.jitter, args.jitter)))
+        finally:
+            link.cancel()
+            if self.mqtt.client:
+                await self.mqtt.client.disconnect()
+
+
+class Controller:
+    # Stands in for the home-automation side: sends commands and watches the fleet
+
+    def __init__(self, host, port, args):
+        from managers.mqtt_client import MQTTAsyncClient
+
+        self.args = args
+        self.client = MQTTAsyncClient("pumpi-fleet-controller", host, port, keepalive=60)
+        self.client.set_callback(self._on_message)
+        self.devices = {}
+        self.probe_suffix = ""
+        self.round_start = None
+        self.round_targets = 0
+        self.round_acks = set()
+        self.round_rtts = []
+        self.e2e = []
+        self.rtt = []
+        self.fanout = []
+        self.stats = {"rounds": 0, "commands": 0, "acks": 0, "late_acks": 0, "lost_acks": 0, "unmatched_probes": 0,
+                      "reconnects": 0}
+
+    async def connect(self):
+        await self.client.connect()
+        await self.client.subscribe(f"+/{ACK_TOPIC}")
+        await self.client.subscribe(f"+/{self.probe_suffix}")
+        # Cycles published while the probe was unsubscribed would never be matched
+        for device in self.devices.values():
+            device.cycle_starts.clear()
+
+    async def run(self):
+        # The controller rides out reconnect storms like any other client
+        while True:
+            await asyncio.sleep(0.2)
+            if not self.client.is_connected:
+                try:
+                    await self.connect()
+                    self.stats["reconnects"] += 1
+                except Exception:
+                    pass
+
+    def _on_message(self, topic, msg):
+        now = time.monotonic()
+        name, _, suffix = topic.decode().partition("/")
+        device = self.devices.get(name)
+        if device is None:
+            return
+        if suffix == ACK_TOPIC:
+            if self.round_start is None or name in self.round_acks:
+                self.stats["late_acks"] += 1
+                return
+            self.round_acks.add(name)
+            self.stats["acks"] += 1
+            self.round_rtts.append(now - self.round_start)
+        elif device.cycle_starts:
+            self.e2e.append(now - device.cycle_starts.popleft())
+        else:
+            self.stats["unmatched_probes"] += 1
+
+    def _close_round(self):
+        if self.round_start is None:
+            return
+        self.stats["lost_acks"] += self.round_targets - len(self.round_acks)
+        self.rtt.extend(self.round_rtts)
+        if self.round_rtts:
+            self.fanout.append(max(self.round_rtts))
+        self.round_start = None
+
+    async def command_rounds(self):
+        index = 0
+        while True:
+            await asyncio.sleep(self.args.command_interval)
+            self._close_round()
+            suffix, payload = COMMANDS[index % len(COMMANDS)]
+            index += 1
+            if not self.client.is_connected:
+                continue
+            targets = [name for name, device in self.devices.items() if device.mqtt.is_connected]
+            self.round_acks = set()
+            self.round_rtts = []
+            self.stats["rounds"] += 1
+            self.round_start = time.monotonic()
+            sent = 0
+            with contextlib.suppress(OSError):
+                for name in targets:
+                    await self.client.publish(f"{name}/{suffix}".encode(), payload.encode())
+                    sent += 1
+            # A storm can cut a fan-out short; only delivered commands can be acked
+            self.round_targets = sent
+            self.stats["commands"] += sent
+
+    def report(self):
+        self._close_round()
+        stats = dict(self.stats)
+        stats.update(summarize(self.e2e, "e2e_ms"))
+        stats.update(summarize(self.rtt, "command_rtt_ms"))
+        stats.update(summarize(self.fanout, "fanout_ms"))
+        return stats
+
+
+class Fleet:
+    def __init__(self, args, net=None):
+        self.args = args
+        self.net = net
+        self.devices = []
+        self.storms = []
+        self.loop_lag = []
+
+    def broker_address(self):
+        if self.args.broker:
+            host, _, port = self.args.broker.partition(":")
+            return host, int(port or 1883)
+        return "127.0.0.1", self.net.ports["mqtt"]
+
+    async def run(self):
+        args = self.args
+        host, port = self.broker_address()
+        ports = self.net.ports if self.net else {"mqtt": port, "influx": 0, "ntp": 0}
+        values = sim_config(ports, MQTT_BROKER_ADDRESS=host, MQTT_UPDATE_INTERVAL=args.interval,
+                            MQTT_PUBLISH_MODE=args.mode, MQTT_QOS=args.qos)
+        controller = Controller(host, port, args)
+        for i in range(args.devices):
+            device = VirtualDevice(f"{args.prefix}-{i:04d}", values, args)
+            self.devices.append(device)
+            controller.devices[device.name] = device
+        controller.probe_suffix = self.devices[0].probe_suffix()
+        await controller.connect()
+
+        tasks = [asyncio.create_task(device.run()) for device in self.devices]
+        tasks.append(asyncio.create_task(self._watch_loop_lag()))
+        tasks.append(asyncio.create_task(controller.run()))
+        if args.command_interval:
+            tasks.append(asyncio.create_task(controller.command_rounds()))
+        if args.storm_every:
+            tasks.append(asyncio.create_task(self._storms()))
+        broker_before = self.net.call("stats")["mqtt"] if self.net else None
+        start = time.monotonic()
+        try:
+            await asyncio.sleep(args.duration)
+        finally:
+            elapsed = time.monotonic() - start
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await controller.client.disconnect()
+        return self.report(controller, elapsed, broker_before)
+
+    async def _watch_loop_lag(self, period=0.05):
+        # A saturated generator would show up as end-to-end latency; this tells the two apart
+        while True:
+            expected = time.monotonic() + period
+            await asyncio.sleep(period)
+            self.loop_lag.append(max(time.monotonic() - expected, 0))
+
+    async def _storms(self):
+        args = self.args
+        while True:
+            await asyncio.sleep(args.storm_every)
+            start = time.monotonic()
+            if self.net:
+                # Broker restart: every session drops and all devices come back through their backoff
+                self.net.call("broker_down")
+                await asyncio.sleep(args.storm_outage)
+                self.net.call("broker_up")
+            else:
+                await asyncio.gather(*(device.mqtt.client.disconnect() for device in self.devices
+                                       if device.mqtt.client and device.mqtt.is_connected))
+            recovered = time.monotonic()
+            while any(not device.mqtt.is_connected for device in self.devices):
+                if time.monotonic() - recovered > args.storm_every:
+                    break
+                await asyncio.sleep(0.05)
+            connected = sum(device.mqtt.is_connected for device in self.devices)
+            self.storms.append({
+                "outage_ms": round((recovered - start) * 1000, 1),
+                "recovery_ms": round((time.monotonic() - recovered) * 1000, 1),
+                "reconnected": connected
+            })
+
+    def report(self, controller, elapsed, broker_before):
+        from managers.metrics import registry
+
+        args = self.args
+        per_cycle = self.devices[0].messages_per_cycle()
+        cycles = sum(device.stats["cycles"] for device in self.devices)
+        publish = registry.histogram("mqtt_publish_ms")
+        results = {
+            "devices": args.devices,
+            "duration_s": round(elapsed, 1),
+            "interval_s": args.interval,
+            "jitter": args.jitter,
+            "mode": args.mode,
+            "qos": args.qos,
+            "messages_per_cycle": per_cycle,
+            "cycles": cycles,
+            "cycles_failed": sum(device.stats["failed"] for device in self.devices),
+            "cycles_skipped": sum(device.stats["skipped"] for device in self.devices),
+            "messages_per_s": round(cycles * per_cycle / elapsed, 1),
+            "publish_cycle_p50_ms": round(publish.quantile(0.5), 1),
+            "publish_cycle_p99_ms": round(publish.quantile(0.99), 1),
+            "device_errors": sum(device.log.errors for device in self.devices),
+            "storms": self.storms
+        }
+        results.update(controller.report())
+        results.update(summarize(self.loop_lag, "generator_lag_ms"))
+        if self.net:
+            broker = self.net.call("stats")["mqtt"]
+            results["broker_publishes_per_s"] = round((broker["publishes"] - broker_before["publishes"]) / elapsed, 1)
+            results["broker_connects"] = broker["connects"] - broker_before["connects"]
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PicoW-PumPi fleet MQTT load generator")
+    parser.add_argument("--devices", type=int, default=100, help="number of virtual devices")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run")
+    parser.add_argument("--interval", type=float, default=10, help="publish interval per device in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="relative random spread of the publish interval")
+    parser.add_argument("--mode", default="topic", choices=["subtopic", "topic", "device"], help="MQTT_PUBLISH_MODE of the devices")
+    parser.add_argument("--qos", type=int, default=0, choices=[0, 1], help="MQTT_QOS of the devices")
+    parser.add_argument("--command-interval", type=float, default=5, help="seconds between command fan-outs, 0 disables them")
+    parser.add_argument("--storm-every", type=float, default=0, help="seconds between reconnect storms, 0 disables them")
+    parser.add_argument("--storm-outage", type=float, default=1, help="seconds the simulated broker stays down per storm")
+    parser.add_argument("--broker", help="host[:port] of a real broker instead of the simulated one")
+    parser.add_argument("--prefix", default="pumpi-fleet", help="client name prefix of the virtual devices")
+    parser.add_argument("--output", help="write JSON results to this file (default: stdout)")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        net = None if args.broker else stack.enter_context(SimNetwork())
+        sim.install(trace_allocations=False)
+        results = asyncio.run(Fleet(args, net).run())
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# Boots the unmodified firmware (src/main.py) on the host against the
+# simulated network. Usage: python host/run_sim.py [seconds]
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import sim  # noqa: E402
+from sim.app import DeviceFilesystem, sim_config  # noqa: E402
+from sim.netproc import SimNetwork  # noqa: E402
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    with SimNetwork() as net:
+        sim.install(trace_allocations=False)
+        with DeviceFilesystem(sim_config(net.ports)):
+            import main as firmware
+
+            # main.main() never returns; end the run from a timer instead
+            timer = threading.Timer(duration, lambda: os._exit(_report(net)))
+            timer.daemon = True
+            timer.start()
+            firmware.main()
+
+
+def _report(net):
+    stats = net.call("stats")
+    print(f"--- {stats['mqtt']['publishes']} MQTT publishes, {stats['influx']['points']} Influx points, "
+          f"{stats['influx']['queries']} Influx queries, {stats['ntp_requests']} NTP requests")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# Shared state of the simulated board. The harness flips these knobs to
+# inject faults; the stand-in modules read them.
+import time
+
+RP2_EPOCH_BOOT = 1609459200  # The Pico RTC comes up at 2021-01-01 00:00:00
+
+
+class BoardState:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.boot_monotonic = time.monotonic()
+        self.rtc_offset = RP2_EPOCH_BOOT - time.time()
+        self.wifi_up = True
+        # A full join scans every channel and runs DHCP; a join with a known
+        # BSSID and channel and a static address only associates
+        self.wifi_scan_ms = 1200
+        self.wifi_assoc_ms = 150
+        self.wifi_dhcp_ms = 600
+        self.wifi_bssid = b"\x3c\x84\x6a\x11\x22\x33"
+        self.wifi_channel = 6
+        self.wifi_rssi = -58
+        self.wifi_fail_status = -2
+        self.adc_volts = {26: 1.2, 27: 1.5, 28: 0.8, 29: 1.65}
+        self.adc_noise = 0.002
+        self.chip_temperature = 27.0
+        self.pins = {}
+        self.wdt_timeout_ms = None
+        self.wdt_last_feed = None
+        self.wdt_feeds = 0
+        self.wdt_max_gap_ms = 0
+        self.wdt_expired = 0
+        self.reset_requested = 0
+        self.reset_cause = 1
+        self.lightsleep_ms = 0
+        self.radio_on_ms = 0
+        self.radio_since = None
+
+
+state = BoardState()
@@ -0,0 +1,151 @@
+# Simulated RP2040 peripherals: Pin, ADC, WDT and RTC read and update the
+# shared board state instead of hardware registers.
+import random
+import time as _time
+
+import utime
+from _sim import state
+
+PWRON_RESET = 1
+WDT_RESET = 3
+
+_CPU_FREQ = 125000000
+
+
+def freq(hz=None):
+    global _CPU_FREQ
+    if hz is None:
+        return _CPU_FREQ
+    _CPU_FREQ = hz
+
+
+def reset():
+    state.reset_requested += 1
+    raise SystemExit("machine.reset()")
+
+
+def soft_reset():
+    reset()
+
+
+def reset_cause():
+    return state.reset_cause
+
+
+def unique_id():
+    return b"\xe6\x61\x41\x04\x03\x50\x2a\x2b"
+
+
+def idle():
+    pass
+
+
+def lightsleep(ms=None):
+    if ms:
+        state.lightsleep_ms += ms
+        _time.sleep(ms / 1000)
+
+
+deepsleep = lightsleep
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, pin_id, mode=-1, pull=-1, value=None):
+        self.id = pin_id
+        self.mode = mode
+        self.pull = pull
+        self._value = 1 if pull == Pin.PULL_UP else 0
+        if value is not None:
+            self._value = 1 if value else 0
+        self._handler = None
+        self._trigger = 0
+        state.pins[pin_id] = self
+
+    def init(self, mode=-1, pull=-1, value=None):
+        self.mode = mode
+        self.pull = pull
+        if value is not None:
+            self._value = 1 if value else 0
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = 1 if v else 0
+
+    __call__ = value
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    high = on
+    low = off
+
+    def toggle(self):
+        self._value ^= 1
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self._handler = handler
+        self._trigger = trigger
+
+    def sim_drive(self, level):
+        # Drives an input from outside, firing the IRQ handler on a matching edge
+        level = 1 if level else 0
+        previous = self._value
+        self._value = level
+        if self._handler is None or previous == level:
+            return
+        if (level and self._trigger & Pin.IRQ_RISING) or (not level and self._trigger & Pin.IRQ_FALLING):
+            self._handler(self)
+
+
+class ADC:
+    CORE_TEMP = 4
+
+    def __init__(self, source):
+        self.channel = source.id if isinstance(source, Pin) else source
+
+    def read_u16(self):
+        if self.channel == 4:
+            volts = 0.706 - (state.chip_temperature - 27) * 0.001721
+        else:
+            volts = state.adc_volts.get(self.channel, 0.0)
+        volts += random.uniform(-state.adc_noise, state.adc_noise)
+        return max(0, min(65535, int(volts / 3.3 * 65535)))
+
+
+class WDT:
+    def __init__(self, id=0, timeout=5000):
+        state.wdt_timeout_ms = timeout
+        state.wdt_last_feed = utime.ticks_ms()
+
+    def feed(self):
+        now = utime.ticks_ms()
+        gap = utime.ticks_diff(now, state.wdt_last_feed)
+        if gap > state.wdt_max_gap_ms:
+            state.wdt_max_gap_ms = gap
+        if gap > state.wdt_timeout_ms:
+            # On hardware the board would have reset; here it is only counted
+            state.wdt_expired += 1
+        state.wdt_last_feed = now
+        state.wdt_feeds += 1
+
+
+class RTC:
+    def datetime(self, datetimetuple=None):
+        if datetimetuple is None:
+            tm = utime.gmtime()
+            return (tm[0], tm[1], tm[2], tm[6], tm[3], tm[4], tm[5], 0)
+        year, month, day, _, hour, minute, second = datetimetuple[:7]
+        target = utime.mktime((year, month, day, hour, minute, second, 0, 0))
+        state.rtc_offset = target - _time.time()
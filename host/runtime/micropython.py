@@ -0,0 +1,28 @@
+import gc
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def const(value):
+    return value
+
+
+def native(func):
+    return func
+
+
+viper = native
+
+
+def schedule(func, arg):
+    func(arg)
+
+
+def mem_info(verbose=False):
+    print(f"mem: total={gc.mem_alloc() + gc.mem_free()}, current={gc.mem_alloc()}, free={gc.mem_free()}")
+
+
+def opt_level(level=None):
+    return 0
@@ -0,0 +1,114 @@
+# Simulated CYW43 station interface. Joining takes the scan, association
+# and DHCP times from the board state and fails while state.wifi_up is False.
+import time as _time
+
+import utime
+from _sim import state
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+
+def hostname(name=None):
+    return "pumpi-sim"
+
+
+class WLAN:
+    PM_NONE = 0x10
+    PM_PERFORMANCE = 0xa11140
+    PM_POWERSAVE = 0xa11142
+
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self._active = False
+        self._connect_started = None
+        self._join_ms = 0
+        self._bssid_ok = True
+        self._failed = False
+        self._static = None
+        self._config = {"pm": 0xa11140}
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        is_active = bool(is_active)
+        if is_active != self._active:
+            # Radio power accounting for low-power runs
+            now = utime.ticks_ms()
+            if is_active:
+                state.radio_since = now
+            else:
+                state.radio_on_ms += utime.ticks_diff(now, state.radio_since)
+                state.radio_since = None
+        self._active = is_active
+        if not self._active:
+            self._connect_started = None
+
+    def connect(self, ssid=None, key=None, *, bssid=None, channel=None, **kwargs):
+        self._connect_started = utime.ticks_ms()
+        self._failed = False
+        self._bssid_ok = bssid is None or bytes(bssid) == state.wifi_bssid
+        join_ms = state.wifi_assoc_ms
+        if bssid is None or channel != state.wifi_channel:
+            join_ms += state.wifi_scan_ms
+        if self._static is None:
+            join_ms += state.wifi_dhcp_ms
+        # A wrong BSSID is given up on after one association attempt
+        self._join_ms = join_ms if self._bssid_ok else state.wifi_assoc_ms
+
+    def scan(self):
+        # Blocks like the real call
+        _time.sleep(state.wifi_scan_ms / 1000)
+        if not state.wifi_up:
+            return []
+        return [(b"sim-ssid", state.wifi_bssid, state.wifi_channel, state.wifi_rssi, 3, False)]
+
+    def disconnect(self):
+        self._connect_started = None
+
+    def status(self, param=None):
+        if param == "rssi":
+            return state.wifi_rssi
+        if not self._active or self._connect_started is None:
+            return STAT_IDLE
+        if utime.ticks_diff(utime.ticks_ms(), self._connect_started) < self._join_ms:
+            return STAT_CONNECTING
+        if not self._bssid_ok:
+            return STAT_NO_AP_FOUND
+        # A failed or lost join stays down until the next connect()
+        if self._failed or not state.wifi_up:
+            self._failed = True
+            return state.wifi_fail_status
+        return STAT_GOT_IP
+
+    def isconnected(self):
+        return self.status() == STAT_GOT_IP
+
+    def ifconfig(self, config=None):
+        if config is not None:
+            self._static = None if config == "dhcp" else tuple(config)
+            return None
+        if self.isconnected():
+            return self._static or ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+        return ("0.0.0.0", "0.0.0.0", "0.0.0.0", "0.0.0.0")
+
+    def config(self, *args, **kwargs):
+        if kwargs:
+            self._config.update(kwargs)
+            return None
+        if args:
+            if args[0] == "mac":
+                return b"\x28\xcd\xc1\x00\x00\x01"
+            if args[0] == "channel":
+                return state.wifi_channel
+            if args[0] not in self._config:
+                # Like the CYW43 port, which has no "bssid" parameter either
+                raise ValueError("unknown config param")
+            return self._config[args[0]]
@@ -0,0 +1,15 @@
+import time as _time
+
+import machine
+import utime
+
+host = "pool.ntp.org"
+
+
+def time():
+    return int(_time.time())
+
+
+def settime():
+    tm = utime.gmtime(time())
+    machine.RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
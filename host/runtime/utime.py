@@ -0,0 +1,67 @@
+# MicroPython utime on top of the host clock. Tick counters wrap at 2**30
+# like on the RP2040 so ticks_diff/ticks_add bugs show up off-device.
+import calendar
+import time as _time
+
+from _sim import state
+
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+
+def _elapsed():
+    return _time.monotonic() - state.boot_monotonic
+
+
+def ticks_ms():
+    return int(_elapsed() * 1000) & TICKS_MAX
+
+
+def ticks_us():
+    return int(_elapsed() * 1000000) & TICKS_MAX
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+def time():
+    return int(_time.time() + state.rtc_offset)
+
+
+def time_ns():
+    return int((_time.time() + state.rtc_offset) * 1000000000)
+
+
+def gmtime(secs=None):
+    if secs is None:
+        secs = time()
+    return tuple(_time.gmtime(secs))[:8]
+
+
+localtime = gmtime
+
+
+def mktime(tm):
+    return calendar.timegm(tuple(tm[:6]))
+
+
+def sleep(seconds):
+    _time.sleep(seconds)
+
+
+def sleep_ms(ms):
+    _time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    _time.sleep(us / 1000000)
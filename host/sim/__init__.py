@@ -0,0 +1,45 @@
+import gc
+import os
+import sys
+import tracemalloc
+
+HOST_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(HOST_DIR)
+RUNTIME_DIR = os.path.join(HOST_DIR, "runtime")
+SRC_DIR = os.path.join(REPO_DIR, "src")
+
+# RP2040 MicroPython heap available to Python code on a Pico W
+HEAP_SIZE = 192 * 1024
+# Rough ratio of CPython to MicroPython object sizes (dicts, strings, small ints)
+OBJECT_SCALE = 4
+
+
+def install(trace_allocations=True):
+    # Puts the MicroPython stand-ins and the device sources on sys.path and
+    # gives gc the mem_alloc/mem_free calls the device code relies on.
+    for path in (SRC_DIR, RUNTIME_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    if trace_allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    gc.mem_alloc = _mem_alloc
+    gc.mem_free = lambda: max(HEAP_SIZE - _mem_alloc(), 0)
+    if not hasattr(gc, "threshold"):
+        gc.threshold = lambda amount=None: -1
+
+
+_resident = 0
+
+
+def mark_resident():
+    # CPython code objects are many times larger than MicroPython bytecode, so
+    # whatever is allocated at this point is treated like frozen firmware and
+    # only later allocations count against HEAP_SIZE.
+    global _resident
+    _resident = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+def _mem_alloc():
+    if tracemalloc.is_tracing():
+        return max(tracemalloc.get_traced_memory()[0] - _resident, 0) // OBJECT_SCALE
+    return 0
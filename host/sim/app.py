@@ -0,0 +1,75 @@
+import importlib
+import json
+import os
+import shutil
+import socket
+import tempfile
+
+from sim import SRC_DIR
+
+
+def sim_config(ports, client_name="pumpi-sim", **overrides):
+    with open(os.path.join(SRC_DIR, "config.json.template")) as f:
+        config = json.load(f)
+    config.update({
+        "WIFI_SSID": "sim-ssid",
+        "WIFI_PASSWORD": "sim-password",
+        "WIFI_COUNTRY": "DE",
+        "MQTT_CLIENT_NAME": client_name,
+        "MQTT_BROKER_ADDRESS": "127.0.0.1",
+        "MQTT_BROKER_PORT": ports["mqtt"],
+        "MQTT_UPDATE_INTERVAL": 1,
+        "INFLUXDB_HOST": f"127.0.0.1:{ports['influx']}",
+        "INFLUXDB_ORG": "sim",
+        "INFLUXDB_BUCKET": "sim",
+        "INFLUXDB_TOKEN": "sim-token",
+        "NTP_HOST": f"127.0.0.1:{ports['ntp']}",
+        "METRICS_HTTP_PORT": free_port(),
+        "MOISTURE_TOPICS": [f"growmat-sim/moisture/plant_{i}" for i in range(1, 5)],
+        "INFLUXDB_WRITE_ENABLED": True,
+        "INFLUXDB_WRITE_MAX_AGE": 5
+    })
+    config.update(overrides)
+    return config
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class DeviceFilesystem:
+    # A scratch working directory standing in for the Pico's flash
+
+    def __init__(self, config):
+        self.config = config
+        self.path = None
+        self.previous_cwd = None
+
+    def __enter__(self):
+        self.path = tempfile.mkdtemp(prefix="pumpi-sim-")
+        with open(os.path.join(self.path, "config.json"), "w") as f:
+            json.dump(self.config, f)
+        self.previous_cwd = os.getcwd()
+        os.chdir(self.path)
+        return self
+
+    def __exit__(self, *exc):
+        os.chdir(self.previous_cwd)
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def reset_board():
+    from _sim import state
+    state.reset()
+    return state
+
+
+def preload_firmware():
+    # Imports every firmware module up front so CPython import cost stays out
+    # of the simulated heap figures
+    for name in sorted(os.listdir(os.path.join(SRC_DIR, "managers"))):
+        if name.endswith(".py"):
+            importlib.import_module("managers." + name[:-3])
+    importlib.import_module("picow_pumpi")
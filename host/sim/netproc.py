@@ -0,0 +1,140 @@
+# Runs the simulated services in a separate process, so their CPU time and
+# allocations stay out of the device-side measurements. The harness drives
+# them over a pipe with small (command, args) messages.
+import asyncio
+import multiprocessing
+
+from sim.servers import InfluxStandIn, MQTTBroker, NTPServer
+
+
+class SimNetwork:
+    def __init__(self):
+        self.process = None
+        self.conn = None
+        self.ports = None
+
+    def start(self):
+        parent, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve, args=(child, parent), daemon=True)
+        self.process.start()
+        child.close()
+        self.conn = parent
+        self.ports = self.conn.recv()
+        return self.ports
+
+    def call(self, command, *args):
+        self.conn.send((command, args))
+        ok, result = self.conn.recv()
+        if not ok:
+            raise RuntimeError(f"sim network command {command} failed: {result}")
+        return result
+
+    def stop(self):
+        if self.process is not None:
+            try:
+                self.call("shutdown")
+            except (EOFError, OSError, RuntimeError):
+                pass
+            self.process.join(2)
+            self.process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _serve(conn, parent_end):
+    # Without this the child would keep its own pipe open and never see EOF
+    parent_end.close()
+    asyncio.run(_main(conn))
+
+
+async def _main(conn):
+    broker = MQTTBroker()
+    influx = InfluxStandIn()
+    ntp = NTPServer()
+    await broker.start()
+    await influx.start()
+    await ntp.start()
+    conn.send({"mqtt": broker.port, "influx": influx.port, "ntp": ntp.port})
+
+    done = asyncio.Event()
+    commands = _Commands(broker, influx, ntp, done)
+    loop = asyncio.get_running_loop()
+
+    def on_readable():
+        try:
+            command, args = conn.recv()
+        except (EOFError, OSError):
+            done.set()
+            return
+        loop.create_task(commands.dispatch(conn, command, args))
+
+    loop.add_reader(conn.fileno(), on_readable)
+    await done.wait()
+    loop.remove_reader(conn.fileno())
+
+
+class _Commands:
+    def __init__(self, broker, influx, ntp, done):
+        self.broker = broker
+        self.influx = influx
+        self.ntp = ntp
+        self.done = done
+
+    async def dispatch(self, conn, command, args):
+        try:
+            result = await getattr(self, "cmd_" + command)(*args)
+            conn.send((True, result))
+        except Exception as e:
+            conn.send((False, repr(e)))
+
+    async def cmd_shutdown(self):
+        self.done.set()
+
+    async def cmd_reset(self):
+        self.broker.reset_stats()
+        self.broker.stall_ms = 0
+        self.influx.reset_stats()
+        self.influx.fail_status = None
+        self.influx.latency_ms = 0
+        self.ntp.enabled = True
+        if self.broker.server is None:
+            await self.broker.start()
+
+    async def cmd_stats(self):
+        return {
+            "mqtt": dict(self.broker.stats, sessions=len(self.broker.sessions)),
+            "topics": dict(self.broker.topic_counts),
+            "influx": dict(self.influx.stats),
+            "ntp_requests": self.ntp.requests
+        }
+
+    async def cmd_messages(self, since=0.0):
+        return [m for m in self.broker.messages if m[0] >= since]
+
+    async def cmd_publish(self, topic, payload, qos=0):
+        return await self.broker.publish(topic, payload, qos)
+
+    async def cmd_broker_down(self):
+        await self.broker.stop_listening()
+        self.broker.drop_connections()
+
+    async def cmd_broker_up(self):
+        if self.broker.server is None:
+            await self.broker.start()
+
+    async def cmd_broker_stall(self, stall_ms):
+        self.broker.stall_ms = stall_ms
+
+    async def cmd_influx_fail(self, status=None):
+        self.influx.fail_status = status
+
+    async def cmd_influx_latency(self, latency_ms):
+        self.influx.latency_ms = latency_ms
+
+    async def cmd_ntp_enabled(self, enabled):
+        self.ntp.enabled = enabled
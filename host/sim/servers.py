@@ -0,0 +1,294 @@
+# In-process stand-ins for the services the device talks to. They run on
+# plain CPython asyncio inside the network process (see netproc.py).
+import asyncio
+import struct
+import time
+
+NTP_DELTA = 2208988800
+
+
+def topic_matches(topic_filter, topic):
+    filter_parts = topic_filter.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+class MQTTBroker:
+    # Enough of MQTT 3.1.1 for the device: CONNECT, PUBLISH (QoS 0/1),
+    # SUBSCRIBE, PINGREQ and DISCONNECT. Retained messages are not kept.
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.server = None
+        self.sessions = set()
+        self.stall_ms = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {
+            "connects": 0,
+            "publishes": 0,
+            "bytes": 0,
+            "pings": 0,
+            "subscribes": 0,
+            "pubacks_sent": 0,
+            "dropped_connections": 0
+        }
+        self.messages = []
+        self.topic_counts = {}
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop_listening(self):
+        # The port is refused until start() is called again
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    def drop_connections(self):
+        for session in list(self.sessions):
+            session.writer.close()
+            self.stats["dropped_connections"] += 1
+        self.sessions.clear()
+
+    async def publish(self, topic, payload, qos=0):
+        packet = self._publish_packet(topic.encode(), payload if isinstance(payload, bytes) else payload.encode())
+        sent = 0
+        for session in list(self.sessions):
+            if any(topic_matches(f, topic) for f in session.filters):
+                session.writer.write(packet)
+                await session.writer.drain()
+                sent += 1
+        return sent
+
+    def _publish_packet(self, topic, payload):
+        remaining = 2 + len(topic) + len(payload)
+        packet = bytearray(b"\x30")
+        packet.extend(self._encode_len(remaining))
+        packet.extend(struct.pack("!H", len(topic)))
+        packet.extend(topic)
+        packet.extend(payload)
+        return bytes(packet)
+
+    def _encode_len(self, n):
+        out = bytearray()
+        while True:
+            b = n & 0x7F
+            n >>= 7
+            out.append(b | 0x80 if n else b)
+            if not n:
+                return out
+
+    async def _read_packet(self, reader):
+        op = (await reader.readexactly(1))[0]
+        n = 0
+        shift = 0
+        while True:
+            b = (await reader.readexactly(1))[0]
+            n |= (b & 0x7F) << shift
+            if not b & 0x80:
+                break
+            shift += 7
+        payload = await reader.readexactly(n) if n else b""
+        return op, payload
+
+    async def _handle(self, reader, writer):
+        session = _Session(writer)
+        try:
+            op, payload = await self._read_packet(reader)
+            if op != 0x10:
+                return
+            self.sessions.add(session)
+            self.stats["connects"] += 1
+            writer.write(b"\x20\x02\x00\x00")
+            await writer.drain()
+            while True:
+                op, payload = await self._read_packet(reader)
+                if self.stall_ms:
+                    await asyncio.sleep(self.stall_ms / 1000)
+                kind = op & 0xF0
+                if kind == 0x30:
+                    await self._on_publish(session, op, payload)
+                elif kind == 0x80:
+                    await self._on_subscribe(session, payload)
+                elif kind == 0xC0:
+                    self.stats["pings"] += 1
+                    writer.write(b"\xd0\x00")
+                    await writer.drain()
+                elif kind == 0xE0:
+                    return
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError, OSError):
+            pass
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+    async def _on_publish(self, session, op, payload):
+        topic_len = struct.unpack("!H", payload[:2])[0]
+        topic = payload[2:2 + topic_len].decode()
+        pos = 2 + topic_len
+        qos = (op >> 1) & 0x03
+        if qos:
+            pid = payload[pos:pos + 2]
+            pos += 2
+            session.writer.write(b"\x40\x02" + pid)
+            await session.writer.drain()
+            self.stats["pubacks_sent"] += 1
+        body = payload[pos:]
+        self.stats["publishes"] += 1
+        self.stats["bytes"] += len(payload) + 2
+        self.topic_counts[topic] = self.topic_counts.get(topic, 0) + 1
+        self.messages.append((time.monotonic(), topic, len(body)))
+        if len(self.messages) > 10000:
+            del self.messages[:5000]
+        for other in list(self.sessions):
+            if other is not session and any(topic_matches(f, topic) for f in other.filters):
+                other.writer.write(self._publish_packet(topic.encode(), body))
+
+    async def _on_subscribe(self, session, payload):
+        pid = payload[:2]
+        pos = 2
+        granted = bytearray()
+        while pos < len(payload):
+            length = struct.unpack("!H", payload[pos:pos + 2])[0]
+            session.filters.append(payload[pos + 2:pos + 2 + length].decode())
+            granted.append(min(payload[pos + 2 + length], 1))
+            pos += 3 + length
+        self.stats["subscribes"] += 1
+        session.writer.write(b"\x90" + self._encode_len(2 + len(granted)) + pid + granted)
+        await session.writer.drain()
+
+
+class _Session:
+    def __init__(self, writer):
+        self.writer = writer
+        self.filters = []
+
+
+class InfluxStandIn:
+    # Answers /api/v2/write and /api/v2/query over HTTP/1.1 keep-alive.
+    # Query results are served chunked, like InfluxDB 2.x does.
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.server = None
+        self.water_tank_level = 73.5
+        self.last_watered = 1760000000
+        self.fail_status = None
+        self.latency_ms = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {"connections": 0, "requests": 0, "writes": 0, "points": 0, "queries": 0, "errors": 0}
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader, writer):
+        self.stats["connections"] += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    key, _, value = line.decode().partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.stats["requests"] += 1
+                if self.latency_ms:
+                    await asyncio.sleep(self.latency_ms / 1000)
+                await self._respond(writer, method, path, body)
+                if headers.get("connection", "").lower() == "close":
+                    return
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, method, path, body):
+        if self.fail_status:
+            self.stats["errors"] += 1
+            message = b'{"code":"unavailable","message":"simulated failure"}'
+            writer.write(b"HTTP/1.1 %d Error\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                         % (self.fail_status, len(message), message))
+        elif method == "POST" and path.startswith("/api/v2/write"):
+            self.stats["writes"] += 1
+            self.stats["points"] += body.count(b"\n")
+            writer.write(b"HTTP/1.1 204 No Content\r\n\r\n")
+        elif method == "POST" and path.startswith("/api/v2/query"):
+            self.stats["queries"] += 1
+            csv = self._query_csv(body.decode())
+            half = len(csv) // 2
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/csv; charset=utf-8\r\nTransfer-Encoding: chunked\r\n\r\n")
+            for chunk in (csv[:half], csv[half:]):
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            writer.write(b"0\r\n\r\n")
+        else:
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+        await writer.drain()
+
+    def _query_csv(self, query):
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        tables = []
+        if "water_tank_level" in query:
+            tables.append(("water_tank_level", "double", self.water_tank_level))
+        if "Last Watered" in query:
+            tables.append(("last_watered", "string", self.last_watered))
+        out = []
+        for result, datatype, value in tables:
+            # A single-lookup query yields under the default result name. Like
+            # InfluxDB, the result cell is left empty for #default and table
+            # numbers start at 0 in every result.
+            name = result if "yield(" in query else "_result"
+            out.append(f"#datatype,string,long,dateTime:RFC3339,{datatype}\r\n"
+                       f"#group,false,false,false,false\r\n"
+                       f"#default,{name},,,\r\n"
+                       f",result,table,_time,_value\r\n"
+                       f",,0,{now},{value}\r\n\r\n")
+        return "".join(out).encode()
+
+
+class NTPServer(asyncio.DatagramProtocol):
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.transport = None
+        self.enabled = True
+        self.requests = 0
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=(self.host, self.port))
+        self.port = self.transport.get_extra_info("sockname")[1]
+
+    def datagram_received(self, data, addr):
+        self.requests += 1
+        if not self.enabled or len(data) < 48:
+            return
+        now = time.time()
+        reply = bytearray(48)
+        reply[0] = 0x24  # LI 0, version 4, mode 4 (server)
+        reply[1] = 2
+        seconds = int(now) + NTP_DELTA
+        fraction = int((now % 1) * (1 << 32))
+        for offset in (32, 40):
+            struct.pack_into("!II", reply, offset, seconds, fraction)
+        reply[24:32] = data[40:48]
+        self.transport.sendto(bytes(reply), addr)
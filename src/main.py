@@ -1,7 +1,8 @@
 import uasyncio
-from picow_pumpi import PicoWPumPi
+from managers.module_loader import loader
 
 def main():
+    PicoWPumPi = loader.load("picow_pumpi", "PicoWPumPi")
     pumpi = PicoWPumPi()
     uasyncio.run(pumpi.run())
 
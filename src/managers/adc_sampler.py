@@ -0,0 +1,66 @@
+from array import array
+from machine import ADC, Pin
+import utime
+
+ADC_SCALE = 3.3 / 65535
+
+
+class AdcSampler:
+    def __init__(self, pins, oversample=4, calibration=None, max_age_ms=500):
+        calibration = calibration or {}
+        self.pins = pins
+        self.oversample = max(1, oversample)
+        self.max_age_ms = max_age_ms
+
+        # ADC channel objects are created once and reused for every read
+        self.channels = [ADC(Pin(pin)) for pin in pins]
+        self.temp_sensor = ADC(4)
+        self.vsys = ADC(29)
+
+        self.buffer = array('H', [0] * self.oversample)
+        self.offsets = array('f', [0.0] * len(pins))
+        self.gains = array('f', [1.0] * len(pins))
+        for i, pin in enumerate(pins):
+            offset, gain = calibration.get(str(pin), (0.0, 1.0))
+            self.offsets[i] = offset
+            self.gains[i] = gain
+        self.temperature_offset = calibration.get("temperature", 0.0)
+
+        self.values = array('f', [0.0] * len(pins))
+        self.internal_voltage = 0.0
+        self.chip_temperature = 0.0
+        self.last_sample_ms = utime.ticks_ms()
+        self.sampled = False
+        self.samples = 0
+        self.dedup_hits = 0
+
+    def _read_average(self, channel):
+        buf = self.buffer
+        for i in range(self.oversample):
+            buf[i] = channel.read_u16()
+        total = 0
+        for raw in buf:
+            total += raw
+        return total * ADC_SCALE / self.oversample
+
+    def sample(self):
+        now = utime.ticks_ms()
+        if self.sampled and utime.ticks_diff(now, self.last_sample_ms) < self.max_age_ms:
+            self.dedup_hits += 1
+            return False
+
+        values = self.values
+        for i, channel in enumerate(self.channels):
+            values[i] = self._read_average(channel) * self.gains[i] + self.offsets[i]
+
+        reading = self._read_average(self.temp_sensor)
+        self.chip_temperature = 27 - (reading - 0.706) / 0.001721 + self.temperature_offset
+        self.internal_voltage = self._read_average(self.vsys)
+
+        self.last_sample_ms = now
+        self.sampled = True
+        self.samples += 1
+        return True
+
+    def invalidate(self):
+        self.sampled = False
@@ -1,37 +1,132 @@
 import json
+import os
+import uasyncio
+import utime
 
 class ConfigManager:
-    def __init__(self, log_mgr):
+    def __init__(self, log_mgr, filename='config.json'):
         self.log_manager = log_mgr
+        self.filename = filename
         self._config = {}
+        self._subscribers = {}
+        self._save_task = None
+        self._last_change_ms = 0
+        self.save_delay_ms = 2000
+        self.writes = 0
         self.load_from_file()
-    
 
-    def load_from_file(self, filename='../config.json'):
+
+    def load_from_file(self, filename=None):
         try:
-            with open(filename, 'r') as f:
-                self._config = json.load(f)
+            with open(filename or self.filename, 'r') as f:
+                config = json.load(f)
+            for key in self._config:
+                if key not in config:
+                    try:
+                        delattr(self, key)
+                    except AttributeError:
+                        pass
+            self._config = config
+            # Cache every value as a plain attribute so hot paths skip __getattr__
+            for key, value in config.items():
+                setattr(self, key, value)
+            self.save_delay_ms = config.get("CONFIG_SAVE_DELAY_MS", 2000)
             self.log_manager.log("Configuration loaded successfully")
         except Exception as e:
-            self.log_manager.log(f"Error loading configuration: {e}")
+            self.log_manager.error("Error loading configuration: {}", e)
 
-    def save_to_file(self, filename='config.json'):
+    def save_to_file(self, filename=None):
+        filename = filename or self.filename
+        temp_filename = filename + '.tmp'
         try:
-            with open(filename, 'w') as f:
+            with open(temp_filename, 'w') as f:
                 json.dump(self._config, f)
+            os.rename(temp_filename, filename)
+            self.writes += 1
             self.log_manager.log("Configuration saved successfully")
         except Exception as e:
-            self.log_manager.log(f"Error saving configuration: {e}")
+            self.log_manager.error("Error saving configuration: {}", e)
+
+    def _convert(self, key, value):
+        current = self._config.get(key)
+        if not isinstance(value, str):
+            if isinstance(current, float) and isinstance(value, int) and not isinstance(value, bool):
+                return float(value)
+            return value
+
+        value = value.strip()
+        if isinstance(current, bool):
+            if value.lower() not in ('true', 'false'):
+                raise ValueError(f"expected true/false, got {value}")
+            return value.lower() == 'true'
+        if isinstance(current, int):
+            return int(value)
+        if isinstance(current, float):
+            return float(value)
+        if isinstance(current, (list, dict)):
+            converted = json.loads(value)
+            if not isinstance(converted, type(current)):
+                raise ValueError(f"expected {type(current).__name__}")
+            return converted
+        if isinstance(current, str):
+            return value
+
+        if value.lower() in ('true', 'false'):
+            return value.lower() == 'true'
+        if value.replace('.', '').isdigit():
+            return float(value) if '.' in value else int(value)
+        return value
 
     def update_config(self, key, value):
-        if key in self._config:
-            self._config[key] = value
-            self.save_to_file()
+        if key not in self._config:
+            return False
+        try:
+            value = self._convert(key, value)
+        except (ValueError, TypeError) as e:
+            self.log_manager.warning("Invalid value for {}: {}", key, e)
+            return False
+
+        if self._config[key] == value:
             return True
-        return False
+        self._config[key] = value
+        setattr(self, key, value)
+        self._schedule_save()
+        self._notify(key, value)
+        return True
+
+    def _schedule_save(self):
+        self._last_change_ms = utime.ticks_ms()
+        if self._save_task is None:
+            self._save_task = uasyncio.create_task(self._save_when_idle())
+
+    async def _save_when_idle(self):
+        # Bursts of updates (e.g. retained topics on reconnect) end in one write
+        while True:
+            remaining = self.save_delay_ms - utime.ticks_diff(utime.ticks_ms(), self._last_change_ms)
+            if remaining <= 0:
+                break
+            await uasyncio.sleep_ms(remaining)
+        self._save_task = None
+        self.save_to_file()
+
+    def flush(self):
+        if self._save_task is not None:
+            self._save_task.cancel()
+            self._save_task = None
+            self.save_to_file()
+
+    def subscribe(self, key, callback):
+        self._subscribers.setdefault(key, []).append(callback)
+
+    def _notify(self, key, value):
+        for callback in self._subscribers.get(key, ()):
+            try:
+                callback(key, value)
+            except Exception as e:
+                self.log_manager.error("Error notifying config subscriber for {}: {}", key, e)
 
     def get(self, key, default=None):
         return self._config.get(key, default)
 
     def __getattr__(self, name):
-        return self.get(name)
\ No newline at end of file
+        return self.get(name)
@@ -1,8 +1,3 @@
-import math
-import utime
-import ntptime
-import machine
-
 class DataManager:
     def __init__(self, config, log_mgr, system_mgr):
         self.config = config
@@ -14,14 +9,17 @@ class DataManager:
         return cpu_frequency / 1000000
 
 
-    def prepare_mqtt_data_for_publishing(self, system_data, current_config_data):
+    def prepare_mqtt_data_for_publishing(self, system_data, current_config_data, extra_data=None):
         try:
             mqtt_data = system_data
             data = {
                 "system": mqtt_data["system"],
                 "adc": mqtt_data["adc"],
+                "loop": mqtt_data["loop"],
                 "current_config": current_config_data
             }
+            if extra_data:
+                data.update(extra_data)
             return data
         except Exception as e:
             print(f"Error in prepare_mqtt_sensor_data_for_publishing: {e}")
@@ -0,0 +1,156 @@
+class FluxCSVParser:
+    def __init__(self, chunk_size=256, max_line=512):
+        self.chunk = bytearray(chunk_size)
+        self.line = bytearray(max_line)
+        self.line_len = 0
+        self.line_overflow = False
+        self.header = None
+        self.datatypes = None
+        self.defaults = None
+        self.rows = 0
+        self.skipped_lines = 0
+
+    def reset(self):
+        self.line_len = 0
+        self.line_overflow = False
+        self.header = None
+        self.datatypes = None
+        self.defaults = None
+        self.rows = 0
+        self.skipped_lines = 0
+
+    def _append(self, buf, start, end):
+        count = end - start
+        if self.line_len + count > len(self.line):
+            self.line_overflow = True
+            return
+        self.line[self.line_len:self.line_len + count] = buf[start:end]
+        self.line_len += count
+
+    def _split(self, line):
+        if '"' not in line:
+            return line.split(",")
+        fields = []
+        field = ""
+        quoted = False
+        i = 0
+        while i < len(line):
+            char = line[i]
+            if quoted:
+                if char == '"':
+                    if i + 1 < len(line) and line[i + 1] == '"':
+                        field += '"'
+                        i += 1
+                    else:
+                        quoted = False
+                else:
+                    field += char
+            elif char == '"':
+                quoted = True
+            elif char == ",":
+                fields.append(field)
+                field = ""
+            else:
+                field += char
+            i += 1
+        fields.append(field)
+        return fields
+
+    def _line_done(self):
+        if self.line_overflow:
+            self.line_len = 0
+            self.line_overflow = False
+            self.skipped_lines += 1
+            return None
+        line = bytes(self.line[:self.line_len]).decode().rstrip("\r")
+        self.line_len = 0
+
+        if not line:
+            # Blank line separates tables/results; a new header follows
+            self.header = None
+            self.datatypes = None
+            self.defaults = None
+            return None
+        if line[0] == "#":
+            # Annotation rows precede the header of a new table
+            if line.startswith("#datatype"):
+                self.datatypes = self._split(line)
+            elif line.startswith("#default"):
+                self.defaults = self._split(line)
+                # The first cell holds the annotation name, not a default
+                self.defaults[0] = ""
+            self.header = None
+            return None
+        if self.header is None:
+            self.header = self._split(line)
+            return None
+
+        self.rows += 1
+        header = self.header
+        fields = self._split(line)
+        defaults = self.defaults
+        datatypes = self.datatypes
+        row = {}
+        for i in range(min(len(header), len(fields))):
+            value = fields[i]
+            # InfluxDB leaves cells such as the yield name empty and puts them in #default
+            if not value and defaults and i < len(defaults):
+                value = defaults[i]
+            if value and datatypes and i < len(datatypes):
+                value = self._convert(datatypes[i], value)
+            row[header[i]] = value
+        return row
+
+    def _convert(self, datatype, value):
+        try:
+            if datatype == "double":
+                return float(value)
+            if datatype == "long" or datatype == "unsignedLong":
+                return int(value)
+        except ValueError:
+            return value
+        if datatype == "boolean":
+            return value == "true"
+        return value
+
+    def feed(self, buf, n):
+        # MicroPython's bytearray has no find(); one bytes copy per chunk is searched instead
+        data = bytes(memoryview(buf)[:n])
+        start = 0
+        while start < n:
+            end = data.find(b"\n", start)
+            if end < 0:
+                self._append(buf, start, n)
+                return
+            self._append(buf, start, end)
+            row = self._line_done()
+            if row is not None:
+                yield row
+            start = end + 1
+
+    def close(self):
+        if self.line_len or self.line_overflow:
+            row = self._line_done()
+            if row is not None:
+                yield row
+
+    async def parse(self, response, on_row):
+        # uasyncio has no async generators, so rows are pushed to a callback
+        self.reset()
+        while True:
+            n = await response.readinto(self.chunk)
+            if not n:
+                break
+            for row in self.feed(self.chunk, n):
+                on_row(row)
+        for row in self.close():
+            on_row(row)
+
+    async def last_rows(self, response):
+        last = {}
+
+        def keep_last(row):
+            last[(row.get("result", ""), row.get("table", ""))] = row
+
+        await self.parse(response, keep_last)
+        return last
@@ -0,0 +1,106 @@
+import gc
+import utime
+
+from managers.metrics import registry, US_BUCKETS
+from managers.scheduler import PRIORITY_LOW
+
+
+class GcManager:
+    def __init__(self, config, log_mgr):
+        self.config = config
+        self.log_mgr = log_mgr
+        self.heap_total = gc.mem_alloc() + gc.mem_free()
+        # Safety net: the VM collects by itself once this much was allocated since the last collection
+        gc.threshold(config.GC_THRESHOLD_BYTES or self.heap_total // 8)
+        self.high_water = config.GC_HIGH_WATER or 0.8
+        self.idle_bytes = config.GC_IDLE_BYTES or self.heap_total // 16
+        self.max_interval_ms = (config.GC_MAX_INTERVAL or 300) * 1000
+        self.live_bytes = gc.mem_alloc()
+        self.last_alloc = self.live_bytes
+        self.last_collect = utime.ticks_ms()
+        self.pause = registry.histogram("gc_pause_us", "Garbage collection pause", US_BUCKETS)
+        self.live = registry.gauge("heap_live_bytes", "Live heap after the last collection")
+        self.stats = {
+            "collections": 0,
+            "idle": 0,
+            "pressure": 0,
+            "interval": 0,
+            "manual": 0,
+            "auto": 0,
+            "total_us": 0,
+            "max_us": 0,
+            "last_us": 0,
+            "reclaimed_bytes": 0,
+            "last_reclaimed": 0
+        }
+
+    def _record(self, reason, elapsed_us, reclaimed, alloc):
+        stats = self.stats
+        stats["collections"] += 1
+        stats[reason] += 1
+        stats["total_us"] += elapsed_us
+        stats["last_us"] = elapsed_us
+        if elapsed_us > stats["max_us"]:
+            stats["max_us"] = elapsed_us
+        stats["reclaimed_bytes"] += reclaimed
+        stats["last_reclaimed"] = reclaimed
+        self.live_bytes = alloc
+        self.last_alloc = alloc
+        self.live.set(alloc)
+        self.last_collect = utime.ticks_ms()
+
+    def collect(self, reason="manual"):
+        before = gc.mem_alloc()
+        start = utime.ticks_us()
+        gc.collect()
+        elapsed = utime.ticks_diff(utime.ticks_us(), start)
+        after = gc.mem_alloc()
+        self.pause.observe(elapsed)
+        self._record(reason, elapsed, max(before - after, 0), after)
+        return elapsed
+
+    def _observe(self):
+        # The heap only grows between collections, so a drop means the VM
+        # (or another module) collected without going through collect().
+        alloc = gc.mem_alloc()
+        if alloc < self.last_alloc:
+            self._record("auto", 0, self.last_alloc - alloc, alloc)
+        else:
+            self.last_alloc = alloc
+        return alloc
+
+    def _idle_limit(self):
+        # The fuller the heap is with live data, the sooner garbage is cleared,
+        # so fragmentation doesn't leave no contiguous block for large buffers
+        free_share = (self.heap_total - self.live_bytes) / self.heap_total
+        return int(self.idle_bytes * max(free_share, 0.1))
+
+    def idle(self):
+        # Called by a task right before it sleeps for a while: nothing urgent is
+        # running, so the pause of a collection does not delay other work
+        alloc = self._observe()
+        if alloc - self.live_bytes >= self._idle_limit():
+            self.collect("idle")
+        elif utime.ticks_diff(utime.ticks_ms(), self.last_collect) >= self.max_interval_ms:
+            self.collect("interval")
+
+    def register_jobs(self, scheduler):
+        scheduler.every("gc", self.config.GC_CHECK_INTERVAL_MS or 500, self.check_pressure, PRIORITY_LOW)
+
+    def check_pressure(self):
+        alloc = self._observe()
+        if alloc >= self.heap_total * self.high_water and alloc - self.live_bytes >= self._idle_limit() // 4:
+            self.collect("pressure")
+
+    def ram_usage(self):
+        # Live data as of the last collection; reading it never collects
+        return self.live_bytes / self.heap_total if self.heap_total > 0 else 0
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        count = stats["collections"] - stats["auto"]
+        stats["avg_us"] = stats["total_us"] // count if count else 0
+        stats["live_bytes"] = self.live_bytes
+        stats["heap_alloc"] = self.last_alloc
+        stats["heap_free"] = self.heap_total - self.last_alloc
+        return stats
@@ -0,0 +1,196 @@
+import uasyncio
+import utime
+
+
+class HTTPError(Exception):
+    pass
+
+
+class HTTPResponse:
+    def __init__(self, client, status, headers, start_ms):
+        self.client = client
+        self.status = status
+        self.headers = headers
+        self.start_ms = start_ms
+        self.chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+        length = headers.get("content-length")
+        if status == 204 or status == 304 or 100 <= status < 200:
+            length = "0"
+        # None means the body runs until the server closes the connection
+        self.remaining = int(length) if length is not None else (0 if self.chunked else None)
+        self.chunk_remaining = 0
+        self.keep_alive = headers.get("connection", "").lower() != "close" and (self.chunked or length is not None)
+        self.done = False
+        if not self.chunked and self.remaining == 0:
+            self._finish()
+
+    async def _read(self, n):
+        return await uasyncio.wait_for(self.client._reader.read(n), self.client.timeout)
+
+    async def _readline(self):
+        return await uasyncio.wait_for(self.client._reader.readline(), self.client.timeout)
+
+    async def _next_chunk(self):
+        line = await self._readline()
+        size = int(line.split(b";")[0].strip(), 16)
+        if size == 0:
+            # Skip optional trailers up to the terminating blank line
+            while True:
+                line = await self._readline()
+                if not line or line == b"\r\n":
+                    break
+        return size
+
+    async def readinto(self, buf):
+        if self.done:
+            return 0
+        if self.chunked:
+            if self.chunk_remaining == 0:
+                self.chunk_remaining = await self._next_chunk()
+                if self.chunk_remaining == 0:
+                    self._finish()
+                    return 0
+            n = min(len(buf), self.chunk_remaining)
+        elif self.remaining is None:
+            n = len(buf)
+        else:
+            n = min(len(buf), self.remaining)
+
+        data = await self._read(n)
+        if not data:
+            if self.remaining is None:
+                self._finish()
+                return 0
+            raise HTTPError("Connection closed before end of body")
+        count = len(data)
+        buf[:count] = data
+
+        if self.chunked:
+            self.chunk_remaining -= count
+            if self.chunk_remaining == 0:
+                await self._readline()
+        elif self.remaining is not None:
+            self.remaining -= count
+            if self.remaining == 0:
+                self._finish()
+        return count
+
+    async def read(self):
+        buf = bytearray(512)
+        body = bytearray()
+        while True:
+            n = await self.readinto(buf)
+            if not n:
+                return bytes(body)
+            body.extend(buf[:n])
+
+    def _finish(self):
+        self.done = True
+        self.client._release(self)
+
+    def close(self):
+        if not self.done:
+            # Unread body left on the socket; the connection cannot be reused
+            self.done = True
+            self.keep_alive = False
+            self.client._release(self)
+
+
+class AsyncHTTPClient:
+    def __init__(self, host, port=80, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._response = None
+        self.stats = {
+            "requests": 0,
+            "connections": 0,
+            "reused": 0,
+            "errors": 0,
+            "last_ms": 0,
+            "max_ms": 0,
+            "total_ms": 0
+        }
+
+    async def _connect(self):
+        self._reader, self._writer = await uasyncio.wait_for(
+            uasyncio.open_connection(self.host, self.port), self.timeout)
+        self.stats["connections"] += 1
+
+    def close(self):
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+        self._reader = None
+        self._writer = None
+        self._response = None
+
+    async def request(self, method, path, headers=None, body=b""):
+        if self._response is not None:
+            self._response.close()
+        start = utime.ticks_ms()
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n"
+        if headers:
+            for key, value in headers.items():
+                head += f"{key}: {value}\r\n"
+        head = (head + "\r\n").encode()
+
+        reused = self._writer is not None
+        try:
+            return await self._send(method, head, body, start, reused)
+        except (OSError, HTTPError, uasyncio.TimeoutError):
+            self.close()
+            if not reused:
+                self.stats["errors"] += 1
+                raise
+        # The server may have dropped an idle keep-alive connection; retry once
+        try:
+            return await self._send(method, head, body, start, False)
+        except Exception:
+            self.stats["errors"] += 1
+            self.close()
+            raise
+
+    async def _send(self, method, head, body, start, reused):
+        if self._writer is None:
+            await self._connect()
+        elif reused:
+            self.stats["reused"] += 1
+        self._writer.write(head)
+        if body:
+            self._writer.write(body)
+        await uasyncio.wait_for(self._writer.drain(), self.timeout)
+
+        status_line = await uasyncio.wait_for(self._reader.readline(), self.timeout)
+        if not status_line:
+            raise HTTPError("Connection closed by server")
+        parts = status_line.split(None, 2)
+        status = int(parts[1])
+        headers = {}
+        while True:
+            line = await uasyncio.wait_for(self._reader.readline(), self.timeout)
+            if not line or line == b"\r\n":
+                break
+            key, _, value = line.decode().partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        self.stats["requests"] += 1
+        response = HTTPResponse(self, status, headers, start)
+        if not response.done:
+            self._response = response
+        return response
+
+    def _release(self, response):
+        elapsed = utime.ticks_diff(utime.ticks_ms(), response.start_ms)
+        self.stats["last_ms"] = elapsed
+        self.stats["total_ms"] += elapsed
+        if elapsed > self.stats["max_ms"]:
+            self.stats["max_ms"] = elapsed
+        if self._response is response:
+            self._response = None
+        if not response.keep_alive:
+            self.close()
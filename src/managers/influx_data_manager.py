@@ -1,121 +1,218 @@
-import urequests
+import json
+import os
 import utime
 import uasyncio
 
+from managers.http_client import AsyncHTTPClient
+from managers.flux_csv_parser import FluxCSVParser
+from managers.metrics import registry
+
 class InfluxDataManager:
     def __init__(self, config, log_manager):
         self.config = config
         self.log_manager = log_manager
-        self.base_url = f"http://{config.INFLUXDB_HOST}/api/v2"
+        host, _, port = config.INFLUXDB_HOST.partition(":")
+        self.http = AsyncHTTPClient(host, int(port) if port else 80, config.INFLUXDB_TIMEOUT or 10)
+        self.query_latency = registry.histogram("influx_query_ms", "InfluxDB query duration including parsing")
+        self.query_failures = registry.counter("influx_query_failures_total", "InfluxDB queries that failed")
         self.org = config.INFLUXDB_ORG
         self.bucket = config.INFLUXDB_BUCKET
         self.token = config.INFLUXDB_TOKEN
         self.lookup_interval_in_days = 30
-
-    async def _query_influxdb(self, query):
-        url = f"{self.base_url}/query?org={self.org}"
-        headers = {
+        self.query_path = f"/api/v2/query?org={self.org}"
+        self.query_headers = {
             "Authorization": f"Token {self.token}",
             "Content-Type": "application/vnd.flux",
-            "Accept": "application/csv"
+            "Accept": "application/csv",
+            "Connection": "keep-alive"
         }
+        self.csv_parser = FluxCSVParser(config.INFLUXDB_CHUNK_SIZE or 256)
+
+        self.cache_file = config.INFLUXDB_CACHE_FILE or "influx_cache.json"
+        self.cache_ttl = config.INFLUXDB_CACHE_TTL or 3600
+        self.cache_retry_interval = config.INFLUXDB_CACHE_RETRY_INTERVAL or 300
+        self.water_tank_level = None
+        self.last_watered = None
+        self.cache_updated = None
+        self.load_cache()
+
+    def load_cache(self):
         try:
-            response = None
-            request_sent = False
-            while not request_sent:
-                try:
-                    response = urequests.post(url, headers=headers, data=query)
-                    request_sent = True
-                except OSError as e:
-                    if e.errno != 11:  # EAGAIN error
-                        raise
-                await uasyncio.sleep(0)  # Yield control
-
-            if response.status_code == 200:
-                return response.text
-            else:
-                self.log_manager.log(f"InfluxDB query failed with status code {response.status_code}")
-                self.log_manager.log(f"Response content: {response.text[:200]}...")  # Log first 200 characters
+            with open(self.cache_file) as f:
+                cache = json.load(f)
+            self.water_tank_level = cache.get("water_tank_level")
+            self.last_watered = cache.get("last_watered")
+            self.cache_updated = cache.get("updated")
+            self.log_manager.log("InfluxDB cache loaded (age {} s)", self.cache_age())
+        except OSError:
+            pass
+        except Exception as e:
+            self.log_manager.error("Error loading InfluxDB cache: {}", e)
+
+    def save_cache(self):
+        temp_file = self.cache_file + ".tmp"
+        try:
+            with open(temp_file, "w") as f:
+                json.dump({
+                    "water_tank_level": self.water_tank_level,
+                    "last_watered": self.last_watered,
+                    "updated": self.cache_updated
+                }, f)
+            os.rename(temp_file, self.cache_file)
+        except Exception as e:
+            self.log_manager.error("Error saving InfluxDB cache: {}", e)
+
+    def cache_age(self):
+        if self.cache_updated is None:
+            return None
+        return utime.time() - self.cache_updated
+
+    def is_cache_stale(self):
+        age = self.cache_age()
+        # A negative age means the clock was not synchronized when the cache was written
+        return age is None or age < 0 or age >= self.cache_ttl
+
+    def get_cached_values(self):
+        return self.water_tank_level, self.last_watered
+
+    def get_cache_data(self):
+        return {
+            "water_tank_level": self.water_tank_level,
+            "last_watered": self.last_watered,
+            "cache_age": self.cache_age()
+        }
+
+    async def _query_influxdb(self, query):
+        # Returns the last row of every result table, keyed by (result, table)
+        response = None
+        start = utime.ticks_ms()
+        try:
+            response = await self.http.request("POST", self.query_path, self.query_headers, query.encode())
+            if response.status != 200:
+                body = await response.read()
+                self.log_manager.error("InfluxDB query failed with status code {}: {}", response.status, body[:200])
+                self.query_failures.inc()
                 return None
+
+            rows = await self.csv_parser.last_rows(response)
+            self.log_manager.debug("InfluxDB query took {} ms, {} rows parsed", self.http.stats["last_ms"], self.csv_parser.rows)
+            return rows
         except Exception as e:
-            self.log_manager.log(f"Error in InfluxDB query: {e}")
+            self.log_manager.error("Error in InfluxDB query: {}", e)
+            self.query_failures.inc()
             return None
         finally:
             if response:
                 response.close()
+            self.query_latency.observe(utime.ticks_diff(utime.ticks_ms(), start))
 
-    def _parse_csv_response(self, csv_data):
-        lines = csv_data.strip().split('\n')
-        if len(lines) < 2:
-            self.log_manager.log(f"Unexpected CSV format: {csv_data}")
-            return None
-        headers = lines[0].split(',')
-        values = lines[-1].split(',')
-        return dict(zip(headers, values))
-
-    def _safe_float_conversion(self, value):
-        try:
-            return float(value)
-        except ValueError:
-            self.log_manager.log(f"Error converting to float: {value}")
-            return None
+    def _last_value(self, rows, result=None):
+        value = None
+        for (result_name, _), row in rows.items():
+            if result is not None and result_name != result:
+                continue
+            if row.get("error"):
+                self.log_manager.error("InfluxDB query error: {}", row['error'])
+                return None
+            if '_value' in row:
+                value = row['_value']
+        return value
 
-    async def get_water_tank_level(self):
-        query = f'''
+    def _tank_level_query(self):
+        return f'''
         from(bucket:"{self.bucket}")
           |> range(start: -{self.lookup_interval_in_days}d)
           |> filter(fn: (r) => r.entity_id == "water_tank_level")
           |> last()
         '''
-        result = await self._query_influxdb(query)
-        if result:
-            try:
-                parsed_result = self._parse_csv_response(result)
-                if parsed_result and '_value' in parsed_result:
-                    return self._safe_float_conversion(parsed_result['_value'])
-            except Exception as e:
-                self.log_manager.log(f"Error parsing water tank level: {e}")
-                self.log_manager.log(f"Raw response: {result}")
-        return None
 
-    async def get_last_watered_time(self):
-        query = f'''
+    def _last_watered_query(self):
+        return f'''
         from(bucket:"{self.bucket}")
           |> range(start: -{self.lookup_interval_in_days}d)
           |> filter(fn: (r) => r["friendly_name"] == "M5 Unit Last Watered")
           |> last()
         '''
-        result = await self._query_influxdb(query)
-        if result:
-            try:
-                parsed_result = self._parse_csv_response(result)
-                if parsed_result and '_value' in parsed_result:
-                    return 0 if parsed_result['_value'] == "Never" else parsed_result['_value']
-            except Exception as e:
-                self.log_manager.log(f"Error parsing last watered time: {e}")
-                self.log_manager.log(f"Raw response: {result}")
+
+    def _convert_tank_level(self, value):
+        return self._safe_float_conversion(value) if value is not None else None
+
+    def _convert_last_watered(self, value):
+        if value is None:
+            return None
+        return 0 if value == "Never" else value
+
+    def _safe_float_conversion(self, value):
+        try:
+            return float(value)
+        except ValueError:
+            self.log_manager.warning("Error converting to float: {}", value)
+            return None
+
+    async def get_water_tank_level(self):
+        rows = await self._query_influxdb(self._tank_level_query())
+        if rows:
+            return self._convert_tank_level(self._last_value(rows))
+        return None
+
+    async def get_last_watered_time(self):
+        rows = await self._query_influxdb(self._last_watered_query())
+        if rows:
+            return self._convert_last_watered(self._last_value(rows))
         return None
 
+    async def get_startup_values(self):
+        # Both lookups in one request; each yield becomes its own result table
+        query = (self._tank_level_query() + '|> yield(name: "water_tank_level")\n'
+                 + self._last_watered_query() + '|> yield(name: "last_watered")\n')
+        rows = await self._query_influxdb(query)
+        if not rows:
+            return None, None
+        return (self._convert_tank_level(self._last_value(rows, "water_tank_level")),
+                self._convert_last_watered(self._last_value(rows, "last_watered")))
+
     async def query_task(self):
         try:
             self.log_manager.log("Starting InfluxDB query task")
-            water_tank_level = await self.get_water_tank_level()
+            water_tank_level, last_watered = await self.get_startup_values()
             if water_tank_level is not None:
-                self.log_manager.log(f"Water tank level: {water_tank_level}")
+                self.log_manager.log("Water tank level: {}", water_tank_level)
             else:
                 self.log_manager.log("Failed to get water tank level from InfluxDB")
 
-            last_watered = await self.get_last_watered_time()
             if last_watered is not None:
                 try:
                     last_watered_time = utime.localtime(int(last_watered))
-                    self.log_manager.log(f"M5 Watering Unit last watered: {last_watered_time}")
+                    self.log_manager.log("M5 Watering Unit last watered: {}", last_watered_time)
                 except ValueError:
-                    self.log_manager.log(f"Error converting last watered time: {last_watered}")
+                    self.log_manager.warning("Error converting last watered time: {}", last_watered)
             else:
                 self.log_manager.log("Failed to get last watered time from InfluxDB")
             
+            if water_tank_level is not None or last_watered is not None:
+                if water_tank_level is not None:
+                    self.water_tank_level = water_tank_level
+                if last_watered is not None:
+                    self.last_watered = last_watered
+                self.cache_updated = utime.time()
+                self.save_cache()
+
+            stats = self.http.stats
+            self.log_manager.log("InfluxDB queries: {} requests over {} connection(s), {} ms total", stats['requests'], stats['connections'], stats['total_ms'])
             return water_tank_level, last_watered
         except Exception as e:
-            self.log_manager.log(f"Error when querying InfluxDB: {e}")
-            return None, None
\ No newline at end of file
+            self.log_manager.error("Error when querying InfluxDB: {}", e)
+            return None, None
+        finally:
+            self.http.close()
+
+    async def run(self):
+        # Cached values are served immediately; Influx is only asked when they expire
+        while True:
+            if self.is_cache_stale():
+                await self.query_task()
+                if self.is_cache_stale():
+                    self.log_manager.log("InfluxDB unreachable, serving cached values")
+                    await uasyncio.sleep(self.cache_retry_interval)
+                    continue
+            await uasyncio.sleep(max(self.cache_ttl - self.cache_age(), 1))
\ No newline at end of file
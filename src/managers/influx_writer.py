@@ -0,0 +1,143 @@
+import utime
+
+from managers.http_client import AsyncHTTPClient
+
+
+class InfluxLineWriter:
+    def __init__(self, config, log_manager):
+        self.config = config
+        self.log_manager = log_manager
+        host, _, port = config.INFLUXDB_HOST.partition(":")
+        self.http = AsyncHTTPClient(host, int(port) if port else 80, config.INFLUXDB_TIMEOUT or 10)
+        self.write_path = f"/api/v2/write?org={config.INFLUXDB_ORG}&bucket={config.INFLUXDB_BUCKET}&precision=s"
+        self.headers = {
+            "Authorization": f"Token {config.INFLUXDB_TOKEN}",
+            "Content-Type": "text/plain; charset=utf-8",
+            "Connection": "keep-alive"
+        }
+        self.topics = config.INFLUXDB_WRITE_TOPICS or ["system", "adc"]
+        self.tags = "device=" + self._escape_key(config.MQTT_CLIENT_NAME)
+
+        self.buffer = bytearray(config.INFLUXDB_WRITE_BUFFER_SIZE or 4096)
+        self.length = 0
+        self.points = 0
+        self.batch_bytes = config.INFLUXDB_WRITE_BATCH_BYTES or len(self.buffer) * 3 // 4
+        self.max_age_ms = (config.INFLUXDB_WRITE_MAX_AGE or 300) * 1000
+        self.oldest_ms = None
+
+        self.retry_max_ms = config.INFLUXDB_WRITE_RETRY_MAX_MS or 300000
+        self.retry_delay_ms = 0
+        self.next_attempt_ms = utime.ticks_ms()
+        self.flushing = False
+        self.stats = {"points": 0, "batches": 0, "failures": 0, "dropped": 0}
+
+    def _escape_key(self, value):
+        return value.replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+    def _format_field(self, key, value):
+        if value is True or value is False:
+            return f"{key}={'true' if value else 'false'}"
+        if isinstance(value, int):
+            return f"{key}={value}i"
+        if isinstance(value, float):
+            return f"{key}={value}"
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        return f'{key}="{escaped}"'
+
+    def add_snapshot(self, data, timestamp):
+        for topic in self.topics:
+            values = data.get(topic)
+            if not values:
+                continue
+            fields = ",".join(self._format_field(self._escape_key(key), value)
+                              for key, value in values.items() if value is not None)
+            if fields:
+                self._append(f"{self._escape_key(topic)},{self.tags} {fields} {timestamp}\n".encode())
+
+    def _append(self, line):
+        if len(line) > len(self.buffer):
+            self.stats["dropped"] += 1
+            return
+        if self.flushing and self.length + len(line) > len(self.buffer):
+            # The in-flight batch must stay in place until the request completes
+            self.stats["dropped"] += 1
+            return
+        while self.length + len(line) > len(self.buffer):
+            # Bounded backlog: evict the oldest buffered point
+            self._consume(self._first_line_end())
+            self.points -= 1
+            self.stats["dropped"] += 1
+        self.buffer[self.length:self.length + len(line)] = line
+        self.length += len(line)
+        self.points += 1
+        self.stats["points"] += 1
+        if self.oldest_ms is None:
+            self.oldest_ms = utime.ticks_ms()
+
+    def _first_line_end(self):
+        # bytearray.find() does not exist on MicroPython; lines are short, so scan by hand
+        buffer = self.buffer
+        end = 0
+        while end < self.length and buffer[end] != 10:
+            end += 1
+        return end + 1
+
+    def _consume(self, count):
+        remaining = self.length - count
+        self.buffer[:remaining] = self.buffer[count:self.length]
+        self.length = remaining
+        if not remaining:
+            self.oldest_ms = None
+
+    def flush_due(self):
+        if not self.length or self.flushing:
+            return False
+        now = utime.ticks_ms()
+        if utime.ticks_diff(now, self.next_attempt_ms) < 0:
+            return False
+        return self.length >= self.batch_bytes or utime.ticks_diff(now, self.oldest_ms) >= self.max_age_ms
+
+    async def flush(self):
+        if not self.length or self.flushing:
+            return True
+        self.flushing = True
+        length = self.length
+        points = self.points
+        response = None
+        try:
+            response = await self.http.request("POST", self.write_path, self.headers, memoryview(self.buffer)[:length])
+            if response.status in (200, 204):
+                await response.read()
+                # Points added while the request was in flight stay buffered
+                self._consume(length)
+                self.points -= points
+                self.retry_delay_ms = 0
+                self.stats["batches"] += 1
+                self.log_manager.debug("InfluxDB write: {} points in {} ms", points, self.http.stats["last_ms"])
+                return True
+            body = await response.read()
+            self.log_manager.error("InfluxDB write failed with status code {}: {}", response.status, body[:200])
+            if 400 <= response.status < 500 and response.status != 429:
+                # The server rejected the batch itself; retrying would fail the same way
+                self._consume(length)
+                self.points -= points
+                self.stats["dropped"] += points
+                return False
+        except Exception as e:
+            self.log_manager.error("Error writing to InfluxDB: {}", e)
+        finally:
+            if response:
+                response.close()
+            self.flushing = False
+
+        self.stats["failures"] += 1
+        self.retry_delay_ms = min(max(self.retry_delay_ms * 2, 1000), self.retry_max_ms)
+        self.next_attempt_ms = utime.ticks_add(utime.ticks_ms(), self.retry_delay_ms)
+        return False
+
+    def register_jobs(self, scheduler):
+        scheduler.every("influx_write", 1000, self._flush_job)
+
+    def _flush_job(self):
+        if self.flush_due():
+            return self.flush()
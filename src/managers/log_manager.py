@@ -1,25 +1,137 @@
 import utime
 
+from managers.metrics import registry
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
 class LogManager:
-    def __init__(self):
-        self.buffer_size = 15
-        self.buffer = []
+    def __init__(self, buffer_bytes=2048):
+        self.level = INFO
+        self.buffer = bytearray(buffer_bytes)
+        self.buffer_pos = 0
+        self.buffer_wrapped = False
         self.buffering_enabled = True
+        self.rate_limit_ms = 10000
+        self.max_rate_limit_sites = 32
+        self.sites = {}
+        self.sink = None
+        self.sink_errors = 0
+        # A failing sink cannot log about itself, so failures only show up as a metric
+        self.sink_error_counter = registry.counter("log_sink_errors_total", "Log lines the sink failed to write")
+
+    def configure(self, config):
+        self.level = self._parse_level(config.LOG_LEVEL)
+        self.rate_limit_ms = config.LOG_RATE_LIMIT_MS if config.LOG_RATE_LIMIT_MS is not None else self.rate_limit_ms
+        if config.LOG_BUFFER_BYTES and config.LOG_BUFFER_BYTES != len(self.buffer):
+            self.buffer = bytearray(config.LOG_BUFFER_BYTES)
+            self.buffer_pos = 0
+            self.buffer_wrapped = False
+        config.subscribe("LOG_LEVEL", self._on_level_changed)
+
+    def _parse_level(self, level):
+        if isinstance(level, int):
+            return level
+        for value, name in LEVEL_NAMES.items():
+            if name == level:
+                return value
+        return INFO
+
+    def _on_level_changed(self, key, value):
+        self.level = self._parse_level(value)
+
+    def set_sink(self, sink):
+        self.sink = sink
+
+    def debug(self, message, *args):
+        if self.level <= DEBUG:
+            self._emit(DEBUG, message, args)
+
+    def log(self, message, *args):
+        if self.level <= INFO:
+            self._emit(INFO, message, args)
+
+    info = log
+
+    def warning(self, message, *args):
+        if self.level <= WARNING:
+            self._emit(WARNING, message, args)
+
+    def error(self, message, *args):
+        self._emit(ERROR, message, args)
+
+    def _emit(self, level, message, args):
+        suppressed = 0
+        if args and level >= WARNING and self.rate_limit_ms:
+            # The format string identifies the call site; only repeating
+            # problems are limited, informational lines always go out
+            now = utime.ticks_ms()
+            site = self.sites.get(message)
+            if site is not None:
+                if utime.ticks_diff(now, site[0]) < self.rate_limit_ms:
+                    site[1] += 1
+                    return
+                suppressed = site[1]
+                site[0] = now
+                site[1] = 0
+            else:
+                if len(self.sites) >= self.max_rate_limit_sites:
+                    self.sites.clear()
+                self.sites[message] = [now, 0]
+
+        if args:
+            message = message.format(*args)
+        if suppressed:
+            message = f"{message} (suppressed {suppressed} similar)"
 
-    def log(self, message):
         timestamp = utime.localtime()
         formatted_time = "{:02d}:{:02d}:{:02d}".format(timestamp[3], timestamp[4], timestamp[5])
-        log_entry = f"{formatted_time} | {message}"
-        
+        log_entry = f"{formatted_time} | {LEVEL_NAMES[level]} | {message}"
+
         if self.buffering_enabled:
-            if len(self.buffer) >= self.buffer_size:
-                self.buffer.pop(0)
-            self.buffer.append(log_entry)
-        
+            self._append(log_entry.encode())
+        if self.sink is not None:
+            try:
+                self.sink.write(log_entry)
+            except Exception:
+                self.sink_errors += 1
+                self.sink_error_counter.inc()
+
         print(log_entry)  # Always print to console for immediate feedback
 
+    def _append(self, data):
+        buf = self.buffer
+        size = len(buf)
+        if len(data) >= size:
+            data = data[-(size - 1):]
+        pos = self.buffer_pos
+        first = min(len(data), size - pos)
+        buf[pos:pos + first] = data[:first]
+        rest = len(data) - first
+        if rest:
+            buf[:rest] = data[first:]
+            self.buffer_wrapped = True
+        pos = (pos + len(data)) % size
+        buf[pos] = 10
+        pos += 1
+        if pos >= size:
+            pos = 0
+            self.buffer_wrapped = True
+        self.buffer_pos = pos
+
     def get_logs(self):
-        return self.buffer
+        if self.buffer_wrapped:
+            data = bytes(self.buffer[self.buffer_pos:]) + bytes(self.buffer[:self.buffer_pos])
+            # The oldest entry was partly overwritten
+            data = data[data.find(b"\n") + 1:]
+        else:
+            data = bytes(self.buffer[:self.buffer_pos])
+        return [line.decode() for line in data.split(b"\n") if line]
 
     def enable_buffering(self):
         self.buffering_enabled = True
@@ -28,4 +140,5 @@ class LogManager:
         self.buffering_enabled = False
 
     def clear_logs(self):
-        self.buffer.clear()
\ No newline at end of file
+        self.buffer_pos = 0
+        self.buffer_wrapped = False
@@ -0,0 +1,57 @@
+import os
+import uasyncio
+
+
+class FileLogSink:
+    def __init__(self, filename="log.txt", max_bytes=16384):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        try:
+            self.size = os.stat(filename)[6]
+        except OSError:
+            self.size = 0
+
+    def write(self, line):
+        # Errors propagate to LogManager, which counts them
+        if self.size + len(line) + 1 > self.max_bytes:
+            try:
+                os.rename(self.filename, self.filename + ".1")
+            except OSError:
+                pass
+            self.size = 0
+        with open(self.filename, "a") as f:
+            f.write(line)
+            f.write("\n")
+        self.size += len(line) + 1
+
+
+class MqttLogSink:
+    def __init__(self, mqtt_mgr, capacity=2048, interval_s=30):
+        self.mqtt_mgr = mqtt_mgr
+        self.batch = bytearray(capacity)
+        self.batch_len = 0
+        self.interval_s = interval_s
+        self.shipped = 0
+        self.dropped = 0
+
+    def write(self, line):
+        data = line.encode()
+        end = self.batch_len + len(data) + 1
+        if end > len(self.batch):
+            self.dropped += 1
+            return
+        self.batch[self.batch_len:end - 1] = data
+        self.batch[end - 1] = 10
+        self.batch_len = end
+
+    async def run(self):
+        while True:
+            await uasyncio.sleep(self.interval_s)
+            if self.batch_len and self.mqtt_mgr.is_connected:
+                length = self.batch_len
+                if await self.mqtt_mgr.publish_logs(memoryview(self.batch)[:length]):
+                    # Lines appended while publishing are moved to the front
+                    remaining = self.batch_len - length
+                    self.batch[:remaining] = self.batch[length:self.batch_len]
+                    self.batch_len = remaining
+                    self.shipped += 1
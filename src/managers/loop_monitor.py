@@ -0,0 +1,115 @@
+import utime
+
+
+class _TaskProbe:
+    def __init__(self, monitor, name, coro):
+        self.monitor = monitor
+        self.stat = monitor.register(name)
+        self.name = name
+        self.coro = coro
+
+    def __iter__(self):
+        # Drive the wrapped coroutine step by step and time each step
+        # between two yields to the scheduler.
+        coro = self.coro
+        stat = self.stat
+        monitor = self.monitor
+        value = None
+        error = None
+        while True:
+            start = utime.ticks_us()
+            try:
+                if error is None:
+                    yielded = coro.send(value)
+                else:
+                    yielded = coro.throw(error)
+            except StopIteration as e:
+                monitor.account(self.name, stat, utime.ticks_diff(utime.ticks_us(), start))
+                return e.value
+            except BaseException:
+                monitor.account(self.name, stat, utime.ticks_diff(utime.ticks_us(), start))
+                raise
+            monitor.account(self.name, stat, utime.ticks_diff(utime.ticks_us(), start))
+            value = None
+            error = None
+            try:
+                value = yield yielded
+            except BaseException as e:
+                error = e
+
+    __await__ = __iter__
+
+
+class LoopMonitor:
+    def __init__(self):
+        # name -> [busy_us in current window, runs, busy_ms before current window]
+        self.tasks = {}
+        self.busy_us = 0
+        self.busy_ms_total = 0
+        self.idle_ms_total = 0
+        self.window_start = utime.ticks_ms()
+        self.max_step_us = 0
+        self.max_step_task = ""
+        self.longest_us = 0
+        self.longest_task = ""
+        self.utilization_value = 0
+
+    def register(self, name):
+        stat = self.tasks.get(name)
+        if stat is None:
+            stat = [0, 0, 0]
+            self.tasks[name] = stat
+        return stat
+
+    def account(self, name, stat, elapsed_us):
+        stat[0] += elapsed_us
+        stat[1] += 1
+        self.busy_us += elapsed_us
+        if elapsed_us > self.longest_us:
+            self.longest_us = elapsed_us
+            self.longest_task = name
+            if elapsed_us > self.max_step_us:
+                self.max_step_us = elapsed_us
+                self.max_step_task = name
+
+    def take_longest(self):
+        # Longest single step since the previous call, as (task, ms)
+        longest = (self.longest_task, self.longest_us // 1000)
+        self.longest_us = 0
+        self.longest_task = ""
+        return longest
+
+    async def _run(self, probe):
+        return await probe
+
+    def wrap(self, name, coro):
+        return self._run(_TaskProbe(self, name, coro))
+
+    def utilization(self):
+        # Closes the current accounting window and returns busy/(busy+idle)
+        now = utime.ticks_ms()
+        window_ms = utime.ticks_diff(now, self.window_start)
+        busy_ms = self.busy_us // 1000
+        if window_ms > 0:
+            self.utilization_value = min(busy_ms / window_ms, 1)
+        self.busy_ms_total += busy_ms
+        self.idle_ms_total += max(window_ms - busy_ms, 0)
+        self.busy_us -= busy_ms * 1000
+        for stat in self.tasks.values():
+            task_ms = stat[0] // 1000
+            stat[2] += task_ms
+            stat[0] -= task_ms * 1000
+        self.window_start = now
+        return self.utilization_value
+
+    def get_stats(self):
+        stats = {
+            "busy_ms": self.busy_ms_total,
+            "idle_ms": self.idle_ms_total,
+            "max_step_ms": self.max_step_us / 1000,
+            "max_step_task": self.max_step_task
+        }
+        for name, stat in self.tasks.items():
+            stats[f"{name}_ms"] = stat[2]
+            stats[f"{name}_runs"] = stat[1]
+        return stats
@@ -0,0 +1,135 @@
+from array import array
+
+# Upper bucket bounds in the unit of each histogram; the +Inf bucket is implicit
+MS_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+US_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.bounds = array('i', buckets)
+        # Per-bucket (not cumulative) counts; the last slot is +Inf
+        self.counts = array('I', [0] * (len(buckets) + 1))
+        self.total = array('q', [0])
+        self.count = 0
+
+    def observe(self, value):
+        bounds = self.bounds
+        index = 0
+        size = len(bounds)
+        while index < size and value > bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total[0] += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Linear interpolation inside the bucket that holds the q-th observation
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        lower = 0
+        for index, bound in enumerate(self.bounds):
+            in_bucket = self.counts[index]
+            if in_bucket and seen + in_bucket >= rank:
+                return lower + (bound - lower) * (rank - seen) / in_bucket
+            seen += in_bucket
+            lower = bound
+        return lower
+
+    def snapshot(self):
+        return {
+            "buckets": list(self.counts),
+            "sum": self.total[0],
+            "count": self.count,
+            "p50": round(self.quantile(0.5), 1),
+            "p99": round(self.quantile(0.99), 1)
+        }
+
+
+class MetricsRegistry:
+    def __init__(self, prefix="pumpi_"):
+        self.prefix = prefix
+        self.metrics = {}
+
+    def clear(self):
+        self.metrics = {}
+
+    def _get(self, cls, name, *args):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = cls(name, *args)
+            self.metrics[name] = metric
+        return metric
+
+    def counter(self, name, help_text=""):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text=""):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=MS_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets)
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def prometheus(self, labels=""):
+        # Yields one metric family at a time so a scrape never builds the whole page in RAM
+        label_set = "{" + labels + "}" if labels else ""
+        for name, metric in self.metrics.items():
+            full = self.prefix + name
+            lines = [f"# HELP {full} {metric.help}\n# TYPE {full} {metric.kind}\n"]
+            if metric.kind == "histogram":
+                separator = "," if labels else ""
+                cumulative = 0
+                for index, bound in enumerate(metric.bounds):
+                    cumulative += metric.counts[index]
+                    lines.append(f'{full}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}\n')
+                lines.append(f'{full}_bucket{{{labels}{separator}le="+Inf"}} {metric.count}\n')
+                lines.append(f"{full}_sum{label_set} {metric.total[0]}\n")
+                lines.append(f"{full}_count{label_set} {metric.count}\n")
+            else:
+                value = metric.value
+                if value is True or value is False:
+                    value = int(value)
+                lines.append(f"{full}{label_set} {value}\n")
+            yield "".join(lines)
+
+
+registry = MetricsRegistry()
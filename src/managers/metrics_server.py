@@ -0,0 +1,41 @@
+import uasyncio
+
+from managers.metrics import registry
+
+
+class MetricsServer:
+    def __init__(self, config, log_mgr):
+        self.config = config
+        self.log_mgr = log_mgr
+        self.port = config.METRICS_HTTP_PORT
+        self.labels = f'device="{config.MQTT_CLIENT_NAME}"'
+        self.server = None
+        self.scrapes = registry.counter("metrics_scrapes_total", "Prometheus scrapes served")
+
+    async def start(self):
+        if self.server is None:
+            self.server = await uasyncio.start_server(self._handle, "0.0.0.0", self.port)
+            self.log_mgr.log("Metrics endpoint listening on port {}", self.port)
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            # Headers are not needed; read them so the client sees a clean close
+            while True:
+                line = await reader.readline()
+                if not line or line == b"\r\n":
+                    break
+            if request.startswith(b"GET /metrics"):
+                writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n\r\n")
+                for family in registry.prometheus(self.labels):
+                    writer.write(family.encode())
+                    await writer.drain()
+                self.scrapes.inc()
+            else:
+                writer.write(b"HTTP/1.0 404 Not Found\r\n\r\n")
+            await writer.drain()
+        except Exception as e:
+            self.log_mgr.debug("Metrics request failed: {}", e)
+        finally:
+            writer.close()
+            await writer.wait_closed()
@@ -0,0 +1,50 @@
+import gc
+import sys
+import utime
+
+
+class ModuleLoader:
+    def __init__(self):
+        # Set from IMPORT_PROFILE_LOG; every profiled load costs two collections
+        self.profiling = False
+        self.profile = {}
+
+    def load(self, name, attr=None):
+        module = sys.modules.get(name)
+        if module is None:
+            if self.profiling:
+                gc.collect()
+                heap_before = gc.mem_alloc()
+                start = utime.ticks_us()
+            __import__(name)
+            module = sys.modules[name]
+            if self.profiling:
+                elapsed_us = utime.ticks_diff(utime.ticks_us(), start)
+                gc.collect()
+                # Nested loads are included in the parent's figures
+                self.profile[name] = (elapsed_us // 1000, gc.mem_alloc() - heap_before)
+        return getattr(module, attr) if attr else module
+
+    def unload(self, name):
+        # Returns the heap freed when profiling, otherwise 0. Any references
+        # still held elsewhere keep the module alive.
+        if name not in sys.modules:
+            return 0
+        if self.profiling:
+            gc.collect()
+            heap_before = gc.mem_alloc()
+        del sys.modules[name]
+        package, _, child = name.rpartition(".")
+        if package and package in sys.modules and hasattr(sys.modules[package], child):
+            delattr(sys.modules[package], child)
+        if not self.profiling:
+            return 0
+        gc.collect()
+        return heap_before - gc.mem_alloc()
+
+    def log_profile(self, log_mgr):
+        for name, (elapsed_ms, heap) in sorted(self.profile.items(), key=lambda item: -item[1][0]):
+            log_mgr.log("Import {}: {} ms, {} bytes", name, elapsed_ms, heap)
+
+
+loader = ModuleLoader()
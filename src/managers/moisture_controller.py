@@ -0,0 +1,140 @@
+import json
+import utime
+from array import array
+
+from managers.scheduler import PRIORITY_LOW
+
+NO_READING = -1.0
+
+
+class MoistureController:
+    def __init__(self, config, log_mgr, pump_mgr):
+        self.config = config
+        self.log_mgr = log_mgr
+        self.pump_mgr = pump_mgr
+        # One topic per valve; index 0 drives valve 1
+        self.topics = (config.MOISTURE_TOPICS or [])[:len(pump_mgr.valves)]
+        count = len(self.topics)
+        self.moisture = array('f', [NO_READING] * count)
+        self.reading_ms = array('i', [0] * count)
+        self.watered_ms = array('i', [0] * count)
+        self.watered = bytearray(count)
+        # Re-armed once moisture climbs above threshold + hysteresis after watering
+        self.armed = bytearray(b"\x01" * count)
+        # Arrival tick of the reading that queued a job, -1 when none is pending
+        self.pending_ms = array('i', [-1] * count)
+        self.stats = {
+            "readings": 0,
+            "invalid": 0,
+            "triggers": 0,
+            "held_hysteresis": 0,
+            "held_interval": 0,
+            "decision_max_us": 0,
+            "latency_last_ms": 0,
+            "latency_max_ms": 0,
+            "latency_total_ms": 0,
+            "latency_count": 0
+        }
+        pump_mgr.on_valve_open = self._on_valve_open
+
+    def register(self, mqtt_mgr):
+        for index, topic in enumerate(self.topics):
+            mqtt_mgr.add_subscription("moisture", topic, lambda topic, msg, offset, index=index: self.on_reading(index, msg))
+        if self.topics:
+            self.log_mgr.log("Moisture control listening on {} topic(s)", len(self.topics))
+
+    def _parse(self, msg):
+        # Plain numbers or {"moisture": <value>} documents
+        text = msg.decode()
+        try:
+            return float(text)
+        except ValueError:
+            pass
+        return float(json.loads(text)["moisture"])
+
+    def on_reading(self, index, msg):
+        start = utime.ticks_us()
+        try:
+            value = self._parse(msg)
+        except Exception:
+            self.stats["invalid"] += 1
+            self.log_mgr.warning("Invalid moisture reading on {}: {}", self.topics[index], msg)
+            return
+        now = utime.ticks_ms()
+        self.moisture[index] = value
+        self.reading_ms[index] = now
+        self.stats["readings"] += 1
+        if value >= self.config.MOISTURE_THRESHOLD + (self.config.MOISTURE_HYSTERESIS or 0):
+            self.armed[index] = 1
+        if self._evaluate(index, now):
+            self.pending_ms[index] = now
+            if self.pump_mgr.valve_open[index]:
+                # The job joined a run that already has this valve open
+                self._on_valve_open(index)
+        elapsed = utime.ticks_diff(utime.ticks_us(), start)
+        if elapsed > self.stats["decision_max_us"]:
+            self.stats["decision_max_us"] = elapsed
+
+    def _evaluate(self, index, now):
+        value = self.moisture[index]
+        if value == NO_READING or value >= self.config.MOISTURE_THRESHOLD:
+            return False
+        if not self.armed[index]:
+            self.stats["held_hysteresis"] += 1
+            return False
+        min_interval_ms = (self.config.MOISTURE_MIN_REWATER_INTERVAL or 0) * 1000
+        if self.watered[index] and utime.ticks_diff(now, self.watered_ms[index]) < min_interval_ms:
+            self.stats["held_interval"] += 1
+            return False
+        max_wait_ms = self.config.MOISTURE_MAX_ACTUATION_DELAY_MS or 0
+        if not self.pump_mgr.add_job(index + 1, self.config.MOISTURE_WATERING_DURATION, max_wait_ms=max_wait_ms):
+            return False
+        self.log_mgr.log("Moisture {} below {} on valve {}, watering", value, self.config.MOISTURE_THRESHOLD, index + 1)
+        self.armed[index] = 0
+        self.watered[index] = 1
+        self.watered_ms[index] = now
+        self.stats["triggers"] += 1
+        return True
+
+    def _on_valve_open(self, index):
+        if index >= len(self.pending_ms) or self.pending_ms[index] < 0:
+            return
+        latency = utime.ticks_diff(utime.ticks_ms(), self.pending_ms[index])
+        self.pending_ms[index] = -1
+        stats = self.stats
+        stats["latency_last_ms"] = latency
+        stats["latency_total_ms"] += latency
+        stats["latency_count"] += 1
+        if latency > stats["latency_max_ms"]:
+            stats["latency_max_ms"] = latency
+
+    def register_jobs(self, scheduler):
+        if self.topics:
+            scheduler.every("moisture", (self.config.MOISTURE_CHECK_INTERVAL or 300) * 1000, self.sweep, PRIORITY_LOW)
+
+    def sweep(self):
+        # Readings are handled as they arrive. This sweep only catches plants
+        # whose sensor stays quiet after the re-water interval has passed.
+        now = utime.ticks_ms()
+        max_age_ms = (self.config.MOISTURE_MAX_AGE or 3600) * 1000
+        for index in range(len(self.topics)):
+            if utime.ticks_diff(now, self.reading_ms[index]) <= max_age_ms:
+                self._evaluate(index, now)
+
+    def get_stats(self):
+        stats = self.stats
+        count = stats["latency_count"]
+        data = {
+            "readings": stats["readings"],
+            "invalid": stats["invalid"],
+            "triggers": stats["triggers"],
+            "held_hysteresis": stats["held_hysteresis"],
+            "held_interval": stats["held_interval"],
+            "decision_max_us": stats["decision_max_us"],
+            "latency_last_ms": stats["latency_last_ms"],
+            "latency_max_ms": stats["latency_max_ms"],
+            "latency_avg_ms": stats["latency_total_ms"] // count if count else 0
+        }
+        for index, value in enumerate(self.moisture):
+            data[f"moisture_{index + 1}"] = value if value != NO_READING else None
+        return data
@@ -0,0 +1,296 @@
+import uasyncio
+import utime
+
+from managers.metrics import registry
+
+
+class MQTTException(Exception):
+    pass
+
+
+class MQTTAsyncClient:
+    def __init__(self, client_id, server, port=1883, keepalive=60, clean_session=True, max_inflight=4, timeout=5, buffer_size=512, log_mgr=None, loop_monitor=None):
+        self.client_id = client_id
+        self.server = server
+        self.port = port
+        self.keepalive = keepalive
+        self.clean_session = clean_session
+        self.max_inflight = max_inflight
+        self.timeout = timeout
+        self.log_mgr = log_mgr
+        self.loop_monitor = loop_monitor
+        self.cb = None
+        self.on_disconnect = None
+        self.is_connected = False
+        self._reader = None
+        self._writer = None
+        self._tasks = []
+        self._pid = 0
+        self._inflight = {}
+        self._inflight_changed = uasyncio.Event()
+        self._write_lock = uasyncio.Lock()
+        self._tx_buffer = bytearray(buffer_size)
+        self._tx_view = memoryview(self._tx_buffer)
+        self._last_rx = 0
+        self._last_tx = 0
+        self._ping_pending = False
+        self.stats = {
+            "tx_packets": 0,
+            "rx_packets": 0,
+            "retransmits": 0,
+            "pings": 0,
+            "callback_errors": 0,
+            "max_loop_stall_ms": 0
+        }
+        self.stall_gauge = registry.gauge("mqtt_loop_stall_max_ms", "Longest event loop stall seen by the MQTT keepalive task")
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def _encode_len(self, pkt, n):
+        while True:
+            b = n & 0x7F
+            n >>= 7
+            if n:
+                pkt.append(b | 0x80)
+            else:
+                pkt.append(b)
+                return
+
+    def _append_str(self, pkt, s):
+        pkt.append(len(s) >> 8)
+        pkt.append(len(s) & 0xFF)
+        pkt.extend(s)
+
+    def _next_pid(self):
+        self._pid = self._pid % 65535 + 1
+        return self._pid
+
+    async def connect(self):
+        self._reader, self._writer = await uasyncio.wait_for(
+            uasyncio.open_connection(self.server, self.port), self.timeout)
+
+        client_id = self.client_id.encode() if isinstance(self.client_id, str) else self.client_id
+        pkt = bytearray(b"\x10")
+        self._encode_len(pkt, 12 + len(client_id))
+        pkt.extend(b"\x00\x04MQTT\x04")
+        pkt.append(0x02 if self.clean_session else 0x00)
+        pkt.append(self.keepalive >> 8)
+        pkt.append(self.keepalive & 0xFF)
+        self._append_str(pkt, client_id)
+
+        try:
+            await self._write(pkt)
+            op, payload = await uasyncio.wait_for(self._read_packet(), self.timeout)
+            if op != 0x20 or len(payload) != 2:
+                raise MQTTException(f"Unexpected packet 0x{op:02x} while waiting for CONNACK")
+            if payload[1] != 0:
+                raise MQTTException(f"Connection refused, return code {payload[1]}")
+        except Exception:
+            self._close_stream()
+            raise
+
+        session_present = payload[0] & 1
+        self.is_connected = True
+        self._ping_pending = False
+        # publish() may add or ack entries while the retransmits are awaited
+        for pid, (topic, msg, retain) in list(self._inflight.items()):
+            await self._write_publish(topic, msg, retain, 1, pid, True)
+            self.stats["retransmits"] += 1
+
+        self._tasks = [
+            self._spawn("mqtt_rx", self._read_loop()),
+            self._spawn("mqtt_keepalive", self._keepalive_loop())
+        ]
+        return session_present
+
+    def _spawn(self, name, coro):
+        # These tasks do the socket work, so their time is what the loop monitor should see
+        if self.loop_monitor:
+            coro = self.loop_monitor.wrap(name, coro)
+        return uasyncio.create_task(coro)
+
+    async def disconnect(self):
+        if self.is_connected:
+            try:
+                await self._write(b"\xe0\x00")
+            except Exception:
+                pass
+        self._connection_lost()
+
+    async def publish(self, topic, msg, retain=False, qos=0):
+        pid = 0
+        if qos:
+            while len(self._inflight) >= self.max_inflight:
+                if not self.is_connected:
+                    raise OSError("MQTT not connected")
+                self._inflight_changed.clear()
+                await self._inflight_changed.wait()
+            if isinstance(msg, memoryview):
+                # Callers may reuse the buffer behind msg; keep a copy for retransmission
+                msg = bytes(msg)
+            pid = self._next_pid()
+            self._inflight[pid] = (topic, msg, retain)
+        await self._write_publish(topic, msg, retain, qos, pid, False)
+        return pid
+
+    async def subscribe(self, topic, qos=0):
+        topic = topic.encode() if isinstance(topic, str) else topic
+        pid = self._next_pid()
+        pkt = bytearray(b"\x82")
+        self._encode_len(pkt, 5 + len(topic))
+        pkt.append(pid >> 8)
+        pkt.append(pid & 0xFF)
+        self._append_str(pkt, topic)
+        pkt.append(qos)
+        await self._write(pkt)
+        return pid
+
+    def inflight_count(self):
+        return len(self._inflight)
+
+    def _publish_packet(self, topic, msg, retain, qos, pid, dup):
+        # Built in the shared transmit buffer; only oversized packets allocate
+        remaining = 2 + len(topic) + len(msg) + (2 if qos else 0)
+        if remaining + 5 <= len(self._tx_buffer):
+            buf = self._tx_buffer
+            view = self._tx_view
+        else:
+            buf = bytearray(remaining + 5)
+            view = memoryview(buf)
+        buf[0] = 0x30 | (qos << 1) | (0x08 if dup else 0) | (1 if retain else 0)
+        pos = 1
+        while True:
+            b = remaining & 0x7F
+            remaining >>= 7
+            buf[pos] = b | 0x80 if remaining else b
+            pos += 1
+            if not remaining:
+                break
+        buf[pos] = len(topic) >> 8
+        buf[pos + 1] = len(topic) & 0xFF
+        pos += 2
+        buf[pos:pos + len(topic)] = topic
+        pos += len(topic)
+        if qos:
+            buf[pos] = pid >> 8
+            buf[pos + 1] = pid & 0xFF
+            pos += 2
+        buf[pos:pos + len(msg)] = msg
+        pos += len(msg)
+        return view[:pos]
+
+    async def _write_publish(self, topic, msg, retain, qos, pid, dup):
+        if self._writer is None:
+            raise OSError("MQTT not connected")
+        async with self._write_lock:
+            self._writer.write(self._publish_packet(topic, msg, retain, qos, pid, dup))
+            await uasyncio.wait_for(self._writer.drain(), self.timeout)
+        self._last_tx = utime.ticks_ms()
+        self.stats["tx_packets"] += 1
+
+    async def _write(self, pkt):
+        if self._writer is None:
+            raise OSError("MQTT not connected")
+        async with self._write_lock:
+            self._writer.write(pkt)
+            await uasyncio.wait_for(self._writer.drain(), self.timeout)
+        self._last_tx = utime.ticks_ms()
+        self.stats["tx_packets"] += 1
+
+    async def _read_packet(self):
+        op = (await self._reader.readexactly(1))[0]
+        n = 0
+        shift = 0
+        while True:
+            b = (await self._reader.readexactly(1))[0]
+            n |= (b & 0x7F) << shift
+            if not b & 0x80:
+                break
+            shift += 7
+        payload = await self._reader.readexactly(n) if n else b""
+        self._last_rx = utime.ticks_ms()
+        self._ping_pending = False
+        self.stats["rx_packets"] += 1
+        return op, payload
+
+    async def _read_loop(self):
+        try:
+            while True:
+                op, payload = await self._read_packet()
+                kind = op & 0xF0
+                if kind == 0x30:
+                    await self._handle_publish(op, payload)
+                elif kind == 0x40:
+                    self._inflight.pop(payload[0] << 8 | payload[1], None)
+                    self._inflight_changed.set()
+        except Exception:
+            pass
+        self._connection_lost()
+
+    async def _handle_publish(self, op, payload):
+        topic_len = payload[0] << 8 | payload[1]
+        pos = 2 + topic_len
+        topic = payload[2:pos]
+        qos = (op >> 1) & 0x03
+        if qos:
+            pid = payload[pos:pos + 2]
+            pos += 2
+            await self._write(b"\x40\x02" + pid)
+        if self.cb:
+            try:
+                self.cb(topic, payload[pos:])
+            except Exception as e:
+                self.stats["callback_errors"] += 1
+                if self.log_mgr:
+                    self.log_mgr.error("MQTT callback error: {}", e)
+
+    async def _keepalive_loop(self):
+        ping_interval = self.keepalive * 500
+        tick = min(ping_interval, 1000)
+        while self.is_connected:
+            expected = utime.ticks_add(utime.ticks_ms(), tick)
+            await uasyncio.sleep_ms(tick)
+            now = utime.ticks_ms()
+            stall = utime.ticks_diff(now, expected)
+            if stall > self.stats["max_loop_stall_ms"]:
+                self.stats["max_loop_stall_ms"] = stall
+                self.stall_gauge.set(stall)
+
+            rx_idle = utime.ticks_diff(now, self._last_rx)
+            if rx_idle > self.keepalive * 1500:
+                break
+            # QoS 0 publishes get no reply, so a busy sender still has to ping to hear from the broker
+            if utime.ticks_diff(now, self._last_tx) >= ping_interval or (
+                    rx_idle >= ping_interval and not self._ping_pending):
+                try:
+                    await self._write(b"\xc0\x00")
+                    self._ping_pending = True
+                    self.stats["pings"] += 1
+                except Exception:
+                    break
+        self._connection_lost()
+
+    def _close_stream(self):
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+        self._reader = None
+        self._writer = None
+
+    def _connection_lost(self):
+        was_connected = self.is_connected
+        self.is_connected = False
+        current = uasyncio.current_task()
+        for task in self._tasks:
+            if task is not current:
+                task.cancel()
+        self._tasks = []
+        self._close_stream()
+        if self.clean_session:
+            self._inflight.clear()
+        self._inflight_changed.set()
+        if was_connected and self.on_disconnect:
+            self.on_disconnect()
@@ -1,6 +1,9 @@
+import gc
 import json
 import uasyncio
-from umqtt_simple import MQTTClient
+from managers.mqtt_client import MQTTAsyncClient
+from managers.telemetry_serializer import TelemetrySerializer
+from managers.metrics import registry, US_BUCKETS
 import utime
 
 class MQTTManager:
@@ -11,11 +14,36 @@ class MQTTManager:
         self.is_connected = False
         self.last_publish_time = 0
         self.system_manager = None
+        self.pump_manager = None
+        self.serializer = TelemetrySerializer(self.config, self.config.MQTT_BUFFER_SIZE or 512)
+        self.qos = self.config.MQTT_QOS or 0
+        self.connecting = False
+        self.reconnect_delay_ms = 0
+        self.next_connect_ms = utime.ticks_ms()
+        self.link_down = uasyncio.Event()
+        # Cleared while low-power mode keeps the radio off between transmission windows
+        self.link_wanted = uasyncio.Event()
+        self.link_wanted.set()
+        self.dispatch_stats = {}
+        self.unhandled_messages = 0
+        self.external_subscriptions = []
+        self.publish_latency = registry.histogram("mqtt_publish_ms", "Telemetry publish cycle duration")
+        self.publish_failures = registry.counter("mqtt_publish_failures_total", "Telemetry publish cycles that failed")
+        self.messages_in = registry.counter("mqtt_messages_total", "Inbound MQTT messages")
+        self.dispatch_latency = registry.histogram("mqtt_dispatch_us", "Inbound message handler duration", US_BUCKETS)
+        self.publish_alloc = registry.gauge("mqtt_publish_alloc_bytes", "Heap allocated by the last publish cycle, -1 if a collection ran during it")
+        self.packets_saved = registry.counter("mqtt_packets_saved_total", "Packets saved by batched publishing compared to one per value")
+        self.bytes_saved = registry.counter("mqtt_bytes_saved_total", "Bytes saved by batched publishing compared to one packet per value")
+        self.build_dispatch_table()
+        self.config.subscribe("MQTT_QOS", self._on_qos_changed)
 
 
     def set_system_manager(self, system_manager):
         self.system_manager = system_manager
 
+    def set_pump_manager(self, pump_manager):
+        self.pump_manager = pump_manager
+
     async def publish_data(self, data):
         if not self.is_connected:
             self.log_mgr.log("MQTT not connected. Attempting to connect...")
@@ -25,138 +53,368 @@ class MQTTManager:
             self.log_mgr.log("MQTT connection failed. Cannot publish data.")
             return False
 
+        start = utime.ticks_ms()
         try:
-            for topic, subtopics in self.config.MQTT_TOPICS.items():
-                if topic in data:
-                    for subtopic in subtopics:
-                        if subtopic in data[topic]:
-                            full_topic = f"{self.config.MQTT_CLIENT_NAME}/{topic}/{subtopic}"
-                            message = str(data[topic][subtopic])
-                            try:
-                                result = self.client.publish(full_topic.encode(), message.encode())
-                            except Exception as e:
-                                if self.system_manager:
-                                    self.system_manager.add_error("mqtt_publish")
-                                self.log_mgr.log(f"Exception while publishing to {full_topic}: {e}")
-                        else:
-                            self.log_mgr.log(f"Subtopic {subtopic} not found in data for topic {topic}")
-                else:
-                    self.log_mgr.log(f"Topic {topic} not found in data")
-            
+            alloc_before = gc.mem_alloc()
+            self.serializer.refresh()
+            mode = self.config.MQTT_PUBLISH_MODE or "subtopic"
+            if mode == "subtopic":
+                delivered = await self._publish_subtopics(data)
+            else:
+                delivered = await self._publish_batched(data, per_device=(mode == "device"))
+            # Negative deltas mean a collection ran mid-cycle; report those as unknown
+            alloc_delta = gc.mem_alloc() - alloc_before
+            self.publish_alloc.set(alloc_delta if alloc_delta >= 0 else -1)
+            if not delivered:
+                # The caller spools the whole snapshot; parts that did arrive are sent again on replay
+                self.publish_failures.inc()
+                self.log_mgr.warning("MQTT publish incomplete, snapshot not delivered")
+                return False
+
             self.last_publish_time = utime.time()
+            self.publish_latency.observe(utime.ticks_diff(utime.ticks_ms(), start))
             self.log_mgr.log("MQTT data published successful")
             return True
         except Exception as e:
-            self.log_mgr.log(f"Exception in publish_data: {e}")
+            self.publish_failures.inc()
+            self.log_mgr.error("Exception in publish_data: {}", e)
             if self.system_manager:
                 self.system_manager.add_error("mqtt_publish")
+            await self.client.disconnect()
             self.is_connected = False
             return False
 
+    async def publish_replay(self, message):
+        if not self.is_connected:
+            return False
+        try:
+            await self.client.publish(f"{self.config.MQTT_CLIENT_NAME}/replay".encode(), message.encode(), qos=self.qos)
+            return True
+        except Exception as e:
+            self.log_mgr.error("Exception while publishing replayed sample: {}", e)
+            return False
+
+    async def publish_metrics(self, message):
+        if not self.is_connected:
+            return False
+        try:
+            await self.client.publish(f"{self.config.MQTT_CLIENT_NAME}/metrics".encode(), message.encode(), qos=self.qos)
+            return True
+        except Exception as e:
+            self.log_mgr.error("Exception while publishing metrics: {}", e)
+            return False
+
+    async def publish_crash(self, message):
+        if not self.is_connected:
+            return False
+        try:
+            # Retained so the record of the last reset is still there when a dashboard connects later
+            await self.client.publish(f"{self.config.MQTT_CLIENT_NAME}/crash".encode(), message.encode(), retain=True, qos=self.qos)
+            return True
+        except Exception as e:
+            self.log_mgr.error("Exception while publishing crash record: {}", e)
+            return False
+
+    async def publish_logs(self, message):
+        if not self.is_connected:
+            return False
+        try:
+            await self.client.publish(f"{self.config.MQTT_CLIENT_NAME}/logs".encode(), message, qos=self.qos)
+            return True
+        except Exception as e:
+            self.log_mgr.error("Exception while shipping logs: {}", e)
+            return False
+
+    async def _publish_subtopics(self, data):
+        serializer = self.serializer
+        delivered = True
+        for topic, subtopic, full_topic in serializer.subtopic_table:
+            values = data.get(topic)
+            if values is None or subtopic not in values:
+                self.log_mgr.warning("Subtopic {} not found in data for topic {}", subtopic, topic)
+                continue
+            length = serializer.encode_value(values[subtopic])
+            try:
+                await self.client.publish(full_topic, serializer.view[:length], qos=self.qos)
+            except Exception as e:
+                if self.system_manager:
+                    self.system_manager.add_error("mqtt_publish")
+                self.log_mgr.error("Exception while publishing to {}: {}", full_topic, e)
+                delivered = False
+                if not self.client.is_connected:
+                    break
+        return delivered
+
+    async def _publish_batched(self, data, per_device=False):
+        # The serializer adds up what each document's values would have cost in the
+        # subtopic layout while writing it, so the comparison costs no extra encoding
+        serializer = self.serializer
+        legacy_packets = 0
+        legacy_bytes = 0
+        packets = 0
+        sent_bytes = 0
+        delivered = True
+        if per_device:
+            length = serializer.encode_device(data)
+            if await self._publish_document(serializer.device_topic, length):
+                packets += 1
+                sent_bytes += self._packet_size(len(serializer.device_topic), length)
+                legacy_packets += serializer.legacy_packets
+                legacy_bytes += serializer.legacy_bytes
+            else:
+                delivered = False
+        else:
+            for entry in serializer.topic_table:
+                values = data.get(entry[0])
+                if values is None:
+                    self.log_mgr.warning("Topic {} not found in data", entry[0])
+                    continue
+                length = serializer.encode_topic(entry, values)
+                if await self._publish_document(entry[1], length):
+                    packets += 1
+                    sent_bytes += self._packet_size(len(entry[1]), length)
+                    legacy_packets += serializer.legacy_packets
+                    legacy_bytes += serializer.legacy_bytes
+                else:
+                    delivered = False
+                    if not self.client.is_connected:
+                        break
+
+        self.packets_saved.inc(legacy_packets - packets)
+        self.bytes_saved.inc(legacy_bytes - sent_bytes)
+        self.log_mgr.debug("MQTT batched publish: {} packets, {} bytes (saved {} packets, {} bytes)",
+                           packets, sent_bytes, legacy_packets - packets, legacy_bytes - sent_bytes)
+        return delivered
+
+    async def _publish_document(self, full_topic, length):
+        try:
+            await self.client.publish(full_topic, self.serializer.view[:length], qos=self.qos)
+            return True
+        except Exception as e:
+            if self.system_manager:
+                self.system_manager.add_error("mqtt_publish")
+            self.log_mgr.error("Exception while publishing to {}: {}", full_topic, e)
+            return False
+
+    def _packet_size(self, topic_len, payload_len):
+        # QoS 0 PUBLISH: fixed header + variable length + topic length prefix
+        remaining = 2 + topic_len + payload_len
+        size = 1 + remaining
+        while True:
+            size += 1
+            remaining >>= 7
+            if not remaining:
+                return size
+
     async def reconnect(self):
         self.log_mgr.log("Attempting to reconnect to MQTT broker")
-        try:
-            self.client.disconnect()
-        except:
-            pass
+        if self.client:
+            await self.client.disconnect()
         await self.connect()
 
+    def _create_client(self):
+        client = MQTTAsyncClient(
+            self.config.MQTT_CLIENT_NAME,
+            self.config.MQTT_BROKER_ADDRESS,
+            self.config.MQTT_BROKER_PORT,
+            keepalive=self.config.MQTT_KEEPALIVE or 60,
+            clean_session=self.config.MQTT_CLEAN_SESSION is not False,
+            max_inflight=self.config.MQTT_MAX_INFLIGHT or 4,
+            buffer_size=self.config.MQTT_BUFFER_SIZE or 512,
+            log_mgr=self.log_mgr,
+            loop_monitor=self.system_manager.loop_monitor if self.system_manager else None
+        )
+        client.set_callback(self.on_message)
+        client.on_disconnect = self._on_disconnect
+        return client
+
+    def _on_disconnect(self):
+        self.is_connected = False
+        self.link_down.set()
+        self.log_mgr.log("MQTT connection lost")
+
+    def _schedule_reconnect(self):
+        max_delay = self.config.MQTT_RECONNECT_MAX_MS or 60000
+        self.reconnect_delay_ms = min(max(self.reconnect_delay_ms * 2, 1000), max_delay)
+        self.next_connect_ms = utime.ticks_add(utime.ticks_ms(), self.reconnect_delay_ms)
+
     async def connect(self):
+        if self.connecting or self.is_connected:
+            return
+        if utime.ticks_diff(self.next_connect_ms, utime.ticks_ms()) > 0:
+            return
+        self.connecting = True
         if self.system_manager:
             self.system_manager.start_processing("mqtt_connect")
         self.log_mgr.log("MQTT connecting ...")
         try:
-            self.client = MQTTClient(self.config.MQTT_CLIENT_NAME, self.config.MQTT_BROKER_ADDRESS, self.config.MQTT_BROKER_PORT)
-            self.client.set_callback(self.on_message)
-            self.client.connect()
+            if self.client is None:
+                self.client = self._create_client()
+            session_present = await self.client.connect()
             self.is_connected = True
-            self.log_mgr.log(f"MQTT client connected as: {self.config.MQTT_CLIENT_NAME}")
-            await self.subscribe_to_control_topics()
+            self.link_down.clear()
+            self.reconnect_delay_ms = 0
+            self.log_mgr.log("MQTT client connected as: {}", self.config.MQTT_CLIENT_NAME)
+            if not session_present:
+                await self.subscribe_to_control_topics()
             if self.system_manager:
+                self.system_manager.clear_error("mqtt_connection")
                 self.system_manager.stop_processing("mqtt_connect")
         except Exception as e:
-            self.log_mgr.log(f"Failed to connect to MQTT broker: {e}")
+            self._schedule_reconnect()
+            self.log_mgr.warning("Failed to connect to MQTT broker: {} (retry in {} ms)", e, self.reconnect_delay_ms)
             self.is_connected = False
             if self.system_manager:
                 self.system_manager.add_error("mqtt_connection")
                 self.system_manager.stop_processing("mqtt_connect")
+        finally:
+            self.connecting = False
 
 
     async def subscribe_to_control_topics(self):
         if self.is_connected:
             try:
-                self.client.subscribe(f"{self.config.MQTT_CLIENT_NAME}/control/#")
-                self.client.subscribe(f"{self.config.MQTT_CLIENT_NAME}/config/#")
+                self.build_dispatch_table()
+                await self.client.subscribe(f"{self.config.MQTT_CLIENT_NAME}/control/#", self.qos)
+                await self.client.subscribe(f"{self.config.MQTT_CLIENT_NAME}/config/#", self.qos)
+                for _, topic, _ in self.external_subscriptions:
+                    await self.client.subscribe(topic, self.qos)
                 self.log_mgr.log("MQTT control topics subscribed")
             except Exception as e:
-                self.log_mgr.log(f"Failed to subscribe to control topics: {e}")       
+                self.log_mgr.error("Failed to subscribe to control topics: {}", e)
+
+    def register_handler(self, name, suffix, handler):
+        # suffix is relative to "<client>/"; a trailing "#" matches any remainder
+        self._register_topic(name, f"{self.config.MQTT_CLIENT_NAME}/{suffix}".encode(), handler)
+
+    def add_subscription(self, name, topic, handler):
+        # Absolute topics published by other devices, e.g. moisture sensors.
+        # They survive dispatch table rebuilds and are subscribed on every connect.
+        self.external_subscriptions.append((name, topic, handler))
+        self._register_topic(name, topic.encode(), handler)
+        if self.is_connected:
+            uasyncio.create_task(self.client.subscribe(topic, self.qos))
+
+    def _register_topic(self, name, topic, handler):
+        if topic.endswith(b"#"):
+            prefix = topic[:-1]
+            self.dispatch_prefixes.append((prefix, (name, handler, len(prefix))))
+        else:
+            self.dispatch_exact[topic] = (name, handler, len(topic))
+        if name not in self.dispatch_stats:
+            # [hits, total_us, max_us]
+            self.dispatch_stats[name] = [0, 0, 0]
+
+    def build_dispatch_table(self):
+        self.dispatch_exact = {}
+        self.dispatch_prefixes = []
+        self.register_handler("config", "config/#", self._on_config_message)
+        self.register_handler("watering", "control/watering", self._on_watering_message)
+        self.register_handler("reset_tank", "control/reset-water-tank", self._on_reset_water_tank_message)
+        self.register_handler("restart", "control/restart-system", self._on_restart_message)
+        for name, topic, handler in self.external_subscriptions:
+            self._register_topic(name, topic.encode(), handler)
 
     def on_message(self, topic, msg):
-        topic = topic.decode('utf-8')
-        msg = msg.decode('utf-8').strip()
-        self.log_mgr.log(f"MQTT message received on topic {topic}: {msg}")
-        
-        if topic.startswith(f"{self.config.MQTT_CLIENT_NAME}/config/"):
-            _, _, key = topic.split('/')
-            self.handle_config_update(key, msg)
-            self.config.load_from_file()
-            if topic == f"{self.config.MQTT_CLIENT_NAME}/config/MOISTURE_THRESHOLD":
-                # TODO: Implement pump_manager.py
-                pass
-            elif topic == f"{self.config.MQTT_CLIENT_NAME}/config/MOISTURE_CHECK_INTERVAL":
-                # TODO: Implement pump_manager.py
-                pass
-                
-        elif topic == f"{self.config.MQTT_CLIENT_NAME}/control/watering":
-            # uasyncio.create_task(self.handle_watering_control(msg))
-            # TODO: Implement pump_manager.py
-            pass
-        elif topic == f"{self.config.MQTT_CLIENT_NAME}/control/reset-water-tank":
-            # uasyncio.create_task(self.handle_reset_water_tank(msg))
-            # TODO: Implement pump_manager.py
-            pass
-        elif topic == f"{self.config.MQTT_CLIENT_NAME}/control/restart-system":
-            # uasyncio.create_task(self.handle_system_restart(msg))
-            # TODO: Implement pump_manager.py
-            pass
-            
+        start = utime.ticks_us()
+        self.messages_in.inc()
+        entry = self.dispatch_exact.get(topic)
+        if entry is None:
+            for prefix, prefix_entry in self.dispatch_prefixes:
+                if topic.startswith(prefix):
+                    entry = prefix_entry
+                    break
+        if entry is None:
+            self.unhandled_messages += 1
+            self.log_mgr.warning("No handler for MQTT topic {}", topic)
+            return
+
+        name, handler, offset = entry
+        try:
+            handler(topic, msg, offset)
+        except Exception as e:
+            self.log_mgr.error("Error handling MQTT message on {}: {}", topic, e)
+        elapsed = utime.ticks_diff(utime.ticks_us(), start)
+        self.dispatch_latency.observe(elapsed)
+        stat = self.dispatch_stats[name]
+        stat[0] += 1
+        stat[1] += elapsed
+        if elapsed > stat[2]:
+            stat[2] = elapsed
+
+    def _on_qos_changed(self, key, value):
+        self.qos = value
+
+    def get_dispatch_stats(self):
+        stats = {}
+        for name, (hits, total_us, max_us) in self.dispatch_stats.items():
+            stats[f"{name}_hits"] = hits
+            stats[f"{name}_avg_us"] = total_us // hits if hits else 0
+            stats[f"{name}_max_us"] = max_us
+        stats["unhandled"] = self.unhandled_messages
+        return stats
+
+    def _on_config_message(self, topic, msg, offset):
+        key = topic[offset:].decode('utf-8')
+        self.handle_config_update(key, msg.decode('utf-8').strip())
+
+    def _on_watering_message(self, topic, msg, offset):
+        if self.pump_manager is None:
+            self.log_mgr.log("Pump manager not set. Cannot trigger watering.")
+            return
+        self.handle_watering_control(msg.decode('utf-8').strip())
+
+    def _on_reset_water_tank_message(self, topic, msg, offset):
+        if self.pump_manager is None:
+            self.log_mgr.log("Pump manager not set. Cannot reset water tank.")
+            return
+        self.handle_reset_water_tank(msg.decode('utf-8').strip())
+
+    def _on_restart_message(self, topic, msg, offset):
+        uasyncio.create_task(self.handle_system_restart(msg.decode('utf-8').strip()))
+
     def handle_config_update(self, key, value):
         try:
-            if isinstance(value, str):
-                if value.lower() in ['true', 'false']:
-                    value = value.lower() == 'true'
-                elif value.replace('.', '').isdigit():
-                    value = float(value) if '.' in value else int(value)
-            
+            # ConfigManager converts the payload to the type of the stored value
             if self.config.update_config(key, value):
-                self.log_mgr.log(f"Configuration updated: {key} = {value}")
+                self.log_mgr.log("Configuration updated: {} = {}", key, self.config.get(key))
             else:
-                self.log_mgr.log(f"Failed to update configuration: {key} = {value}")
+                self.log_mgr.warning("Failed to update configuration: {} = {}", key, value)
         except Exception as e:
-            self.log_mgr.log(f"Error updating configuration: {e}")
-
-    # TODO: Implent MQTT control methods
-    # async def handle_watering_control(self, msg):
-    #     if self.m5_watering_unit is None:
-    #         self.log_mgr.log("Watering unit not set. Cannot trigger watering.")
-    #         return
-
-    #     if msg.lower() == "start":
-    #         self.log_mgr.log("Triggering watering via MQTT control")
-    #         await self.m5_watering_unit.trigger_watering()
-    #     else:
-    #         self.log_mgr.log(f"Unknown control command: {msg}")
-            
-    # async def handle_reset_water_tank(self, msg):
-    #     if self.m5_watering_unit is None:
-    #         self.log_mgr.log("Watering unit not set. Cannot reset water tank.")
-    #         return
-
-    #     if msg.lower() == "reset":
-    #         self.log_mgr.log("Resetting water tank level via MQTT control")
-    #         self.m5_watering_unit.water_tank.reset_capacity()
-    #     else:
-    #         self.log_mgr.log(f"Unknown control command: {msg}")
+            self.log_mgr.error("Error updating configuration: {}", e)
+
+    def handle_watering_control(self, msg):
+        # "start" waters every valve, "stop" aborts, otherwise a valve number
+        # or {"valve": 1 | [1, 2], "duration": s, "volume": ml}
+        command = msg.lower()
+        if command == "start":
+            self.log_mgr.log("Triggering watering of all valves via MQTT control")
+            self.pump_manager.water_all()
+            return
+        if command == "stop":
+            self.log_mgr.log("Stopping watering via MQTT control")
+            self.pump_manager.stop_all()
+            return
+        try:
+            job = json.loads(msg)
+        except ValueError:
+            self.log_mgr.warning("Unknown control command: {}", msg)
+            return
+        if isinstance(job, int) and not isinstance(job, bool):
+            job = {"valve": job}
+        if not isinstance(job, dict) or "valve" not in job:
+            self.log_mgr.warning("Unknown control command: {}", msg)
+            return
+        valves = job["valve"] if isinstance(job["valve"], list) else [job["valve"]]
+        for valve in valves:
+            self.pump_manager.add_job(valve, job.get("duration"), job.get("volume"))
+
+    def handle_reset_water_tank(self, msg):
+        if msg.lower() == "reset":
+            self.log_mgr.log("Resetting water tank level via MQTT control")
+            self.pump_manager.reset_tank()
+        else:
+            self.log_mgr.warning("Unknown control command: {}", msg)
 
         
     async def handle_system_restart(self, msg):
@@ -165,22 +423,59 @@ class MQTTManager:
             return
         if msg.lower() == "true":
             self.log_mgr.log("Restarting system via MQTT control")
+            if self.pump_manager:
+                self.pump_manager.stop_all(immediate=True)
+                self.pump_manager.save_state()
             self.system_manager.restart_system()
         else:
-            self.log_mgr.log(f"Unknown control command: {msg}")
+            self.log_mgr.warning("Unknown control command: {}", msg)
 
 
-    async def check_messages(self):
-        if self.is_connected:
-            try:
-                self.client.check_msg()
-            except Exception as e:
-                self.log_mgr.log(f"Error checking messages: {e}")
-                await self.reconnect()
+    def on_wifi_change(self, connected):
+        if self.client is None:
+            return
+        if not connected:
+            # The TCP session died with the link; don't wait for the keepalive to notice
+            if self.is_connected:
+                uasyncio.create_task(self.client.disconnect())
+        else:
+            self.reconnect_delay_ms = 0
+            self.next_connect_ms = utime.ticks_ms()
+            if self.link_wanted.is_set():
+                uasyncio.create_task(self.connect())
+
+    def open_link(self):
+        self.reconnect_delay_ms = 0
+        self.next_connect_ms = utime.ticks_ms()
+        self.link_wanted.set()
+
+    async def close_link(self):
+        self.link_wanted.clear()
+        if self.client and self.is_connected:
+            await self.client.disconnect()
+
+    async def _wait(self, event, timeout_ms):
+        try:
+            await uasyncio.wait_for_ms(event.wait(), timeout_ms)
+        except uasyncio.TimeoutError:
+            pass
 
     async def run(self):
+        # Inbound messages are dispatched by the client's reader task;
+        # this task only has to bring the link back up when it drops.
+        # Waits are bounded so the supervisor keeps hearing from it.
+        supervisor = self.system_manager.supervisor if self.system_manager else None
+        beat_ms = (self.config.SUPERVISOR_TIMEOUT_MS or 30000) // 3
         while True:
+            if supervisor:
+                supervisor.beat("mqtt")
+            if not self.link_wanted.is_set():
+                await self._wait(self.link_wanted, beat_ms)
+                continue
             if not self.is_connected:
                 await self.connect()
-            await self.check_messages()
-            await uasyncio.sleep(0.1)  # Check messages more frequently
\ No newline at end of file
+            if self.is_connected:
+                await self._wait(self.link_down, beat_ms)
+            else:
+                delay = utime.ticks_diff(self.next_connect_ms, utime.ticks_ms())
+                await uasyncio.sleep_ms(min(max(delay, 100), beat_ms))
\ No newline at end of file
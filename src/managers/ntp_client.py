@@ -0,0 +1,39 @@
+import socket
+import struct
+import uasyncio
+import utime
+
+NTP_PORT = 123
+
+
+def resolve(host, port=NTP_PORT):
+    # getaddrinfo has no non-blocking form and stalls the event loop for the DNS
+    # round trip, so callers resolve once per sync; an IPv4 address needs no lookup
+    parts = host.split(".")
+    if len(parts) == 4 and all(part.isdigit() for part in parts):
+        return (host, port)
+    return socket.getaddrinfo(host, port)[0][-1]
+
+
+async def query_time(addr, timeout_ms=1000):
+    # Same exchange as ntptime.time(), but polling a non-blocking socket
+    query = bytearray(48)
+    query[0] = 0x1B
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setblocking(False)
+        sock.sendto(query, addr)
+        start = utime.ticks_ms()
+        while True:
+            try:
+                msg = sock.recv(48)
+                break
+            except OSError:
+                if utime.ticks_diff(utime.ticks_ms(), start) > timeout_ms:
+                    raise OSError("NTP request timed out")
+                await uasyncio.sleep_ms(20)
+    finally:
+        sock.close()
+
+    ntp_delta = 3155673600 if utime.gmtime(0)[0] == 2000 else 2208988800
+    return struct.unpack("!I", msg[40:44])[0] - ntp_delta
@@ -0,0 +1,123 @@
+import machine
+import uasyncio
+import utime
+
+from managers.pump_manager import IDLE
+from managers.scheduler import PRIORITY_HIGH
+
+WINDOW = "window"
+POWERSAVE = "powersave"
+
+
+class PowerManager:
+    def __init__(self, config, log_mgr, wifi_mgr, mqtt_mgr, pump_mgr):
+        self.config = config
+        self.log_mgr = log_mgr
+        self.wifi_mgr = wifi_mgr
+        self.mqtt_mgr = mqtt_mgr
+        self.pump_mgr = pump_mgr
+        self.system_manager = None
+        self.scheduler = None
+        self.flush = None
+        self.enabled = bool(config.LOW_POWER_ENABLED)
+        self.radio_mode = config.LOW_POWER_RADIO or WINDOW
+        self.in_window = False
+        self.started_ms = utime.ticks_ms()
+        self.min_sleep_ms = config.LOW_POWER_MIN_SLEEP_MS or 20
+        self.max_sleep_ms = 4000
+        self.stats = {
+            "windows": 0,
+            "window_failures": 0,
+            "last_window_ms": 0,
+            "sleeps": 0,
+            "sleep_ms": 0
+        }
+
+    def set_system_manager(self, system_manager):
+        self.system_manager = system_manager
+        # Never sleep through more than half of the watchdog timeout
+        self.max_sleep_ms = system_manager.wdt_timeout_ms // 2
+
+    def batching(self):
+        # Samples go to the spool between transmission windows
+        return self.enabled and not self.in_window
+
+    def start(self, scheduler, flush):
+        # Called once the startup stages are done; the first window closes the radio
+        if not self.enabled:
+            return
+        self.scheduler = scheduler
+        self.flush = flush
+        if self.radio_mode == POWERSAVE:
+            self.wifi_mgr.set_power_save(True)
+        # Fast housekeeping timers would cut every light sleep short
+        for name in ("wdt", "gc", "influx_write", "wifi"):
+            job = scheduler.find(name)
+            if job and job.period_ms < self.max_sleep_ms:
+                scheduler.set_period(job, self.max_sleep_ms)
+        scheduler.set_sleeper(self.sleep)
+        scheduler.every("tx_window", (self.config.LOW_POWER_TX_INTERVAL or 900) * 1000, self.window, PRIORITY_HIGH, delay_ms=0)
+        self.log_mgr.log("Low-power mode active: {} radio, window every {} s", self.radio_mode, self.config.LOW_POWER_TX_INTERVAL or 900)
+
+    async def window(self):
+        self.in_window = True
+        start = utime.ticks_ms()
+        try:
+            if not self.wifi_mgr.is_connected():
+                await self.wifi_mgr.connect()
+            self.mqtt_mgr.open_link()
+            timeout_ms = (self.config.LOW_POWER_WINDOW_TIMEOUT or 30) * 1000
+            while not self.mqtt_mgr.is_connected:
+                if utime.ticks_diff(utime.ticks_ms(), start) > timeout_ms:
+                    raise RuntimeError("MQTT not connected")
+                await uasyncio.sleep_ms(100)
+            await self.flush()
+            self.stats["windows"] += 1
+        except Exception as e:
+            self.stats["window_failures"] += 1
+            self.log_mgr.warning("Transmission window failed: {}", e)
+        finally:
+            if self.radio_mode == WINDOW:
+                await self.mqtt_mgr.close_link()
+                self.wifi_mgr.power_down()
+            self.in_window = False
+            self.stats["last_window_ms"] = utime.ticks_diff(utime.ticks_ms(), start)
+
+    def sleep(self, delay_ms):
+        # Light sleep stops the CPU and every task, so it is only taken while
+        # nothing can need service: radio off, no window and no valve open
+        if self.in_window or delay_ms < self.min_sleep_ms or self.wifi_mgr.wlan.active():
+            return False
+        if self.pump_mgr.state != IDLE or any(self.pump_mgr.valve_open):
+            return False
+        sleep_ms = min(delay_ms, self.max_sleep_ms)
+        if self.system_manager and not self.system_manager.service_watchdog():
+            # Stay awake so the pending watchdog reset is not delayed
+            return False
+        machine.lightsleep(sleep_ms)
+        self.stats["sleeps"] += 1
+        self.stats["sleep_ms"] += sleep_ms
+        return True
+
+    def get_stats(self):
+        elapsed_ms = max(utime.ticks_diff(utime.ticks_ms(), self.started_ms), 1)
+        radio_ms = min(self.wifi_mgr.get_radio_on_ms(), elapsed_ms)
+        sleep_ms = min(self.stats["sleep_ms"], elapsed_ms - radio_ms)
+        awake_ms = elapsed_ms - radio_ms - sleep_ms
+        config = self.config
+        if self.enabled and self.radio_mode == POWERSAVE:
+            radio_ma = config.LOW_POWER_POWERSAVE_MA or 12
+        else:
+            radio_ma = config.LOW_POWER_RADIO_MA or 45
+        # Average current over the uptime equals the charge drawn per hour
+        mah_per_hour = (radio_ms * radio_ma + awake_ms * (config.LOW_POWER_ACTIVE_MA or 20) +
+                        sleep_ms * (config.LOW_POWER_SLEEP_MA or 1.5)) / elapsed_ms
+        budget = config.LOW_POWER_BUDGET_MAH or 0
+        stats = dict(self.stats)
+        stats["enabled"] = self.enabled
+        stats["radio_on_ms"] = radio_ms
+        stats["radio_on_pct"] = round(radio_ms * 100 / elapsed_ms, 2)
+        stats["sleep_pct"] = round(sleep_ms * 100 / elapsed_ms, 2)
+        stats["mah_per_hour"] = round(mah_per_hour, 2)
+        stats["budget_pct"] = round(mah_per_hour * 100 / budget, 1) if budget else 0
+        return stats
@@ -0,0 +1,307 @@
+import json
+import os
+import utime
+from machine import Pin
+
+from managers.scheduler import PRIORITY_HIGH
+
+IDLE = "idle"
+COLLECTING = "collecting"
+PRIMING = "priming"
+PUMPING = "pumping"
+DRAINING = "draining"
+COOLDOWN = "cooldown"
+
+
+class PumpManager:
+    def __init__(self, config, log_mgr):
+        self.config = config
+        self.log_mgr = log_mgr
+        self.system_manager = None
+        self.on_valve_open = None
+        self.pump = Pin(config.WATER_PUMP_PIN, Pin.OUT, value=0)
+        self.valves = [Pin(pin, Pin.OUT, value=0) for pin in (config.SOLENOID_VALVE_PINS or [])]
+        # Full-flow watering time still owed to each valve; open valves pay it off by their share of the flow
+        self.remaining_ms = [0] * len(self.valves)
+        self.valve_open = [False] * len(self.valves)
+        self.valve_ml = [0.0] * len(self.valves)
+        self.pump_on = False
+        self.state = IDLE
+        self.state_since = utime.ticks_ms()
+        self.run_started = 0
+        self.collect_deadline = None
+        self.cooldown_pending = False
+        self.scheduler = None
+        self.tick_job = None
+        self.last_tick = 0
+
+        self.state_file = config.PUMP_STATE_FILE or "pump_state.json"
+        self.tank_ml = config.WATER_TANK_CAPACITY_ML or 10000
+        self.tank_empty = False
+        self.stats = {
+            "jobs": 0,
+            "merged_jobs": 0,
+            "rejected_jobs": 0,
+            "pump_starts": 0,
+            "pump_on_ms": 0,
+            "dispensed_ml": 0.0,
+            "max_run_cutoffs": 0,
+            "tank_cutoffs": 0
+        }
+        self.load_state()
+
+    def set_system_manager(self, system_manager):
+        self.system_manager = system_manager
+
+    def load_state(self):
+        try:
+            with open(self.state_file) as f:
+                saved = json.load(f)
+            self.tank_ml = saved.get("tank_ml", self.tank_ml)
+            for key in ("pump_starts", "pump_on_ms", "dispensed_ml"):
+                self.stats[key] = saved.get(key, self.stats[key])
+        except OSError:
+            pass
+        except Exception as e:
+            self.log_mgr.error("Error loading pump state: {}", e)
+        self.tank_empty = self.tank_ml <= (self.config.WATER_TANK_MIN_ML or 0)
+
+    def save_state(self):
+        temp_file = self.state_file + ".tmp"
+        try:
+            with open(temp_file, "w") as f:
+                json.dump({
+                    "tank_ml": self.tank_ml,
+                    "pump_starts": self.stats["pump_starts"],
+                    "pump_on_ms": self.stats["pump_on_ms"],
+                    "dispensed_ml": self.stats["dispensed_ml"]
+                }, f)
+            os.rename(temp_file, self.state_file)
+        except Exception as e:
+            self.log_mgr.error("Error saving pump state: {}", e)
+
+    def _flow_rate(self):
+        return self.config.PUMP_FLOW_RATE_ML_S or 15
+
+    def _max_run_ms(self):
+        return (self.config.PUMP_MAX_RUN_TIME or 120) * 1000
+
+    def add_job(self, valve, duration_s=None, volume_ml=None, max_wait_ms=None):
+        index = valve - 1 if isinstance(valve, int) else -1
+        if not 0 <= index < len(self.valves):
+            self.log_mgr.warning("Watering job rejected: unknown valve {}", valve)
+            self.stats["rejected_jobs"] += 1
+            return False
+        if self.tank_empty:
+            self.log_mgr.warning("Watering job for valve {} rejected: water tank empty", valve)
+            self.stats["rejected_jobs"] += 1
+            return False
+
+        for value in (duration_s, volume_ml):
+            if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool)):
+                self.log_mgr.warning("Watering job for valve {} rejected: {!r} is not a number", valve, value)
+                self.stats["rejected_jobs"] += 1
+                return False
+
+        if volume_ml is not None:
+            duration_s = volume_ml / self._flow_rate()
+        elif duration_s is None:
+            duration_s = self.config.PUMP_DEFAULT_DURATION or 10
+        duration_ms = min(int(duration_s * 1000), self._max_run_ms())
+        if duration_ms <= 0:
+            self.stats["rejected_jobs"] += 1
+            return False
+
+        # Overlapping jobs for one valve collapse into the longer one; jobs for
+        # other valves join the batch that is already collecting or pumping.
+        if self.remaining_ms[index] or self.state in (COLLECTING, PRIMING, PUMPING):
+            self.stats["merged_jobs"] += 1
+        self.remaining_ms[index] = max(self.remaining_ms[index], duration_ms)
+        if max_wait_ms is not None:
+            # Latency-sensitive jobs cut the merge window short
+            deadline = utime.ticks_add(utime.ticks_ms(), max_wait_ms)
+            if self.collect_deadline is None or utime.ticks_diff(deadline, self.collect_deadline) < 0:
+                self.collect_deadline = deadline
+        self.stats["jobs"] += 1
+        self.log_mgr.log("Watering job queued: valve {} for {} ms", valve, duration_ms)
+        self._wake()
+        return True
+
+    def water_all(self, duration_s=None):
+        for valve in range(1, len(self.valves) + 1):
+            self.add_job(valve, duration_s)
+
+    def stop_all(self, immediate=False):
+        for i in range(len(self.remaining_ms)):
+            self.remaining_ms[i] = 0
+        self.collect_deadline = None
+        self._set_pump(False)
+        if immediate or self.state in (IDLE, COLLECTING, COOLDOWN):
+            self._close_all_valves()
+            self._set_state(IDLE)
+        elif self.state != DRAINING:
+            self._set_state(DRAINING)
+        self._wake()
+
+    def reset_tank(self):
+        self.tank_ml = self.config.WATER_TANK_CAPACITY_ML or 10000
+        self.tank_empty = False
+        if self.system_manager:
+            self.system_manager.clear_error("water_tank_empty")
+        self.save_state()
+        self.log_mgr.log("Water tank reset to {} ml", self.tank_ml)
+
+    def _set_state(self, state):
+        self.state = state
+        self.state_since = utime.ticks_ms()
+
+    def _set_pump(self, on):
+        # Interlock: the pump must never push against closed valves
+        if on and not any(self.valve_open):
+            self.log_mgr.error("Pump start refused: no valve open")
+            return False
+        if on != self.pump_on:
+            self.pump.value(1 if on else 0)
+            self.pump_on = on
+        return True
+
+    def _set_valve(self, index, is_open):
+        if self.valve_open[index] == is_open:
+            return
+        if not is_open and self.pump_on and sum(self.valve_open) == 1:
+            # Closing the last open valve stops the pump first
+            self._set_pump(False)
+        self.valves[index].value(1 if is_open else 0)
+        self.valve_open[index] = is_open
+        if is_open and self.on_valve_open:
+            self.on_valve_open(index)
+
+    def _close_all_valves(self):
+        self._set_pump(False)
+        for i in range(len(self.valves)):
+            self._set_valve(i, False)
+
+    def _open_queued_valves(self):
+        for i, remaining in enumerate(self.remaining_ms):
+            if remaining:
+                self._set_valve(i, True)
+
+    def _account(self, elapsed_ms):
+        # One pump feeds every open valve, so they share its flow and the run
+        # lasts until each has had its full-flow time
+        open_valves = self.valve_open.count(True)
+        if not open_valves:
+            return
+        dispensed = self._flow_rate() * elapsed_ms / 1000
+        share_ms = elapsed_ms / open_valves
+        for i, is_open in enumerate(self.valve_open):
+            if is_open:
+                self.remaining_ms[i] = max(self.remaining_ms[i] - share_ms, 0)
+                self.valve_ml[i] += dispensed / open_valves
+        self.stats["pump_on_ms"] += elapsed_ms
+        self.stats["dispensed_ml"] += dispensed
+        self.tank_ml = max(self.tank_ml - dispensed, 0)
+
+    def _tank_cutoff(self):
+        self.log_mgr.error("Water tank empty ({} ml left), stopping pump", int(self.tank_ml))
+        self.tank_empty = True
+        self.stats["tank_cutoffs"] += 1
+        if self.system_manager:
+            self.system_manager.add_error("water_tank_empty")
+        self.stop_all()
+
+    def _finish_run(self, now):
+        self._set_pump(False)
+        run_ms = utime.ticks_diff(now, self.run_started)
+        self.log_mgr.log("Pump run finished after {} ms, {} ml left in tank", run_ms, int(self.tank_ml))
+        self._set_state(DRAINING)
+
+    def _step(self, now, elapsed_ms):
+        state = self.state
+        in_state = utime.ticks_diff(now, self.state_since)
+        settle_ms = self.config.PUMP_VALVE_SETTLE_MS or 200
+
+        if state == PUMPING:
+            self._account(elapsed_ms)
+            if self.tank_ml <= (self.config.WATER_TANK_MIN_ML or 0):
+                self._tank_cutoff()
+                return
+            if utime.ticks_diff(now, self.run_started) >= self._max_run_ms():
+                self.log_mgr.warning("Pump reached max run time, pausing for cooldown")
+                self.stats["max_run_cutoffs"] += 1
+                self.cooldown_pending = True
+                self._finish_run(now)
+                return
+            if not any(self.remaining_ms):
+                self._finish_run(now)
+                return
+            # Valves whose job is done close; jobs queued mid-run open their valve
+            for i, remaining in enumerate(self.remaining_ms):
+                if remaining and not self.valve_open[i]:
+                    self._set_valve(i, True)
+            for i, remaining in enumerate(self.remaining_ms):
+                if not remaining and self.valve_open[i]:
+                    self._set_valve(i, False)
+        elif state == IDLE:
+            if any(self.remaining_ms):
+                self._set_state(COLLECTING)
+        elif state == COLLECTING:
+            # Nearby jobs arriving during the merge window share this pump run
+            deadline = self.collect_deadline
+            if in_state >= (self.config.PUMP_MERGE_WINDOW or 0) * 1000 or (
+                    deadline is not None and utime.ticks_diff(now, deadline) >= 0):
+                self.collect_deadline = None
+                self._open_queued_valves()
+                self._set_state(PRIMING)
+        elif state == PRIMING:
+            if not any(self.remaining_ms):
+                self._close_all_valves()
+                self._set_state(IDLE)
+            elif in_state >= settle_ms:
+                self._open_queued_valves()
+                if self._set_pump(True):
+                    self.stats["pump_starts"] += 1
+                    self.run_started = now
+                    self._set_state(PUMPING)
+        elif state == DRAINING:
+            if in_state >= settle_ms:
+                self._close_all_valves()
+                self.save_state()
+                if self.cooldown_pending:
+                    self.cooldown_pending = False
+                    self._set_state(COOLDOWN)
+                else:
+                    self._set_state(IDLE)
+        elif state == COOLDOWN:
+            if in_state >= (self.config.PUMP_COOLDOWN or 60) * 1000:
+                self._set_state(IDLE)
+
+    def register_jobs(self, scheduler):
+        # The tick only runs while there is something to do; add_job and stop_all re-arm it
+        self.scheduler = scheduler
+        self.tick_job = scheduler.every("pump", self.config.PUMP_TICK_MS or 100, self._tick, PRIORITY_HIGH, delay_ms=0)
+
+    def _wake(self):
+        if self.tick_job and not self.tick_job.active:
+            self.last_tick = utime.ticks_ms()
+            self.scheduler.schedule(self.tick_job)
+
+    def _tick(self):
+        now = utime.ticks_ms()
+        self._step(now, utime.ticks_diff(now, self.last_tick))
+        self.last_tick = now
+        if self.state == IDLE and not any(self.remaining_ms):
+            self.scheduler.cancel(self.tick_job)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["dispensed_ml"] = int(stats["dispensed_ml"])
+        stats["state"] = self.state
+        stats["pump_on"] = self.pump_on
+        stats["open_valves"] = sum(self.valve_open)
+        stats["queued_valves"] = sum(1 for remaining in self.remaining_ms if remaining)
+        stats["tank_ml"] = int(self.tank_ml)
+        stats["tank_empty"] = self.tank_empty
+        for i, dispensed in enumerate(self.valve_ml):
+            stats[f"valve_{i + 1}_ml"] = int(dispensed)
+        return stats
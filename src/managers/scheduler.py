@@ -0,0 +1,232 @@
+import uasyncio
+import utime
+
+from managers.metrics import registry
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+class Job:
+    def __init__(self, name, func, period_ms, priority):
+        self.name = name
+        self.func = func
+        self.period_ms = period_ms
+        self.priority = priority
+        self.deadline = 0
+        self.active = False
+        self.running = False
+        self.started = 0
+        self.runs = 0
+        self.misses = 0
+        self.max_late_ms = 0
+
+
+class Scheduler:
+    def __init__(self, log_mgr, miss_ms=50):
+        self.log_mgr = log_mgr
+        self.miss_ms = miss_ms
+        self.loop_monitor = None
+        self.sleeper = None
+        self.stall_hook = None
+        self.stall_ms = 0
+        # Active jobs ordered by deadline; a handful of jobs keeps a sorted
+        # list cheaper than a heap and ticks_diff keeps it safe across wraps
+        self.queue = []
+        self.jobs = []
+        # Runs still awaiting I/O, one-shot jobs included
+        self.running = []
+        self.changed = uasyncio.Event()
+        self.wakeups = 0
+        self.misses = 0
+        self.max_late_ms = 0
+        self.max_late_job = ""
+        self.window_start = utime.ticks_ms()
+        self.window_wakeups = 0
+        self.wakeups_per_s = 0
+        self.lateness = registry.histogram("scheduler_late_ms", "Job start delay past its deadline", (1, 2, 5, 10, 25, 50, 100, 250, 1000))
+
+    def set_loop_monitor(self, loop_monitor):
+        self.loop_monitor = loop_monitor
+
+    def set_sleeper(self, sleeper):
+        # sleeper(delay_ms) may block in a low-power sleep and returns True if it did
+        self.sleeper = sleeper
+
+    def set_stall_hook(self, stall_ms, hook):
+        # hook(task, duration_ms) hears about every gap of at least stall_ms in which the loop could not run
+        self.stall_ms = stall_ms
+        self.stall_hook = hook
+
+    def find(self, name):
+        for job in self.jobs:
+            if job.name == name:
+                return job
+        return None
+
+    def every(self, name, period_ms, func, priority=PRIORITY_NORMAL, delay_ms=None):
+        job = Job(name, func, period_ms, priority)
+        self.jobs.append(job)
+        self.schedule(job, period_ms if delay_ms is None else delay_ms)
+        return job
+
+    def after(self, name, delay_ms, func, priority=PRIORITY_NORMAL):
+        # One-shot jobs can be re-armed with schedule(); they are left out of the per-job stats
+        job = Job(name, func, 0, priority)
+        self.schedule(job, delay_ms)
+        return job
+
+    def schedule(self, job, delay_ms=0):
+        # (Re)arms a job; an earlier deadline than the current sleep wakes the loop
+        self._remove(job)
+        job.deadline = utime.ticks_add(utime.ticks_ms(), delay_ms)
+        self._insert(job)
+        self.changed.set()
+
+    def cancel(self, job):
+        self._remove(job)
+
+    def set_period(self, job, period_ms):
+        job.period_ms = period_ms
+        if job.active:
+            self.schedule(job, period_ms)
+
+    def _insert(self, job):
+        queue = self.queue
+        index = len(queue)
+        while index and utime.ticks_diff(queue[index - 1].deadline, job.deadline) > 0:
+            index -= 1
+        queue.insert(index, job)
+        job.active = True
+
+    def _remove(self, job):
+        if job.active:
+            self.queue.remove(job)
+            job.active = False
+
+    def _next_due(self, now):
+        # Highest priority among the jobs that are due; ties go to the earliest deadline
+        best = None
+        for job in self.queue:
+            if utime.ticks_diff(job.deadline, now) > 0:
+                break
+            if best is None or job.priority < best.priority:
+                best = job
+        return best
+
+    def _run_job(self, job, now):
+        late = utime.ticks_diff(now, job.deadline)
+        self.lateness.observe(late)
+        if late > job.max_late_ms:
+            job.max_late_ms = late
+        if late > self.max_late_ms:
+            self.max_late_ms = late
+            self.max_late_job = job.name
+        if late > self.miss_ms:
+            job.misses += 1
+            self.misses += 1
+        if job.period_ms:
+            # Fixed rate without drift; a job that fell a whole period behind skips ahead
+            deadline = utime.ticks_add(job.deadline, job.period_ms)
+            if utime.ticks_diff(deadline, now) <= 0:
+                deadline = utime.ticks_add(now, job.period_ms)
+            job.deadline = deadline
+            self._insert(job)
+        if job.running:
+            # The previous run is still awaiting I/O; never overlap runs of one job
+            job.misses += 1
+            self.misses += 1
+            return
+        job.runs += 1
+        try:
+            start = utime.ticks_ms()
+            result = job.func()
+            # Jobs may return a coroutine (a generator on MicroPython); any other value is ignored
+            if hasattr(result, "send"):
+                # Coroutines run in their own task so slow I/O cannot hold up the watchdog or the pump
+                job.running = True
+                job.started = start
+                self.running.append(job)
+                if self.loop_monitor:
+                    result = self.loop_monitor.wrap(job.name, result)
+                uasyncio.create_task(self._finish(job, result))
+            elif self.stall_hook:
+                elapsed = utime.ticks_diff(utime.ticks_ms(), start)
+                if elapsed >= self.stall_ms:
+                    self.stall_hook(job.name, elapsed)
+        except Exception as e:
+            self.log_mgr.error("Scheduled job {} failed: {}", job.name, e)
+
+    async def _finish(self, job, coro):
+        try:
+            await coro
+        except Exception as e:
+            self.log_mgr.error("Scheduled job {} failed: {}", job.name, e)
+        finally:
+            job.running = False
+            self.running.remove(job)
+            if self.sleeper:
+                # The loop holds off a low-power sleep until this run is done
+                self.changed.set()
+
+    async def run(self):
+        while True:
+            now = utime.ticks_ms()
+            job = self._next_due(now)
+            if job:
+                # One job at a time, so a job may cancel or re-arm the others
+                self._remove(job)
+                self._run_job(job, now)
+                continue
+            self.changed.clear()
+            if self.queue:
+                delay = utime.ticks_diff(self.queue[0].deadline, now)
+                if self.sleeper and not self.running and self.sleeper(delay):
+                    # Let tasks that became ready during the sleep run first
+                    await uasyncio.sleep_ms(0)
+                else:
+                    if self.stall_hook and self.loop_monitor:
+                        self.loop_monitor.take_longest()
+                    try:
+                        await uasyncio.wait_for_ms(self.changed.wait(), delay)
+                    except uasyncio.TimeoutError:
+                        pass
+                    if self.stall_hook:
+                        self._check_gap(utime.ticks_add(now, delay))
+            else:
+                await self.changed.wait()
+            self.wakeups += 1
+            self.window_wakeups += 1
+
+    def _check_gap(self, wake_at):
+        # Waking up late means another task held the CPU; blame the longest step seen while waiting
+        gap = utime.ticks_diff(utime.ticks_ms(), wake_at)
+        if gap < self.stall_ms:
+            return
+        task = "unmonitored"
+        if self.loop_monitor:
+            name, step_ms = self.loop_monitor.take_longest()
+            if step_ms * 2 >= gap:
+                task = name
+        self.stall_hook(task, gap)
+
+    def get_stats(self):
+        now = utime.ticks_ms()
+        window_ms = utime.ticks_diff(now, self.window_start)
+        if window_ms > 0:
+            self.wakeups_per_s = round(self.window_wakeups * 1000 / window_ms, 2)
+        self.window_start = now
+        self.window_wakeups = 0
+        stats = {
+            "jobs": len(self.queue),
+            "wakeups": self.wakeups,
+            "wakeups_per_s": self.wakeups_per_s,
+            "misses": self.misses,
+            "max_late_ms": self.max_late_ms,
+            "max_late_job": self.max_late_job
+        }
+        for job in self.jobs:
+            stats[f"{job.name}_runs"] = job.runs
+            stats[f"{job.name}_misses"] = job.misses
+        return stats
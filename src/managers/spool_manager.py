@@ -0,0 +1,204 @@
+import json
+import os
+import uasyncio
+
+
+class SpoolManager:
+    def __init__(self, config, log_mgr):
+        self.config = config
+        self.log_mgr = log_mgr
+        self.directory = config.SPOOL_DIRECTORY or "spool"
+        self.ram_capacity = config.SPOOL_RAM_CAPACITY or 8
+        self.segment_size = config.SPOOL_SEGMENT_SIZE or 4096
+        self.max_segments = config.SPOOL_MAX_SEGMENTS or 32
+        self.replay_batch_size = config.SPOOL_REPLAY_BATCH_SIZE or 10
+        self.replay_interval_ms = config.SPOOL_REPLAY_INTERVAL_MS or 1000
+        # Only these groups are spooled; the per-subsystem stats would make every line several times larger
+        self.topics = config.SPOOL_TOPICS or ["system", "adc", "current_config"]
+        self.offset_file = self.directory + "/offset"
+
+        # Fixed-size RAM ring in front of the flash segments
+        self.ram = [None] * self.ram_capacity
+        self.ram_head = 0
+        self.ram_count = 0
+
+        # Each segment is [sequence, size_in_bytes, line_count], oldest first
+        self.segments = []
+        self.replay_offset = 0
+        self.replaying = False
+        self.stats = {"queued": 0, "dropped": 0, "replayed": 0}
+        self._load_segments()
+
+    def _path(self, seq):
+        return f"{self.directory}/{seq:08d}.log"
+
+    def _load_segments(self):
+        try:
+            os.mkdir(self.directory)
+        except OSError:
+            pass
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.endswith(".log"))
+            for name in names:
+                seq = int(name[:-4])
+                lines = 0
+                size = 0
+                with open(self._path(seq), "rb") as f:
+                    while True:
+                        chunk = f.read(256)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        lines += chunk.count(b"\n")
+                if lines:
+                    self.segments.append([seq, size, lines])
+                else:
+                    os.remove(self._path(seq))
+            if self.segments:
+                self.replay_offset = self._load_offset()
+                self.log_mgr.log("Spool recovered {} samples from {} segments", self.pending(), len(self.segments))
+        except Exception as e:
+            self.log_mgr.error("Error loading spool segments: {}", e)
+
+    def _load_offset(self):
+        # "<seq> <offset>" of the head segment, so a reboot during replay does not resend what was acked
+        try:
+            with open(self.offset_file) as f:
+                seq, offset = f.read().split()
+            if int(seq) == self.segments[0][0]:
+                return min(int(offset), self.segments[0][2])
+        except (OSError, ValueError):
+            pass
+        return 0
+
+    def _save_offset(self):
+        try:
+            if self.segments and self.replay_offset:
+                with open(self.offset_file, "w") as f:
+                    f.write(f"{self.segments[0][0]} {self.replay_offset}")
+            else:
+                os.remove(self.offset_file)
+        except OSError:
+            pass
+
+    def pending(self):
+        flash_pending = sum(segment[2] for segment in self.segments) - self.replay_offset
+        return flash_pending + self.ram_count
+
+    def get_stats(self):
+        return {
+            "queued": self.stats["queued"],
+            "dropped": self.stats["dropped"],
+            "replayed": self.stats["replayed"],
+            "pending": self.pending()
+        }
+
+    def enqueue(self, snapshot):
+        line = json.dumps({topic: snapshot[topic] for topic in self.topics if topic in snapshot})
+        if self.ram_count == self.ram_capacity:
+            self.flush()
+        if self.ram_count == self.ram_capacity:
+            # Flash unavailable: evict the oldest sample from the ring
+            self.ram[self.ram_head] = None
+            self.ram_head = (self.ram_head + 1) % self.ram_capacity
+            self.ram_count -= 1
+            self.stats["dropped"] += 1
+        self.ram[(self.ram_head + self.ram_count) % self.ram_capacity] = line
+        self.ram_count += 1
+        self.stats["queued"] += 1
+
+    def flush(self):
+        if not self.ram_count:
+            return
+        # Writing the whole ring in one append keeps flash writes batched
+        try:
+            segment = self.segments[-1] if self.segments else None
+            if segment is None or segment[1] >= self.segment_size:
+                segment = self._rotate()
+            with open(self._path(segment[0]), "a") as f:
+                while self.ram_count:
+                    line = self.ram[self.ram_head]
+                    f.write(line)
+                    f.write("\n")
+                    segment[1] += len(line) + 1
+                    segment[2] += 1
+                    self.ram[self.ram_head] = None
+                    self.ram_head = (self.ram_head + 1) % self.ram_capacity
+                    self.ram_count -= 1
+        except Exception as e:
+            self.log_mgr.error("Error writing spool segment: {}", e)
+
+    def _rotate(self):
+        seq = self.segments[-1][0] + 1 if self.segments else 0
+        segment = [seq, 0, 0]
+        self.segments.append(segment)
+        while len(self.segments) > self.max_segments:
+            dropped = self.segments[0][2] - self.replay_offset
+            self._remove_oldest_segment()
+            self.stats["dropped"] += dropped
+            self.log_mgr.warning("Spool full, evicted {} oldest samples", dropped)
+        return segment
+
+    def _remove_oldest_segment(self):
+        seq = self.segments.pop(0)[0]
+        self.replay_offset = 0
+        try:
+            os.remove(self._path(seq))
+        except OSError:
+            pass
+
+    def _read_batch(self):
+        batch = []
+        if self.segments:
+            seq = self.segments[0][0]
+            index = 0
+            with open(self._path(seq)) as f:
+                for line in f:
+                    if index >= self.replay_offset:
+                        batch.append(line.rstrip("\n"))
+                        if len(batch) >= self.replay_batch_size:
+                            break
+                    index += 1
+            if not batch:
+                self._remove_oldest_segment()
+            return seq, batch
+
+        for i in range(min(self.ram_count, self.replay_batch_size)):
+            batch.append(self.ram[(self.ram_head + i) % self.ram_capacity])
+        return None, batch
+
+    def _ack(self, seq):
+        if seq is None:
+            self.ram[self.ram_head] = None
+            self.ram_head = (self.ram_head + 1) % self.ram_capacity
+            self.ram_count -= 1
+        elif self.segments and self.segments[0][0] == seq:
+            self.replay_offset += 1
+            if self.replay_offset >= self.segments[0][2]:
+                self._remove_oldest_segment()
+        self.stats["replayed"] += 1
+
+    async def replay(self, publish):
+        if self.replaying:
+            return
+        self.replaying = True
+        try:
+            self.log_mgr.log("Replaying {} spooled samples", self.pending())
+            while self.pending():
+                seq, batch = self._read_batch()
+                try:
+                    for line in batch:
+                        if not await publish(line):
+                            self.log_mgr.log("Spool replay interrupted")
+                            return
+                        self._ack(seq)
+                finally:
+                    if seq is not None:
+                        # Once per batch keeps flash writes down; a reboot resends at most one batch
+                        self._save_offset()
+                await uasyncio.sleep_ms(self.replay_interval_ms)
+            self.log_mgr.log("Spool replay completed")
+        except Exception as e:
+            self.log_mgr.error("Error replaying spool: {}", e)
+        finally:
+            self.replaying = False
@@ -0,0 +1,74 @@
+import uasyncio
+import utime
+
+
+class StartupManager:
+    def __init__(self, log_mgr):
+        self.log_mgr = log_mgr
+        self.boot_ms = utime.ticks_ms()
+        self.stages = []
+        self.done_events = {}
+        self.status = {}
+        self.durations = {}
+        self.milestones = {"ready": -1}
+
+    def add_stage(self, name, func, depends_on=(), timeout=None):
+        # Dependencies only order stages; a failed dependency does not cancel
+        # its dependents, which are expected to cope with a missing network.
+        self.stages.append((name, func, depends_on, timeout))
+        self.done_events[name] = uasyncio.Event()
+        self.status[name] = "pending"
+
+    def start(self):
+        for name, func, depends_on, timeout in self.stages:
+            uasyncio.create_task(self._run_stage(name, func, depends_on, timeout))
+
+    async def _run_stage(self, name, func, depends_on, timeout):
+        for dependency in depends_on:
+            await self.done_events[dependency].wait()
+
+        self.status[name] = "running"
+        start = utime.ticks_ms()
+        try:
+            if timeout:
+                result = await uasyncio.wait_for(func(), timeout)
+            else:
+                result = await func()
+            self.status[name] = "failed" if result is False else "ok"
+        except uasyncio.TimeoutError:
+            self.status[name] = "timeout"
+        except Exception as e:
+            self.status[name] = "failed"
+            self.log_mgr.error("Startup stage {} failed: {}", name, e)
+
+        self.durations[name] = utime.ticks_diff(utime.ticks_ms(), start)
+        self.log_mgr.log("Startup stage {}: {} after {} ms", name, self.status[name], self.durations[name])
+        self.done_events[name].set()
+        if all(event.is_set() for event in self.done_events.values()):
+            self.mark("ready")
+
+    async def wait(self, name):
+        await self.done_events[name].wait()
+        return self.status[name] == "ok"
+
+    def is_done(self, name):
+        return self.done_events[name].is_set()
+
+    def add_milestone(self, milestone):
+        # Reported as -1 until reached
+        self.milestones.setdefault(milestone, -1)
+
+    def mark(self, milestone):
+        # Milestones are recorded once, relative to boot
+        if self.milestones.get(milestone, -1) < 0:
+            self.milestones[milestone] = utime.ticks_diff(utime.ticks_ms(), self.boot_ms)
+            self.log_mgr.log("Startup milestone {} reached after {} ms", milestone, self.milestones[milestone])
+
+    def get_stats(self):
+        stats = {}
+        for name, _, _, _ in self.stages:
+            stats[f"{name}_ms"] = self.durations.get(name, -1)
+            stats[f"{name}_status"] = self.status[name]
+        for milestone, elapsed in self.milestones.items():
+            stats[f"{milestone}_ms"] = elapsed
+        return stats
@@ -0,0 +1,137 @@
+import json
+import os
+import machine
+import utime
+
+from managers.metrics import registry
+
+
+class Supervisor:
+    def __init__(self, config, log_mgr):
+        self.config = config
+        self.log_mgr = log_mgr
+        self.timeout_ms = config.SUPERVISOR_TIMEOUT_MS or 30000
+        self.job_timeout_ms = config.SUPERVISOR_JOB_TIMEOUT_MS or 60000
+        self.stall_ms = config.SUPERVISOR_STALL_MS or 500
+        self.worst_size = config.SUPERVISOR_WORST_STALLS or 5
+        self.crash_file = config.SUPERVISOR_CRASH_FILE or "crash.json"
+        self.scheduler = None
+        # name -> [last beat, timeout_ms, critical]
+        self.tasks = {}
+        # [duration_ms, task] pairs, longest first
+        self.worst = []
+        self.unhealthy = None
+        self.withheld = 0
+        self.stalls = 0
+        self.started_ms = utime.ticks_ms()
+        self.stall_counter = registry.counter("loop_stalls_total", "Event loop stalls longer than SUPERVISOR_STALL_MS")
+        self.previous = self._load_previous()
+
+    def _load_previous(self):
+        # The record of the last run; it is published once MQTT is up
+        record = None
+        try:
+            with open(self.crash_file) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            pass
+        cause = machine.reset_cause()
+        if cause == machine.WDT_RESET:
+            if record is None:
+                record = {"reason": "watchdog", "stalls": []}
+            record["watchdog_reset"] = True
+        if record is not None:
+            record["reset_cause"] = cause
+            self.log_mgr.warning("Previous run ended with {}: {}", record.get("reason"), record.get("stalls"))
+        return record
+
+    def set_scheduler(self, scheduler):
+        self.scheduler = scheduler
+        scheduler.set_stall_hook(self.stall_ms, self.record_stall)
+
+    def watch(self, name, timeout_ms=None, critical=True):
+        self.tasks[name] = [utime.ticks_ms(), timeout_ms or self.timeout_ms, critical]
+
+    def unwatch(self, name):
+        self.tasks.pop(name, None)
+
+    def beat(self, name):
+        task = self.tasks.get(name)
+        if task is not None:
+            task[0] = utime.ticks_ms()
+
+    def _find_unhealthy(self, now):
+        for name, (last, timeout_ms, critical) in self.tasks.items():
+            silent = utime.ticks_diff(now, last)
+            if critical and silent > timeout_ms:
+                return name, silent
+        if self.scheduler:
+            # A job awaiting I/O that never returns blocks every later run of it
+            for job in self.scheduler.running:
+                busy = utime.ticks_diff(now, job.started)
+                if busy > self.job_timeout_ms:
+                    return "job:" + job.name, busy
+        return None, 0
+
+    def healthy(self):
+        name, silent = self._find_unhealthy(utime.ticks_ms())
+        if name is None:
+            self.unhealthy = None
+            return True
+        self.withheld += 1
+        if name != self.unhealthy:
+            # Feeding stops now, so the watchdog resets the board shortly
+            self.unhealthy = name
+            self.log_mgr.error("Task {} silent for {} ms, withholding watchdog feed", name, silent)
+            self.save("task_stalled", name, silent)
+        return False
+
+    def record_stall(self, task, duration_ms):
+        self.stalls += 1
+        self.stall_counter.inc()
+        worst = self.worst
+        if len(worst) >= self.worst_size and duration_ms <= worst[-1][0]:
+            return
+        self.log_mgr.warning("Event loop stalled {} ms by {}", duration_ms, task)
+        worst.append([duration_ms, task])
+        worst.sort(key=lambda entry: -entry[0])
+        del worst[self.worst_size:]
+        # Written right away: a stall this long may be followed by a watchdog reset
+        self.save("stall")
+
+    def save(self, reason, task=None, silent_ms=0):
+        record = {
+            "reason": reason,
+            "time": utime.time(),
+            "uptime_ms": utime.ticks_diff(utime.ticks_ms(), self.started_ms),
+            "stalls": self.worst
+        }
+        if task:
+            record["task"] = task
+            record["silent_ms"] = silent_ms
+        try:
+            with open(self.crash_file, "w") as f:
+                json.dump(record, f)
+        except Exception as e:
+            self.log_mgr.error("Error saving crash record: {}", e)
+
+    async def publish_previous(self, mqtt_mgr):
+        if self.previous is None or not mqtt_mgr.is_connected:
+            return
+        if await mqtt_mgr.publish_crash(json.dumps(self.previous)):
+            self.previous = None
+            if not self.worst and self.unhealthy is None:
+                try:
+                    os.remove(self.crash_file)
+                except OSError:
+                    pass
+
+    def get_stats(self):
+        return {
+            "watched": len(self.tasks),
+            "withheld": self.withheld,
+            "unhealthy": self.unhealthy or "",
+            "stalls": self.stalls,
+            "worst_stall_ms": self.worst[0][0] if self.worst else 0,
+            "worst_stall_task": self.worst[0][1] if self.worst else ""
+        }
@@ -1,15 +1,20 @@
 import machine
-from machine import ADC, Pin, freq
+from machine import freq
 import utime
-import ntptime
 import uasyncio
-import gc
-import micropython
+
+from managers.adc_sampler import AdcSampler
+from managers.loop_monitor import LoopMonitor
+from managers.gc_manager import GcManager
+from managers.module_loader import loader
+from managers.scheduler import PRIORITY_HIGH, PRIORITY_LOW
+from managers.supervisor import Supervisor
 
 class SystemManager:
     def __init__(self, config, log_mgr, data_mgr):
         self.config = config
-        self.wdt = machine.WDT(timeout=8000)  # 8 second timeout
+        self.wdt_timeout_ms = 8000
+        self.wdt = machine.WDT(timeout=self.wdt_timeout_ms)
         self.last_wdt_feed = utime.ticks_ms()
         self.wdt_feed_interval = 1000 
         self.client_name = self.config.MQTT_CLIENT_NAME
@@ -17,11 +22,19 @@ class SystemManager:
         self.data_mgr = data_mgr
         self.ADC_PINS = self.config.ADC_PINS_TO_MONITOR if hasattr(self.config, 'ADC_PINS_TO_MONITOR') else []
         self.adc_readings = {}
+        self.adc_keys = [f"adc_{pin}" for pin in self.ADC_PINS]
+        self.adc_sampler = AdcSampler(
+            self.ADC_PINS,
+            oversample=self.config.ADC_OVERSAMPLE or 4,
+            calibration=self.config.ADC_CALIBRATION,
+            max_age_ms=self.config.ADC_SAMPLE_MAX_AGE_MS or 500
+        )
         self.internal_voltage = 0
         self.chip_temperature = 0
         self.cpu_freq = freq()
-        self.last_time = utime.ticks_ms()
-        self.last_run_time = 0
+        self.loop_monitor = LoopMonitor()
+        self.gc_mgr = GcManager(config, log_mgr)
+        self.supervisor = Supervisor(config, log_mgr)
         self.start_time = utime.ticks_ms()
         self.uptime = 0
         self.mem_alloc_threshold = 0.9  # 90% memory allocation threshold
@@ -30,32 +43,81 @@ class SystemManager:
         self.processing_tasks = set()
         self.errors = set()
         self.time_offset = self.config.DST_HOURS * 3600  # 2 hours offset for summer time (CEST)
+        self.config.subscribe("DST_HOURS", self._on_dst_hours_changed)
+        self.last_time_file = self.config.LAST_TIME_FILE or "last_time.txt"
+        self.last_time_save_interval = self.config.LAST_TIME_SAVE_INTERVAL or 3600
+        self.last_time_saved = 0
+        self.time_synced = False
+
+    def _on_dst_hours_changed(self, key, value):
+        self.time_offset = value * 3600
 
   
     def feed_watchdog(self):
-        current_time = utime.ticks_ms()
-        if utime.ticks_diff(current_time, self.last_wdt_feed) >= self.wdt_feed_interval:
-            self.wdt.feed()
-            self.last_wdt_feed = current_time
-
-
-    def sync_time(self, max_retries=5):
-        for i in range(max_retries):
-            try:
-                ntptime.settime()
-                return True
-            except Exception as e:
-                self.log_mgr.log(f"Error synchronizing time (attempt {i+1}/{max_retries}): {str(e)}")
-                utime.sleep(1)
-        
-        self.set_time_from_compile()
+        self.wdt.feed()
+        self.last_wdt_feed = utime.ticks_ms()
+
+    def service_watchdog(self):
+        # Only fed while every supervised task is alive, so a wedged task ends in a reset
+        if self.supervisor.healthy():
+            self.feed_watchdog()
+            return True
         return False
 
 
-    def set_time_from_compile(self):
-        compile_time = utime.localtime()
-        machine.RTC().datetime((compile_time[0], compile_time[1], compile_time[2], compile_time[6], compile_time[3], compile_time[4], compile_time[5], 0))
-        self.log_mgr.log(f"Time set from compile time: {compile_time}")
+    async def sync_time(self, max_retries=5, timeout_ms=1000):
+        # The NTP client is only needed during startup; drop it afterwards
+        ntp_client = loader.load("managers.ntp_client")
+        host, _, port = (self.config.NTP_HOST or "pool.ntp.org").partition(":")
+        addr = None
+        try:
+            for i in range(max_retries):
+                try:
+                    if addr is None:
+                        addr = ntp_client.resolve(host, int(port) if port else ntp_client.NTP_PORT)
+                    self.set_rtc(await ntp_client.query_time(addr, timeout_ms))
+                    self.time_synced = True
+                    self.save_last_known_time()
+                    return True
+                except Exception as e:
+                    self.log_mgr.warning("Error synchronizing time (attempt {}/{}): {}", i + 1, max_retries, e)
+                    await uasyncio.sleep(1)
+        finally:
+            ntp_client = None
+            freed = loader.unload("managers.ntp_client")
+            if freed:
+                self.log_mgr.log("Unloaded NTP client: {} bytes freed", freed)
+
+        self.set_time_from_last_known()
+        return False
+
+
+    def set_rtc(self, timestamp):
+        tm = utime.gmtime(timestamp)
+        machine.RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+
+
+    def save_last_known_time(self):
+        now = utime.time()
+        try:
+            with open(self.last_time_file, "w") as f:
+                f.write(str(now))
+            self.last_time_saved = now
+        except Exception as e:
+            self.log_mgr.error("Error saving last known time: {}", e)
+
+
+    def set_time_from_last_known(self):
+        try:
+            with open(self.last_time_file) as f:
+                last_known = int(f.read())
+        except Exception:
+            self.log_mgr.log("No last known time available, keeping RTC time: {}", utime.localtime())
+            return
+        # Never move the clock backwards; the RTC may already be ahead of the saved value
+        if last_known > utime.time():
+            self.set_rtc(last_known)
+        self.log_mgr.log("Time set from last known time: {}", utime.localtime())
 
 
     def get_local_time(self):
@@ -72,11 +134,14 @@ class SystemManager:
             time_tuple[3], time_tuple[4], time_tuple[5]
         )
 
-    async def run(self):
-        while True:
-            self.update_status()
-            self.feed_watchdog()
-            await uasyncio.sleep_ms(100)
+    def register_jobs(self, scheduler):
+        # Status follows add_error/start_processing directly; only the watchdog and the clock need timers
+        scheduler.every("wdt", self.wdt_feed_interval, self.service_watchdog, PRIORITY_HIGH, delay_ms=0)
+        scheduler.every("time_save", self.last_time_save_interval * 1000, self._save_time_job, PRIORITY_LOW)
+
+    def _save_time_job(self):
+        if self.time_synced:
+            self.save_last_known_time()
 
     
     def clear_memory(self):
@@ -91,7 +156,7 @@ class SystemManager:
         self.processing_tasks.clear()
         
         # Perform garbage collection
-        gc.collect()
+        self.gc_mgr.collect()
         
         self.log_mgr.log("System memory cleared")
         
@@ -113,6 +178,7 @@ class SystemManager:
     def restart_system(self):
         self.log_mgr.log("System restart initiated by SystemManager")
         # Perform any necessary cleanup here
+        self.config.flush()
         utime.sleep(1)  # Short delay to allow for cleanup
         machine.reset()  # Perform a soft reset of the system
 
@@ -154,59 +220,44 @@ class SystemManager:
 
     def check_voltage(self, adc_pin):
         try:
-            adc = ADC(Pin(adc_pin))
-            raw = adc.read_u16()
-            voltage = (raw * 3.3) / 65535
-            return voltage
+            self.adc_sampler.sample()
+            return self.adc_sampler.values[self.ADC_PINS.index(adc_pin)]
         except Exception as e:
-            self.log_mgr.log(f"Error reading ADC pin {adc_pin}: {e}")
+            self.log_mgr.error("Error reading ADC pin {}: {}", adc_pin, e)
             return 0
 
 
     def check_system(self):
         try:
-            temp_sensor = machine.ADC(4)
-            reading = temp_sensor.read_u16() * (3.3 / 65535)
-            temperature = 27 - (reading - 0.706) / 0.001721
-            return machine.ADC(29).read_u16() * (3.3 / 65535), temperature
+            self.adc_sampler.sample()
+            return self.adc_sampler.internal_voltage, self.adc_sampler.chip_temperature
         except Exception as e:
-            self.log_mgr.log(f"Error reading system data: {e}")
+            self.log_mgr.error("Error reading system data: {}", e)
             return 0, 0
 
 
     def update_system_data(self):
-        self.internal_voltage, self.chip_temperature = self.check_system()
         self.update_uptime()
-        for pin in self.ADC_PINS:
-            self.adc_readings[f"adc_{pin}"] = self.check_voltage(pin)
+        try:
+            # Readings younger than ADC_SAMPLE_MAX_AGE_MS are reused
+            self.adc_sampler.sample()
+        except Exception as e:
+            self.log_mgr.error("Error reading system data: {}", e)
+            return
+        sampler = self.adc_sampler
+        self.internal_voltage = sampler.internal_voltage
+        self.chip_temperature = sampler.chip_temperature
+        for i, key in enumerate(self.adc_keys):
+            self.adc_readings[key] = sampler.values[i]
 
 
     def estimate_cpu_usage(self):
-        def busy_wait():
-            start = utime.ticks_us()
-            while utime.ticks_diff(utime.ticks_us(), start) < 10000:
-                pass
-        
-        start = utime.ticks_ms()
-        busy_wait()
-        end = utime.ticks_ms()
-        
-        run_time = utime.ticks_diff(end, start)
-        total_time = utime.ticks_diff(end, self.last_time)
-        
-        usage = (run_time / total_time) if total_time > 0 else 0
-        self.last_time = end
-        self.last_run_time = run_time
-        
-        return usage
+        # Share of wall time spent inside instrumented tasks since the last call
+        return self.loop_monitor.utilization()
 
 
     def get_ram_usage(self):
-        gc.collect()
-        free = gc.mem_free()
-        alloc = gc.mem_alloc()
-        total = free + alloc
-        return alloc / total if total > 0 else 0
+        return self.gc_mgr.ram_usage()
 
 
     def check_resources(self):
@@ -214,11 +265,11 @@ class SystemManager:
         ram_usage = self.get_ram_usage()
         
         if ram_usage > self.mem_alloc_threshold:
-            self.log_mgr.log(f"Warning: High memory usage ({ram_usage:.2%}). Performing garbage collection.")
-            gc.collect()
+            # GcManager already collects under pressure; this is live data that a collection cannot free
+            self.log_mgr.warning("High memory usage ({:.2%}) after garbage collection.", ram_usage)
         
         if cpu_usage > self.cpu_usage_threshold:
-            self.log_mgr.log(f"Warning: High CPU usage ({cpu_usage:.2%}). Consider optimizing or reducing workload.")
+            self.log_mgr.warning("High CPU usage ({:.2%}). Consider optimizing or reducing workload.", cpu_usage)
         
         return cpu_usage, ram_usage
 
@@ -238,7 +289,8 @@ class SystemManager:
                 "timestamp": timestamp,
                 "uptime": self.get_uptime_string()
             },
-            "adc": {f"adc_{pin}": round(self.adc_readings.get(f"adc_{pin}", 0), 2) for pin in self.ADC_PINS}
+            "adc": {key: round(self.adc_readings.get(key, 0), 2) for key in self.adc_keys},
+            "loop": self.loop_monitor.get_stats()
         }
         
         return mqtt_data
@@ -256,8 +308,8 @@ class SystemManager:
         mqtt_data, influx_data = self.get_system_data()
         self.log_mgr.log("System Data:")
         for category, values in mqtt_data.items():
-            self.log_mgr.log(f"  {category}:")
+            self.log_mgr.log("  {}:", category)
             for key, value in values.items():
-                self.log_mgr.log(f"    {key}: {value}")
+                self.log_mgr.log("    {}: {}", key, value)
         self.log_mgr.log("---")
         
\ No newline at end of file
@@ -0,0 +1,174 @@
+HEX_DIGITS = b"0123456789abcdef"
+# \b \t \n \f \r
+CONTROL_ESCAPES = {8: 98, 9: 116, 10: 110, 12: 102, 13: 114}
+
+
+class TelemetrySerializer:
+    def __init__(self, config, buffer_size=512):
+        self.config = config
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.pos = 0
+        self.subtopic_table = []
+        self.topic_table = []
+        self.device_topic = b""
+        # What the last document's values would have cost as one subtopic packet each
+        self.legacy_packets = 0
+        self.legacy_bytes = 0
+        self._topics_source = None
+        self._client_name = None
+        self.refresh()
+
+    def refresh(self):
+        # Topic byte strings only change when MQTT_TOPICS or the client name do
+        topics = self.config.MQTT_TOPICS or {}
+        client_name = self.config.MQTT_CLIENT_NAME
+        if topics is self._topics_source and client_name == self._client_name:
+            return False
+
+        subtopic_table = []
+        topic_table = []
+        for topic, subtopics in topics.items():
+            keys = []
+            for subtopic in subtopics:
+                full_topic = f"{client_name}/{topic}/{subtopic}".encode()
+                subtopic_table.append((topic, subtopic, full_topic))
+                # QoS 0 PUBLISH header, one length byte and the topic; values are short
+                keys.append((subtopic, f'"{subtopic}":'.encode(), 4 + len(full_topic)))
+            topic_table.append((topic, f"{client_name}/{topic}".encode(), f'"{topic}":'.encode(), keys))
+
+        self.subtopic_table = subtopic_table
+        self.topic_table = topic_table
+        self.device_topic = f"{client_name}/state".encode()
+        self._topics_source = topics
+        self._client_name = client_name
+        return True
+
+    def _grow(self, needed):
+        size = len(self.buffer)
+        while size < needed:
+            size *= 2
+        buffer = bytearray(size)
+        buffer[:self.pos] = self.buffer[:self.pos]
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+
+    def _put(self, byte):
+        if self.pos >= len(self.buffer):
+            self._grow(self.pos + 1)
+        self.buffer[self.pos] = byte
+        self.pos += 1
+
+    def _put_bytes(self, data):
+        if self.pos + len(data) > len(self.buffer):
+            self._grow(self.pos + len(data))
+        buf = self.buffer
+        pos = self.pos
+        for byte in data:
+            buf[pos] = byte
+            pos += 1
+        self.pos = pos
+
+    def _put_int(self, n):
+        if n < 0:
+            self._put(45)
+            n = -n
+        if n == 0:
+            self._put(48)
+            return
+        start = self.pos
+        while n:
+            self._put(48 + n % 10)
+            n //= 10
+        buf = self.buffer
+        i = start
+        j = self.pos - 1
+        while i < j:
+            buf[i], buf[j] = buf[j], buf[i]
+            i += 1
+            j -= 1
+
+    def _put_str(self, value, quoted):
+        if quoted:
+            self._put(34)
+        for char in value:
+            code = ord(char)
+            if quoted and (code == 34 or code == 92):
+                self._put(92)
+            elif quoted and code < 32:
+                # JSON forbids raw control characters inside strings
+                self._put(92)
+                escape = CONTROL_ESCAPES.get(code)
+                if escape:
+                    self._put(escape)
+                else:
+                    self._put_bytes(b"u00")
+                    self._put(HEX_DIGITS[code >> 4])
+                    self._put(HEX_DIGITS[code & 15])
+                continue
+            if code < 128:
+                self._put(code)
+            else:
+                self._put_bytes(char.encode())
+        if quoted:
+            self._put(34)
+
+    def _put_value(self, value, as_json):
+        if value is None:
+            self._put_bytes(b"null" if as_json else b"None")
+        elif value is True:
+            self._put_bytes(b"true" if as_json else b"True")
+        elif value is False:
+            self._put_bytes(b"false" if as_json else b"False")
+        elif isinstance(value, int):
+            self._put_int(value)
+        elif isinstance(value, float) and value == value and value - value == 0:
+            # Full precision like json.dumps; this is the one short string a cycle still allocates per float
+            self._put_str(str(value), False)
+        else:
+            self._put_str(value if isinstance(value, str) else str(value), as_json)
+
+    def encode_value(self, value):
+        self.pos = 0
+        self._put_value(value, False)
+        return self.pos
+
+    def _put_object(self, keys, values):
+        self._put(123)
+        first = True
+        for subtopic, key, overhead in keys:
+            if subtopic in values:
+                if not first:
+                    self._put(44)
+                first = False
+                self._put_bytes(key)
+                start = self.pos
+                self._put_value(values[subtopic], True)
+                self.legacy_packets += 1
+                self.legacy_bytes += overhead + self.pos - start
+        self._put(125)
+
+    def encode_topic(self, entry, values):
+        self.pos = 0
+        self.legacy_packets = 0
+        self.legacy_bytes = 0
+        self._put_object(entry[3], values)
+        return self.pos
+
+    def encode_device(self, data):
+        self.pos = 0
+        self.legacy_packets = 0
+        self.legacy_bytes = 0
+        self._put(123)
+        first = True
+        for topic, _, key, keys in self.topic_table:
+            values = data.get(topic)
+            if values is None:
+                continue
+            if not first:
+                self._put(44)
+            first = False
+            self._put_bytes(key)
+            self._put_object(keys, values)
+        self._put(125)
+        return self.pos
@@ -1,49 +1,311 @@
+import binascii
+import json
+import os
+import random
 import network
 import uasyncio
+import utime
 from machine import Pin
 
+from managers.metrics import registry
+
+STAT_GOT_IP = 3
+
 class WiFiManager:
     def __init__(self, config, log_manager):
         self.led = Pin("LED", Pin.OUT)
+        self.config = config
         self.ssid = config.WIFI_SSID
         self.wifi_password = config.WIFI_PASSWORD
         self.log_manager = log_manager
         self.wlan = network.WLAN(network.STA_IF)
         self.system_manager = None
+        self.radio_on_ms = 0
+        self.radio_since = None
+        self.timeout_ms = (config.WIFI_CONNECT_TIMEOUT or 10) * 1000
+        self.fast_reconnect = config.WIFI_FAST_RECONNECT is not False
+        self.fast_timeout_ms = config.WIFI_FAST_TIMEOUT_MS or 1500
+        self.fast_attempts = config.WIFI_FAST_ATTEMPTS or 2
+        self.fast_failures_in_row = 0
+        self.static_ip = tuple(config.WIFI_STATIC_IP) if config.WIFI_STATIC_IP else None
+        # The CYW43 port cannot report the BSSID it joined, so it can be pinned in config
+        self.pinned_bssid = (config.WIFI_BSSID or "").replace(":", "").lower()
+        self.pinned_channel = config.WIFI_CHANNEL or 0
+        self.lease_reuse_s = config.WIFI_LEASE_REUSE_S or 0
+        self.cache_file = config.WIFI_CACHE_FILE or "wifi.json"
+        self.cache = self._load_cache()
+        # Ticks of the last DHCP lease taken in this session; flash only has wall-clock time
+        self.lease_ms = None
+        self.static_applied = False
+        self.connecting = False
+        self.link_wanted = False
+        self.link_up = False
+        self.dropped = False
+        self.retry_delay_ms = 0
+        self.next_attempt_ms = utime.ticks_ms()
+        self.listeners = []
+        self.stats = {
+            "connects": 0,
+            "fast_connects": 0,
+            "fast_failures": 0,
+            "full_connects": 0,
+            "failures": 0,
+            "drops": 0,
+            "last_connect_ms": 0,
+            "last_path": "",
+            "backoff_ms": 0
+        }
+        self.connect_latency = registry.histogram("wifi_connect_ms", "WiFi association and DHCP duration")
+        self.connect_failures = registry.counter("wifi_connect_failures_total", "WiFi connection attempts that failed")
+        self.drop_counter = registry.counter("wifi_drops_total", "WiFi links lost while in use")
+        self.rssi_gauge = registry.gauge("wifi_rssi_dbm", "Signal strength of the current access point")
 
     def set_system_manager(self, system_manager):
         self.system_manager = system_manager
 
+    def add_listener(self, callback):
+        # callback(connected) runs when the link drops or comes back after a drop
+        self.listeners.append(callback)
+
+    def _notify(self, connected):
+        for callback in self.listeners:
+            try:
+                callback(connected)
+            except Exception as e:
+                self.log_manager.error("Error notifying WiFi listener: {}", e)
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file) as f:
+                return json.load(f)
+        except OSError:
+            return {}
+        except Exception as e:
+            self.log_manager.error("Error loading WiFi cache: {}", e)
+            return {}
+
+    def _save_cache(self, cache):
+        if cache == self.cache:
+            return
+        self.cache = cache
+        temp_file = self.cache_file + ".tmp"
+        try:
+            with open(temp_file, "w") as f:
+                json.dump(cache, f)
+            os.rename(temp_file, self.cache_file)
+        except Exception as e:
+            self.log_manager.error("Error saving WiFi cache: {}", e)
+
+    def _cached_lease(self):
+        # A lease is only reused while the router is still likely to hold it for us
+        ip = self.cache.get("ip")
+        if not ip or not self.lease_reuse_s:
+            return None
+        if self.lease_ms is not None:
+            age_s = utime.ticks_diff(utime.ticks_ms(), self.lease_ms) // 1000
+        else:
+            age_s = utime.time() - self.cache.get("lease_time", 0)
+        return tuple(ip) if 0 <= age_s < self.lease_reuse_s else None
+
     async def connect(self):
+        if self.connecting:
+            # The link job and a transmission window may both ask for the link
+            while self.connecting:
+                await uasyncio.sleep_ms(50)
+            if not self.wlan.isconnected():
+                raise RuntimeError('WiFi connection failed.')
+            return
+
+        self.connecting = True
+        self.link_wanted = True
         if self.system_manager:
             self.system_manager.start_processing("wifi_connect")
-        
-        self.wlan.active(True)
-        self.wlan.connect(self.ssid, self.wifi_password)
 
-        max_wait = 10
-        while max_wait > 0:
-            if self.wlan.status() < 0 or self.wlan.status() >= 3:
-                break
-            self.log_manager.log("Waiting for WiFi connection...")
-            self.led.toggle()
-            await uasyncio.sleep(1)
-            max_wait -= 1
+        start = utime.ticks_ms()
+        self._set_radio(True)
+        try:
+            path = "fast"
+            connected = False
+            # WIFI_STATIC_IP applies to both paths; only an AP or a lease to reuse makes a join faster
+            fast = self.fast_reconnect and (self._known_ap()[0] or self._cached_lease())
+            if fast:
+                connected = await self._join(True, self.fast_timeout_ms)
+                if not connected:
+                    self.stats["fast_failures"] += 1
+                    self.fast_failures_in_row += 1
+            # An AP that is just rebooting fails the fast path too; only a repeated
+            # failure suggests it moved to another BSSID or channel
+            if not connected and (not fast or self.fast_failures_in_row >= self.fast_attempts):
+                self.log_manager.log("Joining WiFi with a full scan")
+                path = "full"
+                self.fast_failures_in_row = 0
+                connected = await self._join(False, self.timeout_ms)
+        finally:
+            self.connecting = False
 
-        if self.wlan.status() != 3:
+        elapsed = utime.ticks_diff(utime.ticks_ms(), start)
+        self.connect_latency.observe(elapsed)
+        if not connected:
+            self.stats["failures"] += 1
+            self.connect_failures.inc()
             self.led.value(0)  # Turn off LED on connection failure
             if self.system_manager:
                 self.system_manager.add_error("wifi_connection")
                 self.system_manager.stop_processing("wifi_connect")
             raise RuntimeError('WiFi connection failed.')
+
+        self.fast_failures_in_row = 0
+        self.stats["connects"] += 1
+        self.stats[path + "_connects"] += 1
+        self.stats["last_connect_ms"] = elapsed
+        self.stats["last_path"] = path
+        self.retry_delay_ms = 0
+        self.stats["backoff_ms"] = 0
+        self.log_manager.log("WiFi connection successful ({} path, {} ms).", path, elapsed)
+        self.led.value(1)  # Turn on LED to indicate connection
+        status = self.wlan.ifconfig()
+        self.log_manager.log("Assigned IP: {}", status[0])
+        self._remember(path, status)
+        if self.system_manager:
+            self.system_manager.stop_processing("wifi_connect")
+            self.system_manager.clear_error("wifi_connection")
+        self._link_restored()
+
+    def _link_restored(self):
+        self.link_up = True
+        if self.dropped:
+            self.dropped = False
+            self._notify(True)
+
+    def _known_ap(self):
+        if self.pinned_bssid:
+            return self.pinned_bssid, self.pinned_channel
+        return self.cache.get("bssid"), self.cache.get("channel", 0)
+
+    async def _join(self, fast, timeout_ms):
+        wlan = self.wlan
+        wlan.disconnect()
+        # A fixed address skips DHCP; the cached lease is only trusted on the fast path
+        ip = self.static_ip or (self._cached_lease() if fast else None)
+        if ip:
+            wlan.ifconfig(ip)
+            self.static_applied = True
+        elif self.static_applied:
+            wlan.ifconfig("dhcp")
+            self.static_applied = False
+        bssid, channel = self._known_ap() if fast else (None, 0)
+        if bssid:
+            bssid = binascii.unhexlify(bssid)
+            try:
+                wlan.connect(self.ssid, self.wifi_password, bssid=bssid, channel=channel)
+            except TypeError:
+                # Older firmware only takes the BSSID
+                wlan.connect(self.ssid, self.wifi_password, bssid=bssid)
         else:
-            self.log_manager.log("WiFi connection successful.")
-            self.led.value(1)  # Turn on LED to indicate connection
-            status = self.wlan.ifconfig()
-            self.log_manager.log(f"Assigned IP: {status[0]}")
-            if self.system_manager:
-                self.system_manager.stop_processing("wifi_connect")
-                self.system_manager.clear_error("wifi_connection")
+            wlan.connect(self.ssid, self.wifi_password)
+
+        start = utime.ticks_ms()
+        next_log = 1000
+        while True:
+            status = wlan.status()
+            if status < 0 or status >= STAT_GOT_IP:
+                break
+            waited = utime.ticks_diff(utime.ticks_ms(), start)
+            if waited >= timeout_ms:
+                break
+            if waited >= next_log:
+                self.log_manager.log("Waiting for WiFi connection...")
+                self.led.toggle()
+                next_log += 1000
+            await uasyncio.sleep_ms(50)
+        return wlan.status() == STAT_GOT_IP
+
+    def _remember(self, path, ifconfig):
+        cache = dict(self.cache)
+        if path == "full" or not cache.get("bssid"):
+            bssid, channel = self._current_ap()
+            if bssid:
+                cache["bssid"] = bssid
+                cache["channel"] = channel
+        if not self.static_applied:
+            # Fresh DHCP lease
+            cache["ip"] = list(ifconfig)
+            cache["lease_time"] = utime.time()
+            self.lease_ms = utime.ticks_ms()
+        self._save_cache(cache)
+
+    def _current_ap(self):
+        # Only ports that report the joined BSSID fill the cache. wlan.scan() would
+        # block the event loop for over a second, so it is never used here.
+        try:
+            return binascii.hexlify(self.wlan.config("bssid")).decode(), self.wlan.config("channel")
+        except Exception:
+            return None, None
+
+    def register_jobs(self, scheduler):
+        scheduler.every("wifi", self.config.WIFI_CHECK_INTERVAL_MS or 1000, self.check_link)
+
+    def check_link(self):
+        # Notices a dropped link directly instead of through failing MQTT I/O
+        if not self.link_wanted or self.connecting:
+            return
+        if self.wlan.isconnected():
+            if not self.link_up:
+                # The radio rejoined by itself after a failed attempt
+                self.log_manager.log("WiFi link restored")
+                self._link_restored()
+            return
+        now = utime.ticks_ms()
+        if self.link_up:
+            self.link_up = False
+            self.dropped = True
+            self.stats["drops"] += 1
+            self.drop_counter.inc()
+            self.log_manager.log("WiFi link lost")
+            self.next_attempt_ms = now
+            self._notify(False)
+        if utime.ticks_diff(self.next_attempt_ms, now) > 0:
+            return
+        return self._reconnect()
+
+    async def _reconnect(self):
+        try:
+            await self.connect()
+        except Exception as e:
+            # Exponential backoff with jitter, so a fleet does not hammer a rebooting AP in lockstep
+            max_delay = self.config.WIFI_RECONNECT_MAX_MS or 60000
+            self.retry_delay_ms = min(max(self.retry_delay_ms * 2, 500), max_delay)
+            delay = self.retry_delay_ms + random.randint(0, self.retry_delay_ms // 4)
+            self.stats["backoff_ms"] = delay
+            self.next_attempt_ms = utime.ticks_add(utime.ticks_ms(), delay)
+            self.log_manager.warning("WiFi reconnect failed: {} (retry in {} ms)", e, delay)
+
+    def _set_radio(self, on):
+        now = utime.ticks_ms()
+        if on and self.radio_since is None:
+            self.radio_since = now
+        elif not on and self.radio_since is not None:
+            self.radio_on_ms += utime.ticks_diff(now, self.radio_since)
+            self.radio_since = None
+        self.wlan.active(on)
+
+    def power_down(self):
+        # Deliberate, so the link job does not treat it as a drop
+        self.link_wanted = False
+        self.link_up = False
+        self.wlan.disconnect()
+        self._set_radio(False)
+        self.led.value(0)
+
+    def set_power_save(self, enabled):
+        # The CYW43 then sleeps between DTIM beacons while staying associated
+        pm = getattr(network.WLAN, "PM_POWERSAVE", 0xa11142) if enabled else getattr(network.WLAN, "PM_PERFORMANCE", 0xa11140)
+        self.wlan.config(pm=pm)
+
+    def get_radio_on_ms(self):
+        if self.radio_since is None:
+            return self.radio_on_ms
+        return self.radio_on_ms + utime.ticks_diff(utime.ticks_ms(), self.radio_since)
 
     async def ensure_connection(self):
         if not self.wlan.isconnected():
@@ -53,4 +315,10 @@ class WiFiManager:
         return self.wlan.isconnected()
 
     def get_ip(self):
-        return self.wlan.ifconfig()[0] if self.wlan.isconnected() else None
\ No newline at end of file
+        return self.wlan.ifconfig()[0] if self.wlan.isconnected() else None
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["rssi"] = self.wlan.status("rssi") if self.wlan.isconnected() else 0
+        self.rssi_gauge.set(stats["rssi"])
+        return stats
@@ -1,30 +1,58 @@
-import sys
+import json
 import uasyncio
-import machine
-import gc
 import micropython
 import utime
 
 from managers.config_manager import ConfigManager
-from managers.wifi_manager import WiFiManager
-from managers.mqtt_manager import MQTTManager
-from managers.data_manager import DataManager
-from managers.system_manager import SystemManager
 from managers.log_manager import LogManager
-from managers.influx_data_manager import InfluxDataManager
+from managers.startup_manager import StartupManager
+from managers.module_loader import loader
+from managers.metrics import registry
 
 class PicoWPumPi:
     def __init__(self):
         micropython.alloc_emergency_exception_buf(100)
         
         self.log_mgr = LogManager()
+        self.startup_mgr = StartupManager(self.log_mgr)
         self.config_mgr = ConfigManager(self.log_mgr)
+        self.log_mgr.configure(self.config_mgr)
+        # The managers are imported once the config is known, so each import can be profiled on its own
+        loader.profiling = bool(self.config_mgr.IMPORT_PROFILE_LOG)
+        Scheduler = loader.load("managers.scheduler", "Scheduler")
+        SystemManager = loader.load("managers.system_manager", "SystemManager")
+        DataManager = loader.load("managers.data_manager", "DataManager")
+        WiFiManager = loader.load("managers.wifi_manager", "WiFiManager")
+        MQTTManager = loader.load("managers.mqtt_manager", "MQTTManager")
+        SpoolManager = loader.load("managers.spool_manager", "SpoolManager")
+        PumpManager = loader.load("managers.pump_manager", "PumpManager")
+        MoistureController = loader.load("managers.moisture_controller", "MoistureController")
+        PowerManager = loader.load("managers.power_manager", "PowerManager")
+
+        self.scheduler = Scheduler(self.log_mgr, self.config_mgr.SCHEDULER_MISS_MS or 50)
         self.system_mgr = SystemManager(self.config_mgr, self.log_mgr, None)
         self.data_mgr = DataManager(self.config_mgr, self.log_mgr, self.system_mgr)
         self.system_mgr.data_mgr = self.data_mgr
         self.wifi_mgr = WiFiManager(self.config_mgr, self.log_mgr)
         self.mqtt_mgr = MQTTManager(self.config_mgr, self.log_mgr)
-        self.influx_data_manager = InfluxDataManager(self.config_mgr, self.log_mgr)
+        self.spool_mgr = SpoolManager(self.config_mgr, self.log_mgr)
+        self.pump_mgr = PumpManager(self.config_mgr, self.log_mgr)
+        self.moisture_ctl = MoistureController(self.config_mgr, self.log_mgr, self.pump_mgr)
+        self.power_mgr = PowerManager(self.config_mgr, self.log_mgr, self.wifi_mgr, self.mqtt_mgr, self.pump_mgr)
+        self.log_sink = None
+        # Optional subsystems are only imported when enabled in config
+        self.influx_data_manager = None
+        if self.config_mgr.INFLUXDB_QUERY_ENABLED is not False:
+            InfluxDataManager = loader.load("managers.influx_data_manager", "InfluxDataManager")
+            self.influx_data_manager = InfluxDataManager(self.config_mgr, self.log_mgr)
+        self.influx_writer = None
+        if self.config_mgr.INFLUXDB_WRITE_ENABLED:
+            InfluxLineWriter = loader.load("managers.influx_writer", "InfluxLineWriter")
+            self.influx_writer = InfluxLineWriter(self.config_mgr, self.log_mgr)
+        self.metrics_server = None
+        if self.config_mgr.METRICS_HTTP_PORT:
+            MetricsServer = loader.load("managers.metrics_server", "MetricsServer")
+            self.metrics_server = MetricsServer(self.config_mgr, self.log_mgr)
 
         self._setup_managers()
         self._initialize_state()
@@ -32,84 +60,176 @@ class PicoWPumPi:
     def _setup_managers(self):
         self.wifi_mgr.set_system_manager(self.system_mgr)
         self.mqtt_mgr.set_system_manager(self.system_mgr)
+        self.mqtt_mgr.set_pump_manager(self.pump_mgr)
+        self.wifi_mgr.add_listener(self.mqtt_mgr.on_wifi_change)
+        self.pump_mgr.set_system_manager(self.system_mgr)
+        self.power_mgr.set_system_manager(self.system_mgr)
+        self.scheduler.set_loop_monitor(self.system_mgr.loop_monitor)
+        self.system_mgr.supervisor.set_scheduler(self.scheduler)
+        self.moisture_ctl.register(self.mqtt_mgr)
+        self._setup_log_sink()
+
+    def _setup_log_sink(self):
+        sink = self.config_mgr.LOG_SINK
+        if sink == "file":
+            FileLogSink = loader.load("managers.log_sinks", "FileLogSink")
+            self.log_sink = FileLogSink(self.config_mgr.LOG_FILE or "log.txt", self.config_mgr.LOG_FILE_MAX_BYTES or 16384)
+        elif sink == "mqtt":
+            MqttLogSink = loader.load("managers.log_sinks", "MqttLogSink")
+            self.log_sink = MqttLogSink(self.mqtt_mgr, self.config_mgr.LOG_SHIP_BUFFER_BYTES or 2048, self.config_mgr.LOG_SHIP_INTERVAL or 30)
+        if self.log_sink:
+            self.log_mgr.set_sink(self.log_sink)
 
     def _initialize_state(self):
         self.current_status = "running"
         self.last_mqtt_publish = 0
-        self.last_moisture_check = 0
-        self.external_watering_button_pressed = False
+        self.mqtt_task = None
 
     async def run(self):
         await self.startup()
-        await self.main_loop()
+        # Every periodic job runs from the scheduler, which sleeps until the next deadline
+        await self.system_mgr.loop_monitor.wrap("main", self.scheduler.run())
 
     async def startup(self):
         self.log_mgr.enable_buffering()
-        self.log_mgr.log(f"Starting {self.config_mgr.MQTT_CLIENT_NAME} startup sequence...")
+        self.log_mgr.log("Starting {} startup sequence...", self.config_mgr.MQTT_CLIENT_NAME)
 
-        await self._initialize_connections()
-        await self._setup_components()
+        # Local control and the watchdog come up before anything touches the network
         await self._start_tasks()
-
-        self.log_mgr.log("Startup sequence completed")
-
-    async def _initialize_connections(self):
+        self._register_network_stages()
+        self.startup_mgr.start()
+        if self.config_mgr.IMPORT_PROFILE_LOG:
+            loader.log_profile(self.log_mgr)
+
+        self.log_mgr.log("Local startup completed, network stages running in background")
+
+    def _register_network_stages(self):
+        startup = self.startup_mgr
+        startup.add_milestone("first_publish")
+        startup.add_stage("wifi", self._connect_wifi, timeout=30)
+        startup.add_stage("ntp", self._sync_time, depends_on=("wifi",))
+        startup.add_stage("mqtt", self._start_mqtt, depends_on=("wifi",), timeout=30)
+        if self.influx_data_manager:
+            startup.add_stage("influx", self._start_influx, depends_on=("wifi", "ntp"))
+        if self.metrics_server:
+            startup.add_stage("metrics", self.metrics_server.start, depends_on=("wifi",))
+        if self.power_mgr.enabled:
+            # Low-power mode takes over the radio once everything else is up
+            startup.add_stage("power", self._start_power, depends_on=tuple(stage[0] for stage in startup.stages))
+
+    async def _connect_wifi(self):
         self.log_mgr.log("Initializing connections...")
-        try:
-            await uasyncio.wait_for(self.wifi_mgr.connect(), 30)
-        except uasyncio.TimeoutError:
-            self.log_mgr.log("WiFi connection timed out")
+        await self.wifi_mgr.connect()
 
-        if self.system_mgr.sync_time():
+    async def _sync_time(self):
+        if await self.system_mgr.sync_time():
             self.log_mgr.log("Time synchronized successfully")
-        else:
-            self.log_mgr.log("Failed to synchronize time")
+            return True
+        self.log_mgr.log("Failed to synchronize time")
+        return False
+
+    async def _start_mqtt(self):
+        self.system_mgr.supervisor.watch("mqtt")
+        self.mqtt_task = uasyncio.create_task(self.system_mgr.loop_monitor.wrap("mqtt_link", self.mqtt_mgr.run()))
+        while not self.mqtt_mgr.is_connected:
+            await uasyncio.sleep_ms(100)
+        # Publish right away instead of waiting out the interval
+        self.scheduler.schedule(self.publish_job)
+
+    async def _start_influx(self):
+        # Cached values are already available; the refresh runs in its own task
+        uasyncio.create_task(self.system_mgr.loop_monitor.wrap("influx", self.influx_data_manager.run()))
+
+    async def _start_power(self):
+        self.power_mgr.start(self.scheduler, self.flush_samples)
+
+    async def flush_samples(self):
+        # Runs inside a transmission window: spooled samples first, then a fresh one
+        await self.spool_mgr.replay(self.mqtt_mgr.publish_replay)
+        await self.handle_mqtt_publishing()
+        await self.publish_metrics()
+        await self.system_mgr.supervisor.publish_previous(self.mqtt_mgr)
 
-    async def _setup_components(self):
-        pass
-    
     async def _start_tasks(self):
-        uasyncio.create_task(self.mqtt_mgr.run())
-        uasyncio.create_task(self.system_mgr.run())
+        scheduler = self.scheduler
+        self.system_mgr.register_jobs(scheduler)
+        self.system_mgr.gc_mgr.register_jobs(scheduler)
+        self.wifi_mgr.register_jobs(scheduler)
+        self.pump_mgr.register_jobs(scheduler)
+        self.moisture_ctl.register_jobs(scheduler)
+        if self.influx_writer:
+            self.influx_writer.register_jobs(scheduler)
+        self.publish_job = scheduler.every("publish", self.config_mgr.MQTT_UPDATE_INTERVAL * 1000, self.publish, delay_ms=0)
+        self.config_mgr.subscribe("MQTT_UPDATE_INTERVAL", self._on_update_interval_changed)
+        if self.config_mgr.METRICS_PUBLISH_INTERVAL:
+            scheduler.every("metrics", self.config_mgr.METRICS_PUBLISH_INTERVAL * 1000, self.publish_metrics)
+        if hasattr(self.log_sink, "run"):
+            uasyncio.create_task(self.log_sink.run())
+
+    def _on_update_interval_changed(self, key, value):
+        self.scheduler.set_period(self.publish_job, value * 1000)
+
+    async def publish(self):
+        await self.handle_mqtt_publishing()
+        if self.system_mgr.supervisor.previous and not self.power_mgr.batching():
+            await self.system_mgr.supervisor.publish_previous(self.mqtt_mgr)
+        # Nothing else is due for a while after a publish, a good moment for a collection
+        self.system_mgr.gc_mgr.idle()
+
+    async def publish_metrics(self):
+        # One snapshot of every counter and histogram instead of per-sample topics
+        if self.mqtt_mgr.is_connected and not self.power_mgr.batching():
+            await self.mqtt_mgr.publish_metrics(json.dumps(registry.snapshot()))
 
-        try:
-            water_tank_level, last_watered = await uasyncio.wait_for(self.influx_data_manager.query_task(), 10)
-            self.log_mgr.log(f"InfluxDb query Successful")
-        except uasyncio.TimeoutError:
-            self.log_mgr.log("InfluxDB query timed out")
+    async def handle_mqtt_publishing(self):
+        current_time = utime.time()
 
-    async def main_loop(self):
-        while True:
+        # The publish job sets the interval; reconnecting is left to MQTTManager.run
+        prepared_mqtt_data = self.data_mgr.prepare_mqtt_data_for_publishing(
+            self.system_mgr.get_system_data(),
+            self.system_mgr.get_current_config_data(),
+            self.collect_extra_data()
+        )
+        if self.influx_writer:
+            self.influx_writer.add_snapshot(prepared_mqtt_data, prepared_mqtt_data["system"]["timestamp"])
+
+        if self.power_mgr.batching():
+            self.spool_mgr.enqueue(prepared_mqtt_data)
+            self.last_mqtt_publish = current_time
+        elif self.mqtt_mgr.is_connected:
             try:
-                gc.collect()
-                self.system_mgr.update_system_data()
-                await self.handle_mqtt_publishing()
-                await uasyncio.sleep(1)
-
+                publish_result = await self.mqtt_mgr.publish_data(prepared_mqtt_data)
+                if publish_result:
+                    self.last_mqtt_publish = current_time
+                    self.startup_mgr.mark("first_publish")
+                    if self.spool_mgr.pending() and not self.spool_mgr.replaying:
+                        uasyncio.create_task(self.spool_mgr.replay(self.mqtt_mgr.publish_replay))
+                else:
+                    self.spool_sample(prepared_mqtt_data, current_time)
             except Exception as e:
-                self.log_mgr.log(f"Error in main loop: {e}")
-                self.system_mgr.print_system_data()
-                await uasyncio.sleep(5)
-
-
-    async def handle_mqtt_publishing(self):
-        current_time = utime.time()
-        
-        if current_time - self.last_mqtt_publish >= self.config_mgr.MQTT_UPDATE_INTERVAL:
-            if not self.mqtt_mgr.is_connected:
-                self.log_mgr.log("MQTT not connected, attempting to connect...")
-                await self.mqtt_mgr.connect()
-            
-            if self.mqtt_mgr.is_connected:
-                try:
-                    prepared_mqtt_data = self.data_mgr.prepare_mqtt_data_for_publishing(
-                        self.system_mgr.get_system_data(),
-                        self.system_mgr.get_current_config_data()
-                    )
-                    publish_result = await self.mqtt_mgr.publish_data(prepared_mqtt_data)
-                    if publish_result:
-                        self.last_mqtt_publish = current_time
-                except Exception as e:
-                    self.log_mgr.log(f"MQTT publishing error: {e}")
-            else:
-                self.log_mgr.log("MQTT connection failed, skipping publish")
\ No newline at end of file
+                self.log_mgr.error("MQTT publishing error: {}", e)
+                self.spool_sample(prepared_mqtt_data, current_time)
+        else:
+            self.spool_sample(prepared_mqtt_data, current_time)
+
+    def collect_extra_data(self):
+        extra_data = {
+            "spool": self.spool_mgr.get_stats(),
+            "commands": self.mqtt_mgr.get_dispatch_stats(),
+            "startup": self.startup_mgr.get_stats(),
+            "pump": self.pump_mgr.get_stats(),
+            "moisture": self.moisture_ctl.get_stats(),
+            "gc": self.system_mgr.gc_mgr.get_stats(),
+            "scheduler": self.scheduler.get_stats(),
+            "power": self.power_mgr.get_stats(),
+            "supervisor": self.system_mgr.supervisor.get_stats(),
+            "wifi": self.wifi_mgr.get_stats()
+        }
+        if self.influx_data_manager:
+            extra_data["water"] = self.influx_data_manager.get_cache_data()
+        return extra_data
+
+    def spool_sample(self, prepared_mqtt_data, current_time):
+        self.spool_mgr.enqueue(prepared_mqtt_data)
+        self.last_mqtt_publish = current_time
+        self.log_mgr.warning("Sample not delivered over MQTT, spooled ({} pending)", self.spool_mgr.pending())
\ No newline at end of file
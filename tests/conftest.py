@@ -0,0 +1,54 @@
+# Firmware modules are tested on CPython through the host stand-ins for the
+# MicroPython modules (host/runtime), the same ones the simulator uses.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "host"))
+
+import sim  # noqa: E402
+
+sim.install(trace_allocations=False)
+
+
+class Config:
+    # Like ConfigManager: keys that are not set read as None
+    def __init__(self, **values):
+        self.__dict__.update(values)
+
+    def __getattr__(self, name):
+        return None
+
+    def subscribe(self, key, callback):
+        pass
+
+
+class Log:
+    def __init__(self):
+        self.lines = []
+
+    def _record(self, message, *args):
+        self.lines.append(message.format(*args) if args else message)
+
+    debug = log = info = warning = error = _record
+
+
+@pytest.fixture(autouse=True)
+def board():
+    from sim.app import reset_board
+
+    from managers.metrics import registry
+
+    registry.clear()
+    return reset_board()
+
+
+@pytest.fixture
+def log():
+    return Log()
+
+
+@pytest.fixture
+def make_config():
+    return Config
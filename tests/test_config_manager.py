@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import pytest
+
+from managers.config_manager import ConfigManager
+
+CONFIG = {
+    "MQTT_QOS": 0,
+    "GC_HIGH_WATER": 0.8,
+    "LOW_POWER_ENABLED": False,
+    "MQTT_TOPICS": {"system": ["status"]},
+    "SOLENOID_VALVE_PINS": [18, 19],
+    "MQTT_CLIENT_NAME": "pump",
+    "OPTIONAL": None,
+    "CONFIG_SAVE_DELAY_MS": 50
+}
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(CONFIG))
+    return path
+
+
+def load(path):
+    return json.loads(path.read_text())
+
+
+@pytest.mark.parametrize("key, payload, expected", [
+    ("MQTT_QOS", " 1 ", 1),
+    ("GC_HIGH_WATER", "0.9", 0.9),
+    ("GC_HIGH_WATER", 1, 1.0),
+    ("LOW_POWER_ENABLED", "TRUE", True),
+    ("MQTT_TOPICS", '{"adc": ["moisture"]}', {"adc": ["moisture"]}),
+    ("SOLENOID_VALVE_PINS", "[1, 2, 3]", [1, 2, 3]),
+    ("MQTT_CLIENT_NAME", "42", "42"),
+    ("OPTIONAL", "false", False),
+    ("OPTIONAL", "2.5", 2.5),
+    ("OPTIONAL", "text", "text")
+])
+def test_payloads_take_the_stored_type(config_file, log, key, payload, expected):
+    config = ConfigManager(log, str(config_file))
+
+    async def main():
+        assert config.update_config(key, payload)
+        config.flush()
+
+    asyncio.run(main())
+    assert getattr(config, key) == expected
+    assert type(getattr(config, key)) is type(expected)
+    assert load(config_file)[key] == expected
+
+
+@pytest.mark.parametrize("key, payload", [
+    ("MQTT_QOS", "one"),
+    ("LOW_POWER_ENABLED", "yes"),
+    ("SOLENOID_VALVE_PINS", '{"a": 1}'),
+    ("MQTT_TOPICS", "not json"),
+    ("UNKNOWN_KEY", "1")
+])
+def test_invalid_updates_are_rejected(config_file, log, key, payload):
+    config = ConfigManager(log, str(config_file))
+
+    async def main():
+        return config.update_config(key, payload)
+
+    assert not asyncio.run(main())
+    assert config.writes == 0
+    assert load(config_file) == CONFIG
+
+
+def test_bursts_are_saved_once_after_the_delay(config_file, log):
+    config = ConfigManager(log, str(config_file))
+
+    async def main():
+        for qos in (1, 0, 1, 2):
+            assert config.update_config("MQTT_QOS", qos)
+            await asyncio.sleep(0.02)
+        # Each update pushes the save back by the delay
+        assert config.writes == 0
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert config.writes == 1
+    assert load(config_file)["MQTT_QOS"] == 2
+
+
+def test_unchanged_values_are_not_saved(config_file, log):
+    config = ConfigManager(log, str(config_file))
+
+    async def main():
+        assert config.update_config("MQTT_QOS", "0")
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert config.writes == 0
+
+
+def test_subscribers_hear_about_changes(config_file, log):
+    config = ConfigManager(log, str(config_file))
+    seen = []
+    config.subscribe("MQTT_QOS", lambda key, value: seen.append((key, value)))
+    config.subscribe("MQTT_QOS", lambda key, value: 1 / 0)
+
+    async def main():
+        config.update_config("MQTT_QOS", "1")
+        config.update_config("GC_HIGH_WATER", "0.5")
+        config.flush()
+
+    asyncio.run(main())
+    assert seen == [("MQTT_QOS", 1)]
+    assert any("Error notifying config subscriber for MQTT_QOS" in line for line in log.lines)
+
+
+def test_missing_keys_read_as_none_and_reload_drops_removed_keys(config_file, log):
+    config = ConfigManager(log, str(config_file))
+    assert config.NOT_CONFIGURED is None
+    assert config.MQTT_CLIENT_NAME == "pump"
+
+    reduced = dict(CONFIG)
+    del reduced["MQTT_CLIENT_NAME"]
+    config_file.write_text(json.dumps(reduced))
+    config.load_from_file()
+    assert config.MQTT_CLIENT_NAME is None
+    assert config.save_delay_ms == 50
+
+
+def test_save_is_atomic(config_file, log, tmp_path):
+    config = ConfigManager(log, str(config_file))
+    config.save_to_file()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["config.json"]
@@ -0,0 +1,112 @@
+import asyncio
+
+from managers.flux_csv_parser import FluxCSVParser
+
+RESPONSE = (
+    b"#datatype,string,long,dateTime:RFC3339,double,string\r\n"
+    b"#group,false,false,false,false,true\r\n"
+    b"#default,_result,,,,\r\n"
+    b",result,table,_time,_value,_field\r\n"
+    b",,0,2024-01-01T00:00:00Z,1.5,moisture\r\n"
+    b",,0,2024-01-01T00:01:00Z,2.5,moisture\r\n"
+    b"\r\n"
+    b",result,table,_time,_value,_field\r\n"
+    b",,1,2024-01-01T00:00:00Z,\"a, \"\"quoted\"\" note\",note\r\n"
+)
+
+
+class MicroPythonBytearray(bytearray):
+    # MicroPython's bytearray has no find(); the parser must not rely on it
+    def find(self, *args):
+        raise AttributeError("'bytearray' object has no attribute 'find'")
+
+
+class Response:
+    def __init__(self, body, chunk_cap=None):
+        self.body = body
+        self.pos = 0
+        self.chunk_cap = chunk_cap
+
+    async def readinto(self, buf):
+        n = min(len(buf), len(self.body) - self.pos)
+        if self.chunk_cap:
+            n = min(n, self.chunk_cap)
+        buf[:n] = self.body[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+
+def parse(body, chunk_size=256, chunk_cap=None, max_line=512):
+    parser = FluxCSVParser(chunk_size, max_line)
+    parser.chunk = MicroPythonBytearray(chunk_size)
+    rows = []
+    asyncio.run(parser.parse(Response(body, chunk_cap), rows.append))
+    return parser, rows
+
+
+def test_rows_follow_their_table_header():
+    parser, rows = parse(RESPONSE)
+    assert parser.rows == 3
+    assert [row["_value"] for row in rows] == [1.5, 2.5, 'a, "quoted" note']
+    assert rows[2]["_field"] == "note"
+
+
+def test_annotations_fill_and_type_cells():
+    parser, rows = parse(RESPONSE)
+    # #datatype applies to the first table only; the blank line ends it
+    assert rows[0]["table"] == 0
+    assert rows[0]["result"] == "_result"
+    assert rows[2]["table"] == "1"
+    assert rows[2]["result"] == ""
+
+
+def test_lines_split_across_chunks():
+    _, whole = parse(RESPONSE)
+    for cap in (1, 7, 13):
+        _, rows = parse(RESPONSE, chunk_size=16, chunk_cap=cap)
+        assert rows == whole
+
+
+def test_last_line_without_newline():
+    _, rows = parse(b",result,table,_value\r\n,,0,1\r\n,,0,2")
+    assert [row["_value"] for row in rows] == ["1", "2"]
+
+
+def test_overlong_lines_are_skipped():
+    body = b",result,table,_value\n,,0," + b"9" * 100 + b"\n,,0,3\n"
+    parser, rows = parse(body, chunk_size=16, max_line=40)
+    assert parser.skipped_lines == 1
+    assert [row["_value"] for row in rows] == ["3"]
+
+
+def test_last_rows_keeps_one_row_per_table():
+    parser = FluxCSVParser()
+    last = asyncio.run(parser.last_rows(Response(RESPONSE, 10)))
+    assert last[("_result", 0)]["_value"] == 2.5
+    assert last[("", "1")]["_field"] == "note"
+
+
+def test_named_results_sharing_a_table_number():
+    # Two yields: InfluxDB numbers tables per result and names them in #default
+    body = (
+        b"#datatype,string,long,dateTime:RFC3339,double\r\n"
+        b"#group,false,false,false,false\r\n"
+        b"#default,water_tank_level,,,\r\n"
+        b",result,table,_time,_value\r\n"
+        b",,0,2024-01-01T00:00:00Z,73.5\r\n"
+        b"\r\n"
+        b"#datatype,string,long,dateTime:RFC3339,string\r\n"
+        b"#group,false,false,false,false\r\n"
+        b"#default,last_watered,,,\r\n"
+        b",result,table,_time,_value\r\n"
+        b",,0,2024-01-01T00:00:00Z,Never\r\n"
+        b"\r\n"
+    )
+    parser = FluxCSVParser(16)
+    last = asyncio.run(parser.last_rows(Response(body)))
+    assert last == {
+        ("water_tank_level", 0): {"": "", "result": "water_tank_level", "table": 0,
+                                  "_time": "2024-01-01T00:00:00Z", "_value": 73.5},
+        ("last_watered", 0): {"": "", "result": "last_watered", "table": 0,
+                              "_time": "2024-01-01T00:00:00Z", "_value": "Never"}
+    }
@@ -0,0 +1,114 @@
+import pytest
+
+from managers import log_manager
+from managers.log_manager import DEBUG, LogManager
+from managers.log_sinks import FileLogSink, MqttLogSink
+from managers.metrics import registry
+
+
+class Unformattable:
+    def __format__(self, spec):
+        raise AssertionError("formatted below the log level")
+
+
+@pytest.fixture
+def logger(make_config):
+    logger = LogManager(256)
+    logger.configure(make_config(LOG_LEVEL="INFO", LOG_RATE_LIMIT_MS=10000))
+    return logger
+
+
+def messages(logger):
+    return [line.split(" | ", 2)[1:] for line in logger.get_logs()]
+
+
+def test_levels_and_lazy_formatting(logger):
+    logger.debug("value {}", Unformattable())
+    logger.log("started {}", 1)
+    logger.warning("low {}", 2)
+    logger.error("failed {}", 3)
+    assert messages(logger) == [["INFO", "started 1"], ["WARNING", "low 2"], ["ERROR", "failed 3"]]
+
+    logger.level = DEBUG
+    logger.debug("value {}", 4)
+    assert messages(logger)[-1] == ["DEBUG", "value 4"]
+
+
+def test_ring_keeps_the_newest_whole_lines(logger):
+    for i in range(40):
+        logger.log("line {:03d}", i)
+    lines = messages(logger)
+    assert lines[-1] == ["INFO", "line 039"]
+    assert len(lines) < 40
+    # Every line that survived the wrap is complete and in order
+    numbers = [int(text.split()[1]) for _, text in lines]
+    assert numbers == list(range(numbers[0], 40))
+    assert sum(len(line) + 1 for line in logger.get_logs()) < 256
+
+
+def test_repeating_problems_are_rate_limited(logger, monkeypatch):
+    now = [0]
+    monkeypatch.setattr(log_manager.utime, "ticks_ms", lambda: now[0])
+    for i in range(5):
+        logger.warning("Subtopic {} not found", i)
+    now[0] = 10000
+    logger.warning("Subtopic {} not found", 5)
+    assert messages(logger) == [["WARNING", "Subtopic 0 not found"],
+                                ["WARNING", "Subtopic 5 not found (suppressed 4 similar)"]]
+
+
+def test_informational_lines_are_not_rate_limited(logger):
+    for stage in ("wifi", "ntp", "mqtt"):
+        logger.log("Startup stage {}: ok", stage)
+    assert [text for _, text in messages(logger)] == [
+        "Startup stage wifi: ok", "Startup stage ntp: ok", "Startup stage mqtt: ok"]
+
+
+def test_level_follows_config_updates():
+    subscriptions = {}
+
+    class Config:
+        LOG_LEVEL = "INFO"
+        LOG_RATE_LIMIT_MS = None
+        LOG_BUFFER_BYTES = 512
+
+        def subscribe(self, key, callback):
+            subscriptions[key] = callback
+
+    logger = LogManager(256)
+    logger.configure(Config())
+    assert len(logger.buffer) == 512
+    subscriptions["LOG_LEVEL"]("LOG_LEVEL", "ERROR")
+    logger.warning("hidden {}", 1)
+    assert logger.get_logs() == []
+
+
+def test_failing_sink_is_counted(logger):
+    class BrokenSink:
+        def write(self, line):
+            raise OSError("flash full")
+
+    logger.set_sink(BrokenSink())
+    logger.log("still buffered")
+    assert logger.sink_errors == 1
+    assert registry.counter("log_sink_errors_total").value == 1
+    assert messages(logger) == [["INFO", "still buffered"]]
+
+
+def test_file_sink_rotates(tmp_path):
+    path = tmp_path / "log.txt"
+    sink = FileLogSink(str(path), max_bytes=50)
+    for i in range(6):
+        sink.write(f"line {i:02d} ......")
+    assert (tmp_path / "log.txt.1").exists()
+    assert path.stat().st_size <= 50
+    assert path.read_text().splitlines()[-1] == "line 05 ......"
+
+
+def test_mqtt_sink_drops_lines_when_full():
+    sink = MqttLogSink(None, capacity=16)
+    sink.write("12345")
+    sink.write("67890")
+    sink.write("abcdef")
+    assert bytes(sink.batch[:sink.batch_len]) == b"12345\n67890\n"
+    assert sink.dropped == 1
@@ -0,0 +1,47 @@
+import gc
+import sys
+
+import pytest
+
+from managers.module_loader import ModuleLoader
+
+
+@pytest.fixture
+def probe_modules(tmp_path, monkeypatch):
+    (tmp_path / "probe_helper.py").write_text("TABLE = list(range(100))\n")
+    (tmp_path / "probe_module.py").write_text("import probe_helper\nVALUE = 42\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield
+    for name in ("probe_module", "probe_helper"):
+        sys.modules.pop(name, None)
+
+
+@pytest.fixture
+def collections(monkeypatch):
+    calls = []
+    collect = gc.collect
+    monkeypatch.setattr(gc, "collect", lambda: calls.append(1) or collect())
+    return calls
+
+
+def test_loads_are_not_profiled_by_default(probe_modules, collections):
+    loader = ModuleLoader()
+    assert loader.load("probe_module", "VALUE") == 42
+    assert loader.unload("probe_module") == 0
+    assert "probe_module" not in sys.modules
+    assert collections == []
+    assert loader.profile == {}
+
+
+def test_profiled_loads_include_nested_imports(probe_modules, collections, log):
+    loader = ModuleLoader()
+    loader.profiling = True
+    module = loader.load("probe_module")
+    assert module.VALUE == 42
+    # Already imported modules are returned without being profiled again
+    loader.load("probe_helper")
+    assert list(loader.profile) == ["probe_module"]
+    assert len(collections) == 2
+
+    loader.log_profile(log)
+    assert log.lines[0].startswith("Import probe_module: ")
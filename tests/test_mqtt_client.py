@@ -0,0 +1,120 @@
+import asyncio
+
+from managers.mqtt_client import MQTTAsyncClient
+from sim.servers import MQTTBroker
+
+
+async def connected_client(broker, **kwargs):
+    await broker.start()
+    client = MQTTAsyncClient("test", "127.0.0.1", broker.port, **kwargs)
+    await client.connect()
+    return client
+
+
+def test_busy_qos0_sender_keeps_the_link():
+    # Nothing comes back for QoS 0 publishes, so only pings show the broker is alive
+    async def main():
+        broker = MQTTBroker()
+        client = await connected_client(broker, keepalive=1)
+        lost = []
+        client.on_disconnect = lambda: lost.append(True)
+        for _ in range(50):
+            await client.publish(b"test/value", b"1")
+            await asyncio.sleep(0.05)
+        await client.disconnect()
+        return client, broker, lost
+
+    client, broker, lost = asyncio.run(main())
+    assert lost == [True]
+    assert broker.stats["connects"] == 1
+    assert broker.stats["publishes"] == 50
+    assert client.stats["pings"] >= 2
+
+
+def test_silent_broker_drops_the_link():
+    async def main():
+        broker = MQTTBroker()
+        client = await connected_client(broker, keepalive=1)
+        broker.stall_ms = 5000
+        lost = asyncio.Event()
+        client.on_disconnect = lost.set
+        started = asyncio.get_running_loop().time()
+        await asyncio.wait_for(lost.wait(), 3)
+        return client, asyncio.get_running_loop().time() - started
+
+    client, elapsed = asyncio.run(main())
+    assert not client.is_connected
+    assert client.stats["pings"] >= 1
+    assert 1.4 <= elapsed <= 2.6
+
+
+def test_qos1_window_is_bounded_and_acked():
+    async def main():
+        broker = MQTTBroker()
+        client = await connected_client(broker, max_inflight=2)
+        peak = []
+
+        async def send(i):
+            await client.publish(b"test/qos", b"%d" % i, qos=1)
+            peak.append(client.inflight_count())
+
+        await asyncio.gather(*(send(i) for i in range(6)))
+        for _ in range(20):
+            if not client.inflight_count():
+                break
+            await asyncio.sleep(0.01)
+        await client.disconnect()
+        return client, broker, peak
+
+    client, broker, peak = asyncio.run(main())
+    assert max(peak) <= 2
+    assert client.inflight_count() == 0
+    assert broker.stats["pubacks_sent"] == 6
+
+
+def test_unacked_qos1_is_resent_after_reconnect():
+    async def main():
+        broker = MQTTBroker()
+        client = await connected_client(broker, clean_session=False)
+        broker.stall_ms = 200
+        await client.publish(b"test/qos", b"kept", qos=1)
+        broker.drop_connections()
+        await asyncio.sleep(0.05)
+        pending = client.inflight_count()
+        broker.stall_ms = 0
+        await client.connect()
+        for _ in range(50):
+            if not client.inflight_count():
+                break
+            await asyncio.sleep(0.01)
+        await client.disconnect()
+        return client, pending
+
+    client, pending = asyncio.run(main())
+    assert pending == 1
+    assert client.stats["retransmits"] == 1
+    assert client.inflight_count() == 0
+
+
+def test_callback_errors_are_counted(log):
+    async def main():
+        broker = MQTTBroker()
+        client = await connected_client(broker, log_mgr=log)
+        received = []
+
+        def callback(topic, msg):
+            received.append((topic, msg))
+            raise ValueError("bad payload")
+
+        client.set_callback(callback)
+        await client.subscribe("test/in")
+        await asyncio.sleep(0.05)
+        await broker.publish("test/in", "x")
+        await asyncio.sleep(0.05)
+        await client.disconnect()
+        return client, received
+
+    client, received = asyncio.run(main())
+    assert received == [(b"test/in", b"x")]
+    assert client.stats["callback_errors"] == 1
+    assert "MQTT callback error: bad payload" in log.lines
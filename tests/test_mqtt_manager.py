@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from managers.mqtt_manager import MQTTManager
+from sim.servers import MQTTBroker
+
+TOPICS = {"system": ["status", "uptime"], "adc": ["moisture"]}
+DATA = {"system": {"status": "ok", "uptime": 12}, "adc": {"moisture": 41.5}}
+
+
+@pytest.fixture
+def mqtt_config(make_config):
+    def build(port, **values):
+        return make_config(MQTT_CLIENT_NAME="pump", MQTT_BROKER_ADDRESS="127.0.0.1",
+                           MQTT_BROKER_PORT=port, MQTT_TOPICS=TOPICS, **values)
+    return build
+
+
+def publish(mqtt_config, log, **values):
+    async def main():
+        broker = MQTTBroker()
+        await broker.start()
+        mqtt = MQTTManager(mqtt_config(broker.port, **values), log)
+        await mqtt.connect()
+        ok = await mqtt.publish_data(DATA)
+        await asyncio.sleep(0.05)
+        await mqtt.client.disconnect()
+        return ok, broker
+
+    return asyncio.run(main())
+
+
+def test_config_without_mode_keeps_subtopic_layout(mqtt_config, log):
+    ok, broker = publish(mqtt_config, log)
+    assert ok
+    assert sorted(broker.topic_counts) == ["pump/adc/moisture", "pump/system/status", "pump/system/uptime"]
+
+
+@pytest.mark.parametrize("mode, topics", [
+    ("topic", ["pump/adc", "pump/system"]),
+    ("device", ["pump/state"])
+])
+def test_batched_modes(mqtt_config, log, mode, topics):
+    ok, broker = publish(mqtt_config, log, MQTT_PUBLISH_MODE=mode)
+    assert ok
+    assert sorted(broker.topic_counts) == topics
+
+
+def test_batched_publish_counts_savings(mqtt_config, log):
+    from managers.metrics import registry
+
+    ok, broker = publish(mqtt_config, log, MQTT_PUBLISH_MODE="topic")
+    assert ok
+    assert registry.counter("mqtt_packets_saved_total").value == 1
+    # subtopic payloads: "ok", "12", "41.5"; the JSON string adds its two quotes
+    legacy = sum(4 + len(topic) for topic in ("pump/system/status", "pump/system/uptime", "pump/adc/moisture")) + 10
+    sent = broker.stats["bytes"]
+    assert registry.counter("mqtt_bytes_saved_total").value == legacy - sent
+
+
+@pytest.mark.parametrize("mode", ["subtopic", "topic", "device"])
+def test_failed_publish_is_reported(mqtt_config, log, mode):
+    from managers.metrics import registry
+
+    async def main():
+        broker = MQTTBroker()
+        await broker.start()
+        mqtt = MQTTManager(mqtt_config(broker.port, MQTT_PUBLISH_MODE=mode), log)
+        await mqtt.connect()
+        publish = mqtt.client.publish
+        calls = []
+
+        async def drop_after_first(topic, msg, retain=False, qos=0):
+            calls.append(topic)
+            if len(calls) > 1:
+                # Like a QoS 1 window aborted by a lost link
+                mqtt.client.is_connected = False
+                raise OSError("MQTT not connected")
+            return await publish(topic, msg, retain, qos)
+
+        mqtt.client.publish = drop_after_first
+        if mode == "device":
+            calls.append(None)
+        ok = await mqtt.publish_data(DATA)
+        return ok, calls
+
+    ok, calls = asyncio.run(main())
+    assert not ok
+    # The cycle stops at the first failure once the link is gone
+    assert len(calls) == 2
+    assert registry.counter("mqtt_publish_failures_total").value == 1
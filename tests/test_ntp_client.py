@@ -0,0 +1,55 @@
+import asyncio
+import socket
+import time
+
+import pytest
+
+from managers import ntp_client
+from sim.servers import NTPServer
+
+
+def test_ip_addresses_skip_the_lookup(monkeypatch):
+    def lookup(*args):
+        raise AssertionError("blocking DNS lookup")
+
+    monkeypatch.setattr(socket, "getaddrinfo", lookup)
+    assert ntp_client.resolve("192.168.1.1") == ("192.168.1.1", 123)
+    assert ntp_client.resolve("10.0.0.2", 1123) == ("10.0.0.2", 1123)
+
+
+def test_hostnames_are_resolved(monkeypatch):
+    lookups = []
+
+    def lookup(host, port):
+        lookups.append(host)
+        return [(socket.AF_INET, socket.SOCK_DGRAM, 0, "", ("127.0.0.1", port))]
+
+    monkeypatch.setattr(socket, "getaddrinfo", lookup)
+    assert ntp_client.resolve("pool.ntp.org") == ("127.0.0.1", 123)
+    assert lookups == ["pool.ntp.org"]
+
+
+def test_query_time():
+    async def main():
+        server = NTPServer()
+        await server.start()
+        try:
+            return await ntp_client.query_time(ntp_client.resolve("127.0.0.1", server.port))
+        finally:
+            server.transport.close()
+
+    assert asyncio.run(main()) == pytest.approx(time.time(), abs=2)
+
+
+def test_silent_server_times_out():
+    async def main():
+        server = NTPServer()
+        await server.start()
+        server.enabled = False
+        try:
+            await ntp_client.query_time(("127.0.0.1", server.port), timeout_ms=100)
+        finally:
+            server.transport.close()
+
+    with pytest.raises(OSError, match="timed out"):
+        asyncio.run(main())
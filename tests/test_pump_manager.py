@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from managers.pump_manager import COOLDOWN, IDLE, PumpManager
+from managers.scheduler import Scheduler
+
+
+@pytest.fixture
+def pump_config(make_config, tmp_path):
+    def build(**values):
+        defaults = {
+            "WATER_PUMP_PIN": 22,
+            "SOLENOID_VALVE_PINS": [18, 19, 20],
+            "PUMP_FLOW_RATE_ML_S": 500,
+            "PUMP_MERGE_WINDOW": 0,
+            "PUMP_VALVE_SETTLE_MS": 1,
+            "PUMP_TICK_MS": 10,
+            "PUMP_STATE_FILE": str(tmp_path / "pump_state.json"),
+            "WATER_TANK_CAPACITY_ML": 10000,
+            "WATER_TANK_MIN_ML": 100
+        }
+        defaults.update(values)
+        return make_config(**defaults)
+    return build
+
+
+def run_pump(pump, log, jobs, timeout=3):
+    # Runs the pump's tick job until the jobs are done and the valves are closed again
+    async def main():
+        scheduler = Scheduler(log)
+        pump.register_jobs(scheduler)
+        task = asyncio.create_task(scheduler.run())
+        jobs()
+        for _ in range(int(timeout / 0.01)):
+            await asyncio.sleep(0.01)
+            if pump.state == IDLE and not any(pump.remaining_ms):
+                break
+        task.cancel()
+
+    asyncio.run(main())
+
+
+def test_merged_volume_jobs_deliver_full_volume(pump_config, log):
+    pump = PumpManager(pump_config(), log)
+    run_pump(pump, log, lambda: [pump.add_job(valve, volume_ml=150) for valve in (1, 2, 3)])
+
+    assert pump.stats["pump_starts"] == 1
+    for dispensed in pump.valve_ml:
+        assert dispensed == pytest.approx(150, abs=10)
+    assert 10000 - pump.tank_ml == pytest.approx(450, abs=20)
+    assert not pump.pump_on
+    assert not any(pump.valve_open)
+
+
+def test_merged_duration_jobs_get_their_full_flow_time(pump_config, log):
+    pump = PumpManager(pump_config(), log)
+    run_pump(pump, log, lambda: [pump.add_job(1, 0.2), pump.add_job(2, 0.4)])
+
+    assert pump.valve_ml[0] == pytest.approx(100, abs=10)
+    assert pump.valve_ml[1] == pytest.approx(200, abs=10)
+    assert pump.valve_ml[2] == 0
+
+
+def test_second_job_for_a_valve_keeps_the_longer_one(pump_config, log):
+    pump = PumpManager(pump_config(PUMP_MERGE_WINDOW=10), log)
+    pump.add_job(1, 2)
+    pump.add_job(1, 1)
+    assert pump.remaining_ms[0] == 2000
+    assert pump.stats["merged_jobs"] == 1
+
+
+@pytest.mark.parametrize("duration, volume", [("10", None), (None, "150"), (True, None), (None, [1])])
+def test_non_numeric_jobs_are_rejected(pump_config, log, duration, volume):
+    pump = PumpManager(pump_config(), log)
+    assert not pump.add_job(1, duration, volume)
+    assert pump.stats["rejected_jobs"] == 1
+    assert not any(pump.remaining_ms)
+
+
+@pytest.mark.parametrize("valve", [0, 4, "1", None])
+def test_unknown_valves_are_rejected(pump_config, log, valve):
+    pump = PumpManager(pump_config(), log)
+    assert not pump.add_job(valve, 1)
+    assert pump.stats["rejected_jobs"] == 1
+
+
+def test_pump_never_runs_against_closed_valves(pump_config, log):
+    pump = PumpManager(pump_config(), log)
+    assert not pump._set_pump(True)
+    assert pump.pump.value() == 0
+    assert "Pump start refused: no valve open" in log.lines
+
+    pump._set_valve(0, True)
+    assert pump._set_pump(True)
+    pump._set_valve(0, False)
+    assert not pump.pump_on
+    assert pump.pump.value() == 0
+
+
+def test_empty_tank_stops_the_pump_and_rejects_jobs(pump_config, log):
+    pump = PumpManager(pump_config(WATER_TANK_CAPACITY_ML=200), log)
+    run_pump(pump, log, lambda: pump.add_job(1, volume_ml=500))
+
+    assert pump.tank_empty
+    assert pump.stats["tank_cutoffs"] == 1
+    assert pump.tank_ml <= 100
+    assert not pump.pump_on
+    assert not pump.add_job(2, 1)
+
+    pump.reset_tank()
+    assert pump.add_job(2, 1)
+
+
+def test_long_runs_are_cut_off_for_cooldown(pump_config, log):
+    pump = PumpManager(pump_config(PUMP_MAX_RUN_TIME=1, PUMP_FLOW_RATE_ML_S=15), log)
+
+    async def main():
+        scheduler = Scheduler(log)
+        pump.register_jobs(scheduler)
+        task = asyncio.create_task(scheduler.run())
+        pump.add_job(1, 1)
+        pump.add_job(2, 1)
+        while pump.state != COOLDOWN:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(asyncio.wait_for(main(), 3))
+    assert pump.stats["max_run_cutoffs"] == 1
+    assert not pump.pump_on
+    # Two valves sharing the flow still owe half their time after the cutoff
+    assert pump.remaining_ms[0] == pytest.approx(500, abs=50)
+
+
+def test_state_survives_restart(pump_config, log):
+    config = pump_config()
+    pump = PumpManager(config, log)
+    run_pump(pump, log, lambda: pump.add_job(1, volume_ml=100))
+
+    restarted = PumpManager(config, log)
+    assert restarted.tank_ml == pytest.approx(pump.tank_ml)
+    assert restarted.stats["pump_starts"] == 1
@@ -0,0 +1,166 @@
+import asyncio
+import time
+
+from managers.scheduler import PRIORITY_HIGH, PRIORITY_LOW, Scheduler
+
+
+async def run_for(scheduler, seconds):
+    task = asyncio.create_task(scheduler.run())
+    await asyncio.sleep(seconds)
+    task.cancel()
+
+
+def test_jobs_run_in_deadline_order(log):
+    calls = []
+
+    async def main():
+        scheduler = Scheduler(log)
+        scheduler.every("slow", 1000, lambda: calls.append("slow"), delay_ms=60)
+        scheduler.every("fast", 1000, lambda: calls.append("fast"), delay_ms=20)
+        scheduler.after("once", 40, lambda: calls.append("once"))
+        await run_for(scheduler, 0.15)
+
+    asyncio.run(main())
+    assert calls == ["fast", "once", "slow"]
+
+
+def test_due_jobs_run_by_priority(log):
+    calls = []
+
+    async def main():
+        scheduler = Scheduler(log)
+        scheduler.every("low", 1000, lambda: calls.append("low"), PRIORITY_LOW, delay_ms=0)
+        scheduler.every("high", 1000, lambda: calls.append("high"), PRIORITY_HIGH, delay_ms=0)
+        await run_for(scheduler, 0.05)
+
+    asyncio.run(main())
+    assert calls == ["high", "low"]
+
+
+def test_periodic_job_keeps_its_rate(log):
+    runs = []
+
+    async def main():
+        scheduler = Scheduler(log)
+        scheduler.every("tick", 20, lambda: runs.append(time.monotonic()), delay_ms=0)
+        await run_for(scheduler, 0.21)
+
+    asyncio.run(main())
+    assert 9 <= len(runs) <= 12
+
+
+def test_late_start_counts_as_miss(log):
+    async def main():
+        scheduler = Scheduler(log, miss_ms=20)
+        # Blocks the loop well past the next job's deadline
+        scheduler.every("blocker", 1000, lambda: time.sleep(0.08), PRIORITY_HIGH, delay_ms=0)
+        victim = scheduler.every("victim", 1000, lambda: None, delay_ms=10)
+        await run_for(scheduler, 0.15)
+        return scheduler, victim
+
+    scheduler, victim = asyncio.run(main())
+    assert victim.runs == 1
+    assert victim.misses == 1
+    assert scheduler.max_late_job == "victim"
+
+
+def test_plain_return_values_do_not_start_tasks(log):
+    # A synchronous job may return any value; only coroutines become tasks
+    async def main():
+        scheduler = Scheduler(log)
+        job = scheduler.every("check", 10, lambda: True, delay_ms=0)
+        await run_for(scheduler, 0.05)
+        return scheduler, job
+
+    scheduler, job = asyncio.run(main())
+    assert job.runs >= 3
+    assert not job.running
+    assert scheduler.running == []
+    assert not any("failed" in line for line in log.lines)
+
+
+def test_coroutine_jobs_run_as_tasks_without_overlap(log):
+    active = []
+
+    async def slow_io():
+        active.append(1)
+        assert len(active) == 1
+        await asyncio.sleep(0.05)
+        active.pop()
+
+    async def main():
+        scheduler = Scheduler(log)
+        job = scheduler.every("io", 10, slow_io, delay_ms=0)
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.02)
+        in_flight = list(scheduler.running)
+        await asyncio.sleep(0.1)
+        task.cancel()
+        return job, in_flight
+
+    job, in_flight = asyncio.run(main())
+    assert in_flight == [job]
+    # Deadlines that came up while a run was still awaiting were skipped
+    assert job.misses > 0
+    assert not any("failed" in line for line in log.lines)
+
+
+def test_one_shot_coroutines_hold_off_sleep(log):
+    sleeps = []
+
+    async def slow_io():
+        await asyncio.sleep(0.05)
+
+    def sleeper(delay_ms):
+        sleeps.append(delay_ms)
+        return False
+
+    async def main():
+        scheduler = Scheduler(log)
+        scheduler.set_sleeper(sleeper)
+        scheduler.every("idle", 1000, lambda: None)
+        scheduler.after("upload", 0, slow_io)
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.02)
+        busy = (list(scheduler.running), len(sleeps))
+        await asyncio.sleep(0.06)
+        task.cancel()
+        return busy, scheduler
+
+    (running, sleeps_while_busy), scheduler = asyncio.run(main())
+    assert [job.name for job in running] == ["upload"]
+    assert sleeps_while_busy == 0
+    assert scheduler.running == []
+    assert sleeps
+
+
+def test_failing_job_is_logged_and_rescheduled(log):
+    def broken():
+        raise ValueError("boom")
+
+    async def main():
+        scheduler = Scheduler(log)
+        job = scheduler.every("broken", 10, broken, delay_ms=0)
+        await run_for(scheduler, 0.05)
+        return job
+
+    job = asyncio.run(main())
+    assert job.runs >= 2
+    assert "Scheduled job broken failed: boom" in log.lines
+
+
+def test_deadlines_order_across_tick_wrap(log, board):
+    import utime
+
+    calls = []
+    # Put ticks_ms a few milliseconds before it wraps at 2**30
+    board.boot_monotonic = time.monotonic() - (utime.TICKS_PERIOD - 30) / 1000
+
+    async def main():
+        scheduler = Scheduler(log)
+        scheduler.every("after_wrap", 1000, lambda: calls.append("after_wrap"), delay_ms=80)
+        scheduler.every("before_wrap", 1000, lambda: calls.append("before_wrap"), delay_ms=10)
+        await run_for(scheduler, 0.15)
+
+    asyncio.run(main())
+    assert calls == ["before_wrap", "after_wrap"]
@@ -0,0 +1,62 @@
+import json
+
+from managers.telemetry_serializer import TelemetrySerializer
+
+TOPICS = {"system": ["status", "uptime", "temperature"], "adc": ["moisture"]}
+
+
+def encode(serializer, data):
+    n = serializer.encode_device(data)
+    return json.loads(bytes(serializer.view[:n]))
+
+
+def test_topics_are_built_from_config(make_config):
+    serializer = TelemetrySerializer(make_config(MQTT_TOPICS=TOPICS, MQTT_CLIENT_NAME="pump"))
+    assert serializer.device_topic == b"pump/state"
+    assert [entry[1] for entry in serializer.topic_table] == [b"pump/system", b"pump/adc"]
+    assert serializer.subtopic_table[0][2] == b"pump/system/status"
+    assert not serializer.refresh()
+
+
+def test_device_document_round_trips(make_config):
+    serializer = TelemetrySerializer(make_config(MQTT_TOPICS=TOPICS, MQTT_CLIENT_NAME="pump"), 16)
+    data = {
+        "system": {"status": "ok", "uptime": -1234, "temperature": 21.123456789},
+        "adc": {"moisture": None},
+        "ignored": {"x": 1}
+    }
+    assert encode(serializer, data) == {
+        "system": {"status": "ok", "uptime": -1234, "temperature": 21.123456789},
+        "adc": {"moisture": None}
+    }
+
+
+def test_strings_are_escaped(make_config):
+    serializer = TelemetrySerializer(make_config(MQTT_TOPICS=TOPICS, MQTT_CLIENT_NAME="pump"))
+    status = 'say "hi"\\\n\tend\x01\x1f café'
+    assert encode(serializer, {"system": {"status": status}}) == {"system": {"status": status}}
+
+
+def test_non_finite_floats_stay_valid_json(make_config):
+    serializer = TelemetrySerializer(make_config(MQTT_TOPICS=TOPICS, MQTT_CLIENT_NAME="pump"))
+    document = encode(serializer, {"system": {"temperature": float("nan"), "uptime": float("inf")}})
+    assert document == {"system": {"temperature": "nan", "uptime": "inf"}}
+
+
+def test_single_values_use_python_repr(make_config):
+    serializer = TelemetrySerializer(make_config(MQTT_TOPICS=TOPICS, MQTT_CLIENT_NAME="pump"))
+    for value, text in ((True, b"True"), (None, b"None"), (0, b"0"), (0.1, b"0.1"), ("on", b"on")):
+        n = serializer.encode_value(value)
+        assert bytes(serializer.view[:n]) == text
+
+
+def test_documents_count_their_subtopic_cost(make_config):
+    serializer = TelemetrySerializer(make_config(MQTT_TOPICS=TOPICS, MQTT_CLIENT_NAME="pump"))
+    serializer.encode_topic(serializer.topic_table[0], {"uptime": 1234, "temperature": 21.5})
+    assert serializer.legacy_packets == 2
+    # Header byte, length byte, topic length prefix, topic and payload of each packet
+    assert serializer.legacy_bytes == (4 + len(b"pump/system/uptime") + 4) + (4 + len(b"pump/system/temperature") + 4)
+
+    serializer.encode_device({"adc": {"moisture": 7}})
+    assert serializer.legacy_packets == 1
+    assert serializer.legacy_bytes == 4 + len(b"pump/adc/moisture") + 1